@@ -1,67 +1,41 @@
 import streamlit as st
 import pandas as pd
-import requests
 import datetime
 import urllib3
 import re
-from supabase import create_client, Client
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from core.shared_data import get_supabase, get_stock_master, fetch_kline_data
+from core.trading_calendar import closure_reason, latest_trading_day
+from core.prewarm import start_prewarm_scheduler
+from core.table_render import render_table, quote_styles, header_css, cell_css
+from core.timing import begin_trace, render_timing_sidebar, span
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 st.set_page_config(page_title="我的投資儀表板", layout="wide", page_icon="🏠")
+start_prewarm_scheduler()  # 盤後預熱排程 (整個伺服器行程只啟動一次，見 core/prewarm.py)
+begin_trace("Home")  # 各階段耗時 (側邊欄 + cache/timing/spans.jsonl，見 core/timing.py)
 
 # ==========================================
 # 雲端資料庫：Supabase 初始化
 # ==========================================
-@st.cache_resource
-def init_connection():
-    url = st.secrets["SUPABASE_URL"]
-    key = st.secrets["SUPABASE_KEY"]
-    return create_client(url, key)
-
 try:
-    supabase: Client = init_connection()
+    supabase = get_supabase()
 except Exception as e:
     st.error(f"⚠️ Supabase 連線失敗，請檢查 .streamlit/secrets.toml 設定。錯誤訊息: {e}")
     st.stop()
 
+# 🌟 持股行情並行抓取設定 (可用環境變數調整)
+HOLDINGS_FETCH_WORKERS = int(os.environ.get("HOLDINGS_FETCH_WORKERS", 8))       # 同時連線 Yahoo 的數量上限
+HOLDINGS_FETCH_TIMEOUT = float(os.environ.get("HOLDINGS_FETCH_TIMEOUT", 4))    # 每檔單次請求的逾時秒數
+HOLDINGS_FETCH_DEADLINE = float(os.environ.get("HOLDINGS_FETCH_DEADLINE", 12))  # 整批持股最多等待秒數 (最後防線)
+
 # 🌟 預設持股清單
 DEFAULT_HOLDINGS = "^TWII 加權指數, ^TWOII 櫃買指數, 2317 鴻海, 1802 台玻, 1717 長興, 4952 凌通, 2344 華邦電, 009816 凱基台灣Top50"
 
-# ==========================================
-# 從 Supabase 抓取全台股清單與後綴 (突破千筆限制版)
-# ==========================================
-@st.cache_data(ttl=86400)
-def load_stock_info_from_db():
-    """
-    從 stock_info 資料表抓取代號、名稱與後綴(suffix)
-    使用分頁機制 (Pagination)，確保 2000+ 檔台股都能完整載入
-    """
-    stock_dict = {}
-    try:
-        all_data = []
-        step = 1000
-        # 迴圈分批抓取，每次抓 1000 筆，最多抓到 5000 筆為止 (涵蓋台股綽綽有餘)
-        for i in range(0, 5000, step):
-            response = supabase.table("stock_info").select("stock_id, stock_name, suffix").range(i, i + step - 1).execute()
-            all_data.extend(response.data)
-            
-            # 如果這次抓到的資料少於 1000 筆，代表已經抓到底了，提早結束迴圈
-            if len(response.data) < step:
-                break
-                
-        # 將完整資料組裝成字典
-        for row in all_data:
-            sid = str(row['stock_id']).strip()
-            stock_dict[sid] = {
-                'name': str(row['stock_name']).strip(),
-                'suffix': str(row.get('suffix', '')).strip()
-            }
-    except Exception as e:
-        st.error(f"無法載入股票清單: {e}")
-    return stock_dict
-
 # 常見 ETF 或指數的備用對應
 COMMON_ETF_MAP = {
     "^TWII": "加權指數", "^TWOII": "櫃買指數",
@@ -89,44 +63,37 @@ def save_holdings(holdings_str):
         st.error(f"儲存持股至 Supabase 失敗: {e}")
 
 # ==========================================
-# 工具與抓取函式 (精準 suffix 優化版)
+# 工具與抓取函式 (個股 K 線見 core/shared_data.py，與其他頁面共用快取)
 # ==========================================
-@st.cache_data(ttl=3600)
-def fetch_kline_data(ticker, specific_suffix=None):
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    
-    # 如果有明確的 suffix，就只抓一次；否則維持盲猜邏輯
-    if ticker.startswith('^'):
-        suffixes_to_try = ['']
-    elif specific_suffix is not None:
-        suffixes_to_try = [specific_suffix]
-    else:
-        suffixes_to_try = ['.TW', '.TWO']
-    
-    for suffix in suffixes_to_try:
+def fetch_holdings_klines(codes, stock_db_dict):
+    """
+    以有上限的執行緒池並行抓取所有持股 K 線，回傳 ({代號: df}, 逾時代號清單)
+    每個請求各自以 HOLDINGS_FETCH_TIMEOUT 逾時，單一檔卡住不會吃掉其他檔的時間；
+    HOLDINGS_FETCH_DEADLINE 只是整批的上限，超過仍未回應的代號直接略過，不會拖住整頁
+    """
+    if not codes:
+        return {}, []
+    ctx = get_script_run_ctx()
+    pool = ThreadPoolExecutor(
+        max_workers=max(1, min(HOLDINGS_FETCH_WORKERS, len(codes))),
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    )
+    futures = {
+        code: pool.submit(fetch_kline_data, code, specific_suffix=stock_db_dict.get(code, {}).get('suffix'), timeout=HOLDINGS_FETCH_TIMEOUT)
+        for code in codes
+    }
+    deadline = time.monotonic() + HOLDINGS_FETCH_DEADLINE
+    klines, timed_out = {}, []
+    for code, future in futures.items():
         try:
-            url = f"https://query2.finance.yahoo.com/v8/finance/chart/{ticker}{suffix}?range=6mo&interval=1d"
-            res = requests.get(url, headers=headers, timeout=5).json()
-            result = res.get('chart', {}).get('result')
-            if result:
-                meta = result[0].get('meta', {})
-                quote = result[0]['indicators']['quote'][0]
-                df = pd.DataFrame({
-                    'Close': result[0]['indicators']['adjclose'][0]['adjclose'],
-                    'Open': quote['open'], 'High': quote['high'], 'Low': quote['low'],
-                    'Volume': quote['volume']
-                })
-                df.index = pd.to_datetime(result[0]['timestamp'], unit='s') + pd.Timedelta(hours=8)
-                df.index = df.index.normalize()
-                df = df.dropna()
-                
-                if not df.empty and df['Volume'].iloc[-1] == 0:
-                    reg_vol = meta.get('regularMarketVolume', 0)
-                    if reg_vol > 0: df.iloc[-1, df.columns.get_loc('Volume')] = reg_vol
-                return df
-        except: 
-            continue
-    return pd.DataFrame()
+            klines[code] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            timed_out.append(code)
+        except Exception:
+            klines[code] = pd.DataFrame()
+    # 不等待逾時的請求，讓它們在背景自行結束
+    pool.shutdown(wait=False, cancel_futures=True)
+    return klines, timed_out
 
 # ==========================================
 # 介面與核心邏輯
@@ -134,15 +101,21 @@ def fetch_kline_data(ticker, specific_suffix=None):
 st.title("🏠 我的投資儀表板")
 st.divider()
 
-# 1. 載入全台股字典建立選單
-stock_db_dict = load_stock_info_from_db()
+# 1. 載入全台股字典建立選單 (與其他頁面共用同一份股票主檔快取)
+try:
+    with span("fetch", "get_stock_master"):
+        stock_db_dict = get_stock_master()
+except Exception as e:
+    st.error(f"無法載入股票清單: {e}")
+    stock_db_dict = {}
 all_stock_options = [f"{k} {v['name']}" for k, v in stock_db_dict.items()]
 
 # ==========================================
 # 2. 狀態管理：改用 List 儲存，方便操作與顯示
 # ==========================================
 if "holdings_list" not in st.session_state:
-    raw_str = load_holdings()
+    with span("fetch", "load_holdings"):
+        raw_str = load_holdings()
     # 將雲端的字串拆解為乾淨的 List
     st.session_state.holdings_list = [s.strip() for s in raw_str.replace('、', ',').replace('，', ',').split(',') if s.strip()]
 
@@ -204,8 +177,9 @@ with col_save:
         save_holdings(save_str)
         st.success("✅ 持股清單已成功存檔至雲端！")
 
-if selected_date.weekday() >= 5:
-    st.warning(f"⚠️ 您選擇的日期 ({selected_date}) 是週末假日，將自動顯示最近一個交易日的資料。")
+market_closed = closure_reason(selected_date)
+if market_closed:
+    st.warning(f"⚠️ 您選擇的日期 ({selected_date}) 為休市日 ({market_closed})，將自動顯示最近一個交易日 ({latest_trading_day(selected_date)}) 的資料。")
 
 # ==========================================
 # 🌟 智慧防呆解析引擎 (配合 List 架構更新)
@@ -267,16 +241,16 @@ target_ts = pd.Timestamp(selected_date).normalize()
 
 with st.spinner('從雲端資料庫調閱資料與精算行情中...'):
     final_rows = []
+    # 並行抓取全部持股 (傳入 db_suffix 加速抓取)，表格仍依清單原順序組裝
+    with span("fetch", f"fetch_holdings_klines ({len(my_codes)} 檔)"):
+        holdings_klines, timed_out_codes = fetch_holdings_klines(my_codes, stock_db_dict)
     for code in my_codes:
-        # 決定名稱與 suffix，優先從 Supabase 資料庫取用
-        db_info = stock_db_dict.get(code, {})
-        db_name = db_info.get('name')
-        db_suffix = db_info.get('suffix')
+        # 決定名稱，優先從 Supabase 資料庫取用
+        db_name = stock_db_dict.get(code, {}).get('name')
         
         name = final_parsed_names.get(code) or db_name or COMMON_ETF_MAP.get(code) or f"({code})"
         
-        # 傳入 db_suffix 加速抓取
-        df_k = fetch_kline_data(code, specific_suffix=db_suffix)
+        df_k = holdings_klines.get(code, pd.DataFrame())
         
         if not df_k.empty:
             if target_ts in df_k.index:
@@ -300,44 +274,21 @@ with st.spinner('從雲端資料庫調閱資料與精算行情中...'):
                     '漲跌': round(change, 2), '漲幅%': round(pct, 2), '成交量(張)': vol
                 })
 
+if timed_out_codes:
+    st.warning(f"⏳ 以下代號行情回應逾時，本次先略過：{', '.join(timed_out_codes)}")
+
 # --- 顯示持股表格 ---
 if final_rows:
     df_final = pd.DataFrame(final_rows)
     
-    def custom_style(row):
-        styles = []
-        for col in row.index:
-            css = ""
-            if col == '收盤':
-                css += "font-weight: bold; "
-            
-            if col in ['漲跌', '漲幅%']:
-                if row[col] > 0:
-                    css += "color: #ff4b4b; " 
-                elif row[col] < 0:
-                    css += "color: #1e7b1e; " 
-            
-            if row['漲幅%'] >= 9.85:
-                css += "background-color: rgba(255, 75, 75, 0.2); "
-            elif row['漲幅%'] <= -9.85:
-                css += "background-color: rgba(0, 136, 0, 0.15); " 
-                
-            styles.append(css)
-        return styles
-
-    styled_df = df_final.style.apply(custom_style, axis=1)\
-                  .format({"開盤": "{:.2f}", "最高": "{:.2f}", "最低": "{:.2f}", 
-                           "收盤": "{:.2f}", "漲跌": "{:.2f}", "漲幅%": "{:.2f} %", "成交量(張)": "{:.0f}"})\
-                  .hide(axis="index")\
-                  .set_table_attributes('style="width: 100%; border-collapse: collapse; text-align: center;"')\
-                  .set_table_styles([
-                      {'selector': 'th', 'props': [('font-size', '18px'), ('text-align', 'center'), ('padding', '12px'), ('border-bottom', '2px solid #555')]},
-                      {'selector': 'td', 'props': [('font-size', '16px'), ('text-align', 'center'), ('padding', '12px'), ('border-bottom', '1px solid #ddd')]}
-                  ])
+    with span("render", "render_table"):
+        html_table = render_table(
+            df_final, styles=quote_styles(df_final),
+            formats={"開盤": "{:.2f}", "最高": "{:.2f}", "最低": "{:.2f}",
+                     "收盤": "{:.2f}", "漲跌": "{:.2f}", "漲幅%": "{:.2f} %", "成交量(張)": "{:.0f}"},
+            th_css=header_css(18), td_css=cell_css(16))
     
     st.subheader(f"💡 {selected_date} 盤勢與持股表現")
-    
-    html_table = styled_df.to_html()
     st.markdown(html_table, unsafe_allow_html=True)
 
     st.divider()
@@ -348,26 +299,33 @@ if final_rows:
         
         # 繪圖時也使用資料庫抓到的 suffix 加速
         db_suffix = stock_db_dict.get(t_code, {}).get('suffix')
-        df_k = fetch_kline_data(t_code, specific_suffix=db_suffix)
+        with span("fetch", "fetch_kline_data"):
+            df_k = fetch_kline_data(t_code, specific_suffix=db_suffix, timeout=HOLDINGS_FETCH_TIMEOUT)
         
         if not df_k.empty:
-            df_k['MA5'] = df_k['Close'].rolling(5).mean()
-            df_k['MA20'] = df_k['Close'].rolling(20).mean()
-            df_k['MA60'] = df_k['Close'].rolling(60).mean()
+            with span("render", "K 線圖 (plotly)"):
+                # plotly 載入較慢，等表格畫完、真的要畫圖時才載入
+                import plotly.graph_objects as go
+                from plotly.subplots import make_subplots
+
+                df_k['MA5'] = df_k['Close'].rolling(5).mean()
+                df_k['MA20'] = df_k['Close'].rolling(20).mean()
+                df_k['MA60'] = df_k['Close'].rolling(60).mean()
             
-            fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.03, row_width=[0.2, 0.8], subplot_titles=(f'{t_name} ({t_code}) 日K與均線', '成交量'))
-            fig.add_trace(go.Candlestick(x=df_k.index, open=df_k['Open'], high=df_k['High'], low=df_k['Low'], close=df_k['Close'], name='K線'), row=1, col=1)
-            fig.add_trace(go.Scatter(x=df_k.index, y=df_k['MA5'], mode='lines', line=dict(color='purple'), name='MA5'), row=1, col=1)
-            fig.add_trace(go.Scatter(x=df_k.index, y=df_k['MA20'], mode='lines', line=dict(color='orange'), name='MA20'), row=1, col=1)
-            fig.add_trace(go.Scatter(x=df_k.index, y=df_k['MA60'], mode='lines', line=dict(color='blue'), name='MA60'), row=1, col=1)
-            v_colors = ['red' if c >= o else 'green' for c, o in zip(df_k['Close'], df_k['Open'])]
-            fig.add_trace(go.Bar(x=df_k.index, y=df_k['Volume'], marker_color=v_colors, name='成交量'), row=2, col=1)
-            fig.update_layout(xaxis_rangeslider_visible=False, height=650, dragmode='drawline', newshape=dict(line_color='black', line_width=2))
-            fig.update_xaxes(rangebreaks=[dict(bounds=["sat", "mon"])])
-            st.plotly_chart(fig, use_container_width=True, config={'modeBarButtonsToAdd': ['drawline', 'eraseshape']})
+                fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.03, row_width=[0.2, 0.8], subplot_titles=(f'{t_name} ({t_code}) 日K與均線', '成交量'))
+                fig.add_trace(go.Candlestick(x=df_k.index, open=df_k['Open'], high=df_k['High'], low=df_k['Low'], close=df_k['Close'], name='K線'), row=1, col=1)
+                fig.add_trace(go.Scatter(x=df_k.index, y=df_k['MA5'], mode='lines', line=dict(color='purple'), name='MA5'), row=1, col=1)
+                fig.add_trace(go.Scatter(x=df_k.index, y=df_k['MA20'], mode='lines', line=dict(color='orange'), name='MA20'), row=1, col=1)
+                fig.add_trace(go.Scatter(x=df_k.index, y=df_k['MA60'], mode='lines', line=dict(color='blue'), name='MA60'), row=1, col=1)
+                v_colors = ['red' if c >= o else 'green' for c, o in zip(df_k['Close'], df_k['Open'])]
+                fig.add_trace(go.Bar(x=df_k.index, y=df_k['Volume'], marker_color=v_colors, name='成交量'), row=2, col=1)
+                fig.update_layout(xaxis_rangeslider_visible=False, height=650, dragmode='drawline', newshape=dict(line_color='black', line_width=2))
+                fig.update_xaxes(rangebreaks=[dict(bounds=["sat", "mon"])])
+                st.plotly_chart(fig, use_container_width=True, config={'modeBarButtonsToAdd': ['drawline', 'eraseshape']})
 else:
-    if selected_date.weekday() < 5:
-        st.info("💡 查無資料。可能原因：\n1. 今日為國定假日未開盤\n2. 目前尚在盤中，資料尚未產出。")
+    if not market_closed:
+        st.info("💡 查無資料。可能原因：\n1. 行情服務暫時無回應\n2. 目前尚在盤中，資料尚未產出。")
     else:
-        st.info("💡 週末查無資料，請點選上方日期切換至最近的交易日。")
+        st.info("💡 休市日查無資料，請點選上方日期切換至最近的交易日。")
 
+render_timing_sidebar()
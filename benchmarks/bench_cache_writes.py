@@ -0,0 +1,136 @@
+"""
+Supabase 快取寫入：payload 組裝與分塊寫入
+
+  payload  chips_ranking_cache (買賣超榜 200 列) / daily_chips_cache (全市場 1800 檔)
+           舊版 iterrows 逐列組 dict 與整欄轉型版比較，並確認輸出完全相同
+  寫入     以替身 client 模擬每次請求 WRITE_LATENCY_MS 的往返時間，
+           比較舊版逐塊依序 insert 與 upsert_rows 平行分塊寫入
+
+執行方式 (專案根目錄)：python -m benchmarks.bench_cache_writes
+"""
+import time
+import threading
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+from benchmarks.common import time_call
+from core import shared_data
+from core.chip_streak import daily_cache_rows
+from core.chips_rank import OUTPUT_COLUMNS, rank_cache_rows
+
+WRITE_LATENCY_MS = 40   # 模擬一次 Supabase REST 請求的往返時間
+
+
+# --- 舊版 payload (原本 save_*_to_cache 的寫法，作為比對基準) ---
+def legacy_rank_rows(date_str, df_buy, df_sell):
+    data_to_insert = []
+    def prepare_data(df, r_type):
+        for _, row in df.iterrows():
+            data_to_insert.append({
+                "date": date_str, "rank_type": r_type, "rank_no": int(row['排名']),
+                "stock_id": str(row['代號']), "stock_name": str(row['名稱']),
+                "industry": str(row['產業類別']), "close_price": float(row['收盤價']),
+                "change_val": float(row['漲跌']), "change_pct": float(row['漲幅%']),
+                "volume": int(row['成交量']), "foreign_buy": int(row['外資']),
+                "it_buy": int(row['投信']), "dealer_buy": int(row['自營商']),
+                "total_buy": int(row.get('法人買超', row.get('法人賣超', 0))),
+                "pe_ratio": float(row['本益比']), "pb_ratio": float(row['股價淨值比']), "nav": float(row['每股淨值'])
+            })
+    prepare_data(df_buy, 'buy')
+    prepare_data(df_sell, 'sell')
+    return data_to_insert
+
+
+def legacy_daily_rows(date_str, df_daily):
+    df_clean = df_daily[(df_daily['代號'].str.len() == 4) & (~df_daily['代號'].str.startswith('00'))].copy()
+    data_to_insert = []
+    for _, row in df_clean.iterrows():
+        data_to_insert.append({
+            "date": date_str, "stock_id": str(row['代號']), "stock_name": str(row['名稱']),
+            "foreign_buy": int(row['外資']), "it_buy": int(row['投信'])
+        })
+    return data_to_insert
+
+
+def rank_frames(n=100, seed=7):
+    """合成買 / 賣超榜 (finalize_rank 的輸出欄位)"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for total_col in ['法人買超', '法人賣超']:
+        codes = synthetic.stock_codes()[:n]
+        close = rng.uniform(10, 1000, n).round(2)
+        df = pd.DataFrame({
+            '排名': np.arange(1, n + 1), '代號': codes, '名稱': [f"公司{c}" for c in codes], '產業類別': '半導體業',
+            '收盤價': close, '漲跌': (close * rng.normal(0, 0.02, n)).round(2), '漲幅%': rng.normal(0, 2, n).round(2),
+            '成交量': rng.integers(100, 100000, n), '外資': rng.integers(-9000, 9000, n), '投信': rng.integers(-900, 900, n),
+            '自營商': rng.integers(-900, 900, n), '法人買賣超': rng.integers(-9000, 9000, n),
+            '本益比': rng.uniform(5, 40, n).round(2), '股價淨值比': rng.uniform(0.5, 8, n).round(2), '每股淨值': rng.uniform(5, 200, n).round(2),
+        })[OUTPUT_COLUMNS].rename(columns={'法人買賣超': total_col})
+        frames.append(df)
+    return frames
+
+
+# --- 模擬寫入 ---
+class _LatencyClient:
+    """table().upsert()/insert().execute() 各等待 WRITE_LATENCY_MS，並記錄請求數"""
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, **kwargs):
+        return self
+
+    insert = upsert
+
+    def execute(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(WRITE_LATENCY_MS / 1000)
+
+
+def legacy_write(client, rows):
+    for i in range(0, len(rows), 500):
+        try: client.table("daily_chips_cache").insert(rows[i:i+500]).execute()
+        except: pass
+
+
+def run(repeat=20):
+    date_str = '2026-03-06'
+    df_buy, df_sell = rank_frames()
+    df_daily = synthetic.daily_chips()[0]
+    results = []
+
+    rank_same = legacy_rank_rows(date_str, df_buy, df_sell) == rank_cache_rows(date_str, df_buy, df_sell)
+    legacy = time_call(lambda: legacy_rank_rows(date_str, df_buy, df_sell), repeat)
+    timing = time_call(lambda: rank_cache_rows(date_str, df_buy, df_sell), repeat)
+    results.append({'name': 'chips_ranking_cache payload', 'page': 'cache_writes', 'rows': len(df_buy) + len(df_sell), **timing,
+                    'legacy_ms': legacy['median_ms'], 'speedup': round(legacy['median_ms'] / timing['median_ms'], 1), 'identical': rank_same})
+
+    daily_same = legacy_daily_rows(date_str, df_daily) == daily_cache_rows(date_str, df_daily)
+    legacy = time_call(lambda: legacy_daily_rows(date_str, df_daily), repeat)
+    timing = time_call(lambda: daily_cache_rows(date_str, df_daily), repeat)
+    results.append({'name': 'daily_chips_cache payload', 'page': 'cache_writes', 'rows': len(df_daily), **timing,
+                    'legacy_ms': legacy['median_ms'], 'speedup': round(legacy['median_ms'] / timing['median_ms'], 1), 'identical': daily_same})
+
+    # 全市場 5 個交易日的籌碼一次回補 (約 9000 列、18 個分塊)
+    rows = [dict(r, date=d) for d in ['2026-03-02', '2026-03-03', '2026-03-04', '2026-03-05', date_str]
+            for r in daily_cache_rows(date_str, df_daily)]
+    client = _LatencyClient()
+    with mock.patch.object(shared_data, 'get_supabase', return_value=client):
+        legacy = time_call(lambda: legacy_write(client, rows), max(1, repeat // 10))
+        timing = time_call(lambda: shared_data.upsert_rows("daily_chips_cache", rows, "date,stock_id"), max(1, repeat // 10))
+        chunk_ok = all(r['ok'] for r in shared_data.upsert_rows("daily_chips_cache", rows, "date,stock_id"))
+    results.append({'name': f'分塊寫入 (模擬 {WRITE_LATENCY_MS} ms 往返)', 'page': 'cache_writes', 'rows': len(rows), **timing,
+                    'legacy_ms': legacy['median_ms'], 'speedup': round(legacy['median_ms'] / timing['median_ms'], 1), 'identical': chunk_ok})
+    return results
+
+
+if __name__ == '__main__':
+    for r in run():
+        print(f"{r['name']:<36} rows={r['rows']:<6} 舊版={r['legacy_ms']:>8.2f} ms  新版={r['median_ms']:>8.2f} ms  (x{r['speedup']})  一致={r['identical']}")
@@ -0,0 +1,81 @@
+"""
+各頁面冷啟動 (容器重啟後第一次開頁) 的載入時間
+
+每個頁面在全新的 Python 行程中，只執行該頁「模組最上層」的 import 敘述並逐條計時，
+同時記錄哪些重量級套件在第一次繪製前就被載入。重量級套件應延後到真正用到時才 import，
+一旦有人把它們搬回檔案開頭，這裡的時間與 heavy_loaded 清單就會立刻反映出來。
+
+執行方式 (專案根目錄)：python -m benchmarks.bench_cold_start
+"""
+import os
+import ast
+import sys
+import json
+import glob
+import statistics
+import subprocess
+
+from benchmarks.common import ROOT
+
+# plotly (streamlit 本身就會載入) 與 pyarrow (pandas 會載入) 不列入
+HEAVY_MODULES = ['yfinance', 'twstock', 'supabase']
+
+_PROBE = r'''
+import sys, time, json
+sys.path.insert(0, {root!r})
+timings = []
+for stmt in {statements!r}:
+    t0 = time.perf_counter()
+    exec(stmt, {{}})
+    timings.append((stmt, (time.perf_counter() - t0) * 1000))
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{'timings': timings, 'heavy': heavy}}))
+'''
+
+
+def page_files():
+    return [os.path.join(ROOT, "Home.py")] + sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+
+
+def top_level_imports(path):
+    """頁面模組最上層的 import 敘述 (函式內、if 區塊內的延遲 import 不算)"""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def probe(statements):
+    code = _PROBE.format(root=ROOT, statements=statements, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, timeout=120)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "probe failed")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run(repeat=5):
+    """回傳 [{name, page, rows, median_ms, min_ms, p90_ms, repeat, heavy_loaded, slowest_imports}]；每次量測都是全新行程"""
+    repeat = max(1, min(repeat, 5))
+    results = []
+    for path in page_files():
+        statements = top_level_imports(path)
+        samples, last = [], None
+        for _ in range(repeat):
+            last = probe(statements)
+            samples.append(sum(ms for _, ms in last['timings']))
+        samples.sort()
+        slowest = sorted(last['timings'], key=lambda x: -x[1])[:3]
+        results.append({
+            'name': f"冷啟動 import ({os.path.basename(path)})", 'page': os.path.splitext(os.path.basename(path))[0], 'rows': len(statements),
+            'median_ms': round(statistics.median(samples), 3), 'min_ms': round(samples[0], 3),
+            'p90_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.9))], 3), 'repeat': repeat,
+            'heavy_loaded': last['heavy'],
+            'slowest_imports': [{'import': stmt, 'ms': round(ms, 1)} for stmt, ms in slowest],
+        })
+    return results
+
+
+if __name__ == '__main__':
+    for r in run():
+        print(f"{r['page']:<24} import={r['median_ms']:>8.1f} ms  heavy={','.join(r['heavy_loaded']) or '-'}")
+        for s in r['slowest_imports']:
+            print(f"    {s['ms']:>7.1f} ms  {s['import']}")
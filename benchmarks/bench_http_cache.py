@@ -0,0 +1,61 @@
+"""
+HTTP 錄製 / 重播：以磁碟上的錄製回應離線執行 pages/5 的公告抓取與解析
+
+先以 record 模式把合成公告 (四個端點) 錄到暫存目錄，再以 replay 模式量測
+fetch_official_announcements 的完整路徑 (讀檔 → 解壓 → JSON 解碼 → 解析)，
+並確認結果與直接連線 (替身) 時相同、重播期間上游連線次數為 0。
+
+執行方式 (專案根目錄)：python -m benchmarks.bench_http_cache
+"""
+import os
+import json
+import tempfile
+from unittest import mock
+
+import requests
+
+from benchmarks import synthetic
+from benchmarks.common import stub_http, time_call
+from benchmarks.bench_pages import TARGET_DATE
+from core import http_cache
+from core.announcements import fetch_official_announcements
+
+
+def _recordable_get(routes):
+    """回傳真正的 requests.Response，錄製時才有 content / headers 可存"""
+    def fake_get(url, *args, **kwargs):
+        for key, payload in routes.items():
+            if key in url:
+                res = requests.Response()
+                res.status_code = 200
+                res._content = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                res.headers['Content-Type'] = 'application/json; charset=utf-8'
+                res.encoding = 'utf-8'
+                return res
+        raise ConnectionError(f"benchmark 不允許連網：{url}")
+    return fake_get
+
+
+def run(repeat=20):
+    routes = synthetic.announcement_payloads(TARGET_DATE)
+    with stub_http(routes):
+        expected = fetch_official_announcements(TARGET_DATE)
+
+    with tempfile.TemporaryDirectory() as cache_dir, mock.patch.object(http_cache, 'CACHE_DIR', cache_dir):
+        with mock.patch.dict(os.environ, {'HTTP_CACHE_MODE': 'record'}), mock.patch('requests.get', side_effect=_recordable_get(routes)):
+            fetch_official_announcements(TARGET_DATE)
+        # 重播時 requests.get 一被呼叫就會失敗，確保全程離線
+        with mock.patch.dict(os.environ, {'HTTP_CACHE_MODE': 'replay'}), mock.patch('requests.get', side_effect=ConnectionError("replay 不應連網")):
+            before = http_cache.stats['upstream']
+            replayed = fetch_official_announcements(TARGET_DATE)
+            timing = time_call(lambda: fetch_official_announcements(TARGET_DATE), repeat)
+            upstream_calls = http_cache.stats['upstream'] - before
+
+    rows = sum(len(v['data']) if isinstance(v, dict) else len(v) for v in routes.values())
+    return [{'name': 'fetch_official_announcements 離線重播', 'page': '5_注意警示股v6', 'rows': rows, **timing,
+             'identical': replayed == expected, 'upstream_calls': upstream_calls}]
+
+
+if __name__ == '__main__':
+    for r in run():
+        print(f"{r['name']:<36} median={r['median_ms']:>8.2f} ms  p90={r['p90_ms']:>8.2f} ms  上游連線={r['upstream_calls']}  一致={r['identical']}")
@@ -0,0 +1,79 @@
+"""
+官方資料解析效能比較：逐列 Python 迴圈 (舊版) vs 欄式批次轉型 (core.official_parser)
+固定使用專案內的 STOCK_DAY_ALL.json 作為輸入，不需網路
+
+執行方式 (專案根目錄)：python -m benchmarks.bench_official_parser
+"""
+import pandas as pd
+
+from benchmarks.common import load_fixture, time_call
+from core.official_parser import parse_twse_stock_day_all, signed_change
+
+
+# --- 舊版：pages/1_強弱勢股100.py 原本的逐列解析 ---
+def legacy_parse_twse(records):
+    all_stocks = []
+    for row in records:
+        try:
+            code = str(row.get('Code', '')).strip()
+            name = str(row.get('Name', '')).strip()
+            vol = int(row.get('TradeVolume', 0).replace(',', '')) // 1000
+            open_p = float(row.get('OpeningPrice', 0).replace(',', ''))
+            high_p = float(row.get('HighestPrice', 0).replace(',', ''))
+            low_p = float(row.get('LowestPrice', 0).replace(',', ''))
+            close_p = float(row.get('ClosingPrice', 0).replace(',', ''))
+            change = float(row.get('Change', 0).replace(',', ''))
+            if vol > 0 and close_p > 0:
+                all_stocks.append({
+                    '代碼': code, '商品': name, '開盤': open_p, '最高': high_p,
+                    '最低': low_p, '收盤': close_p, '漲跌': change, '成交量(張)': vol
+                })
+        except: continue
+    return pd.DataFrame(all_stocks)
+
+
+# --- 舊版：pages/2 MI_INDEX 漲跌的逐列 apply ---
+def mi_index_frame(records):
+    """以 STOCK_DAY_ALL 模擬 MI_INDEX 的「漲跌(+/-)」+「漲跌價差」兩欄格式"""
+    change = [r['Change'] for r in records]
+    return pd.DataFrame({
+        '漲跌符號': ["<p style= color:green>-</p>" if c.startswith('-') else "<p style= color:red>+</p>" for c in change],
+        '漲跌價差': [c.lstrip('-') for c in change],
+    })
+
+
+def legacy_signed_change(df_price):
+    return df_price.apply(lambda r: float(r['漲跌價差'].replace(',', '')) * (-1 if '-' in str(r['漲跌符號']) else 1), axis=1)
+
+
+def _case(name, rows, legacy_fn, new_fn, identical, repeat):
+    legacy_t = time_call(legacy_fn, repeat)
+    new_t = time_call(new_fn, repeat)
+    return {
+        'name': name, 'page': 'official_parser', 'rows': rows, **new_t,
+        'legacy_ms': legacy_t['median_ms'],
+        'speedup': round(legacy_t['median_ms'] / new_t['median_ms'], 1),
+        'identical': identical,
+    }
+
+
+def run(repeat=20):
+    """回傳 [{name, page, rows, median_ms, min_ms, p90_ms, repeat, legacy_ms, speedup, identical}]"""
+    records = load_fixture()
+    legacy_df = legacy_parse_twse(records)
+    new_df = parse_twse_stock_day_all(records).drop(columns=['日期'])
+    df_price = mi_index_frame(records)
+    return [
+        _case('parse_twse_stock_day_all', len(records),
+              lambda: legacy_parse_twse(records), lambda: parse_twse_stock_day_all(records),
+              legacy_df.reset_index(drop=True).equals(new_df), repeat),
+        _case('signed_change (MI_INDEX 漲跌)', len(df_price),
+              lambda: legacy_signed_change(df_price), lambda: signed_change(df_price['漲跌符號'], df_price['漲跌價差']),
+              legacy_signed_change(df_price).equals(signed_change(df_price['漲跌符號'], df_price['漲跌價差'])), repeat),
+    ]
+
+
+if __name__ == '__main__':
+    for r in run():
+        print(f"{r['name']:<32} rows={r['rows']:<6} legacy={r['legacy_ms']:>8.2f} ms  "
+              f"vectorized={r['median_ms']:>7.2f} ms  x{r['speedup']:<5} identical={r['identical']}")
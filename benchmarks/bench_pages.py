@@ -0,0 +1,121 @@
+"""
+各頁面運算核心的離線效能量測 (不連網、不需 Streamlit / Supabase)
+
+  pages/1  load_all_market_data 的解析：STOCK_DAY_ALL.json + 合成上櫃行情 → 欄式解析 → 漲幅/振幅
+  pages/2  法人合併與排行：六個官方 payload → 合併 → 前 100 名 → 套用 Yahoo 校準
+  pages/3  連續買賣超：60 日 × 1800 檔 (一次重算 / 逐日推進 / 查詢)
+  pages/4  MACD 選股：1800 檔 × 150 日，逐檔 calculate_macd_strategy、全市場向量化版與等價的自訂條件式
+  pages/5  fetch_official_announcements：HTTP 以替身回傳合成公告，量測 JSON 解碼 + 解析
+
+執行方式 (專案根目錄)：python -m benchmarks.bench_pages
+"""
+import datetime
+import pandas as pd
+
+from benchmarks import synthetic
+from benchmarks.common import load_fixture, stub_http, time_call
+from core.announcements import fetch_official_announcements
+from core.chip_streak import advance_streak_state, build_streak_state, compute_chip_streaks, lookup_streaks
+from core.chips_rank import build_tpex_data, build_twse_data, calibration_tickers, finalize_rank, merge_market_chips, top_chips
+from core.macd_engine import calculate_macd_strategy, screen_macd_market, screen_rule_market
+from core.ohlcv_store import ohlcv_frame
+from core.official_parser import compute_quote_metrics, parse_tpex_mainboard_quotes, parse_twse_stock_day_all
+from core.screener_expr import PANEL_VARIABLES, compile_rule
+
+TARGET_DATE = datetime.date(2026, 3, 6)
+MACD_MIN_VOLUME_K = 1000
+# 與 calculate_macd_strategy 四大條件等價的條件式 (選出的代號應完全相同)
+MACD_RULE = ("ma(20) > ref(ma(20)) and ma(60) > ref(ma(60)) and ref(close) <= ref(ma(20)) * 1.015 "
+             "and close > ma(20) and close > ref(close) and dif > dem and vol > ma(vol, 5)")
+
+
+def _result(page, name, rows, timing, **extra):
+    return {'name': name, 'page': page, 'rows': rows, **timing, **extra}
+
+
+def bench_market_quotes(repeat):
+    twse_records = load_fixture()
+    tpex_records = synthetic.tpex_quote_records()
+
+    def run_once():
+        frames = [parse_twse_stock_day_all(twse_records), parse_tpex_mainboard_quotes(tpex_records)]
+        return compute_quote_metrics(pd.concat(frames, ignore_index=True))
+
+    rows = len(twse_records) + len(tpex_records)
+    return [_result('1_強弱勢股100', 'load_all_market_data 解析', rows, time_call(run_once, repeat), output_rows=len(run_once()))]
+
+
+def bench_chips_rank(repeat):
+    payloads = synthetic.chips_payloads()
+    industry_map = {c: '半導體業' for c in synthetic.stock_codes()[::7]}
+    calibrated = synthetic.calibration_frame(synthetic.yahoo_tickers())
+
+    def merge_rank():
+        df_stock = merge_market_chips(build_twse_data(payloads), build_tpex_data(payloads), industry_map)
+        df_buy_raw, df_sell_raw = top_chips(df_stock)
+        calibration_tickers(df_buy_raw, df_sell_raw)
+        return finalize_rank(df_buy_raw, df_sell_raw, calibrated)
+
+    rows = len(payloads['TWSE 法人']['data']) + len(payloads['TPEX 法人']['aaData'])
+    df_buy, df_sell = merge_rank()
+    return [_result('2_法人買賣超排行v5', '法人合併 + 排行 + 校準', rows, time_call(merge_rank, repeat), output_rows=len(df_buy) + len(df_sell))]
+
+
+def bench_chip_streak(repeat):
+    frames = synthetic.daily_chips()
+    state = build_streak_state(frames[1:])
+    rows = sum(len(f) for f in frames)
+    return [
+        _result('3_法人連續買賣超v4', '連續天數 一次重算 (compute_chip_streaks)', rows, time_call(lambda: compute_chip_streaks(frames), repeat)),
+        _result('3_法人連續買賣超v4', '連續天數 狀態重建 (build_streak_state)', rows, time_call(lambda: build_streak_state(frames), max(3, repeat // 4))),
+        _result('3_法人連續買賣超v4', '連續天數 逐日推進 (advance_streak_state)', len(frames[0]), time_call(lambda: advance_streak_state(state, frames[0]), repeat)),
+        _result('3_法人連續買賣超v4', '連續天數 查詢 (lookup_streaks)', len(state), time_call(lambda: lookup_streaks(state, 20), repeat)),
+    ]
+
+
+def bench_macd(repeat):
+    panel = synthetic.ohlcv_panel()
+    tickers = list(panel['Close'].columns)
+    rows = panel['Close'].size
+
+    def per_ticker():
+        hits = []
+        for t in tickers:
+            res = calculate_macd_strategy(t, ohlcv_frame(panel, t), MACD_MIN_VOLUME_K)
+            if res: hits.append(res)
+        return hits
+
+    vectorized = lambda: screen_macd_market(panel, tickers, MACD_MIN_VOLUME_K)
+    identical = per_ticker() == vectorized()
+    rule = compile_rule(MACD_RULE, PANEL_VARIABLES)
+    by_rule = lambda: screen_rule_market(panel, tickers, rule, MACD_MIN_VOLUME_K)
+    same_hits = [r['代碼'] for r in by_rule()] == [r['代碼'] for r in vectorized()]
+    return [
+        _result('4_MACD選股v6_Turbo', 'calculate_macd_strategy 全市場逐檔', rows, time_call(per_ticker, max(1, repeat // 10)), identical=identical),
+        _result('4_MACD選股v6_Turbo', 'screen_macd_market 全市場向量化', rows, time_call(vectorized, repeat), identical=identical),
+        _result('4_MACD選股v6_Turbo', 'screen_rule_market 自訂條件式 (等價四大條件)', rows, time_call(by_rule, repeat), identical=same_hits),
+    ]
+
+
+def bench_announcements(repeat):
+    routes = synthetic.announcement_payloads(TARGET_DATE)
+    rows = sum(len(v['data']) if isinstance(v, dict) else len(v) for v in routes.values())
+    with stub_http(routes):
+        notice_set, punish_db, _, _ = fetch_official_announcements(TARGET_DATE)
+        timing = time_call(lambda: fetch_official_announcements(TARGET_DATE), repeat)
+    return [_result('5_注意警示股v6', 'fetch_official_announcements 解析', rows, timing, output_rows=len(notice_set) + len(punish_db))]
+
+
+CASES = [bench_market_quotes, bench_chips_rank, bench_chip_streak, bench_macd, bench_announcements]
+
+
+def run(repeat=20):
+    results = []
+    for case in CASES:
+        results += case(repeat)
+    return results
+
+
+if __name__ == '__main__':
+    for r in run():
+        print(f"[{r['page']}] {r['name']:<44} rows={r['rows']:<7} median={r['median_ms']:>9.2f} ms  p90={r['p90_ms']:>9.2f} ms")
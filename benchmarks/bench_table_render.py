@@ -0,0 +1,93 @@
+"""
+結果表渲染：舊版 df.style.apply(axis=1) + to_html() 與 core/table_render 的比較
+
+以 pages/1 強弱勢股的表格 (10 欄，收盤粗體、漲跌紅綠、振幅橘色、漲跌停整列底色) 為例，
+分別量測 100 / 1000 / 2000 列的渲染時間與輸出 HTML 大小，並逐格比對兩者的顯示文字與套用的樣式。
+
+執行方式 (專案根目錄)：python -m benchmarks.bench_table_render
+"""
+import re
+
+from benchmarks import synthetic
+from benchmarks.common import time_call
+from core.table_render import cell_css, header_css, quote_styles, render_table
+
+ROW_COUNTS = [100, 1000, 2000]
+FORMATS = {"開盤": "{:.2f}", "最高": "{:.2f}", "最低": "{:.2f}",
+           "收盤": "{:.2f}", "漲跌": "{:.2f}",
+           "漲幅%": "{:.2f} %", "振幅%": "{:.2f} %", "成交量(張)": "{:.0f}"}
+
+
+# --- 舊版 (pages/1 原本的寫法，作為比對基準) ---
+def legacy_custom_style(row):
+    styles = []
+    for col in row.index:
+        css = ""
+        if col == '收盤': css += "font-weight: bold; "
+        if col in ['漲跌', '漲幅%']:
+            if row[col] > 0: css += "color: #ff4b4b; "
+            elif row[col] < 0: css += "color: #1e7b1e; "
+        if col == '振幅%':
+            css += "color: #ff8c00; font-weight: bold; "
+        if row['漲幅%'] >= 9.85: css += "background-color: rgba(255, 75, 75, 0.2); "
+        elif row['漲幅%'] <= -9.85: css += "background-color: rgba(0, 136, 0, 0.15); "
+        styles.append(css)
+    return styles
+
+
+def legacy_html(df):
+    return df.style.apply(legacy_custom_style, axis=1)\
+             .format(FORMATS)\
+             .hide(axis="index")\
+             .set_table_attributes('style="width: 100%; border-collapse: collapse; text-align: center;"')\
+             .set_table_styles([
+                 {'selector': 'th', 'props': [('font-size', '20px'), ('text-align', 'center'), ('padding', '12px'), ('border-bottom', '2px solid #555')]},
+                 {'selector': 'td', 'props': [('font-size', '20px'), ('text-align', 'center'), ('padding', '12px'), ('border-bottom', '1px solid #ddd')]}
+             ]).to_html()
+
+
+def new_html(df):
+    return render_table(df, styles=quote_styles(df, accent_cols=('振幅%',)), formats=FORMATS,
+                        th_css=header_css(20), td_css=cell_css(20))
+
+
+# --- 比對 ---
+def _declarations(css):
+    return frozenset(d.strip() for d in css.split(';') if d.strip())
+
+
+def _cell_texts(html_text):
+    return [t.strip() for t in re.findall(r'<td[^>]*>(.*?)</td>', html_text, flags=re.S)]
+
+
+def same_output(df):
+    """顯示文字逐格相同，且每格套用的 CSS 宣告集合與舊版相同"""
+    if _cell_texts(legacy_html(df)) != _cell_texts(new_html(df)):
+        return False
+    legacy = df.apply(legacy_custom_style, axis=1, result_type='expand')
+    legacy.columns = df.columns
+    styles = quote_styles(df, accent_cols=('振幅%',))
+    return all(_declarations(a) == _declarations(b)
+               for col in df.columns for a, b in zip(legacy[col], styles[col]))
+
+
+def run(repeat=20):
+    results = []
+    for n in ROW_COUNTS:
+        df = synthetic.quote_display(n)
+        identical = same_output(df)
+        legacy_timing = time_call(lambda: legacy_html(df), max(1, repeat // 10))
+        timing = time_call(lambda: new_html(df), max(3, repeat // 2))
+        results.append({
+            'name': f"結果表渲染 {n} 列", 'page': 'table_render', 'rows': n, **timing,
+            'legacy_ms': legacy_timing['median_ms'], 'speedup': round(legacy_timing['median_ms'] / timing['median_ms'], 1),
+            'html_bytes': len(new_html(df).encode('utf-8')), 'legacy_html_bytes': len(legacy_html(df).encode('utf-8')),
+            'identical': identical,
+        })
+    return results
+
+
+if __name__ == '__main__':
+    for r in run():
+        print(f"{r['name']:<16} Styler={r['legacy_ms']:>9.2f} ms  新版={r['median_ms']:>8.2f} ms  (x{r['speedup']})  "
+              f"HTML {r['legacy_html_bytes'] / 1024:>7.1f} KB → {r['html_bytes'] / 1024:>6.1f} KB  一致={r['identical']}")
@@ -0,0 +1,69 @@
+"""
+效能量測共用工具：固定樣本 (STOCK_DAY_ALL.json)、計時函式與 HTTP 替身
+"""
+import os
+import json
+import time
+import statistics
+import contextlib
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(ROOT, "STOCK_DAY_ALL.json")
+
+
+def load_fixture():
+    with open(FIXTURE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def time_call(fn, repeat=20, warmup=1):
+    """執行 fn repeat 次 (先暖身 warmup 次)，回傳 {median_ms, min_ms, p90_ms, repeat}"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples) * 1000, 3),
+        'min_ms': round(samples[0] * 1000, 3),
+        'p90_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.9))] * 1000, 3),
+        'repeat': repeat,
+    }
+
+
+# ==========================================
+# HTTP 替身：量測期間 requests.get 只會回傳預先準備好的 payload
+# ==========================================
+class StubResponse:
+    def __init__(self, payload, status_code=200):
+        self.status_code = status_code
+        self.text = json.dumps(payload, ensure_ascii=False)
+
+    def json(self):
+        # 每次重新解碼，讓量測包含與真實連線相同的 JSON 解析成本
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+@contextlib.contextmanager
+def stub_http(routes):
+    """
+    routes: {URL 片段: payload}；URL 含該片段即回傳對應 payload
+    沒有對應的 URL 直接丟出例外，確保量測過程不會真的連網
+    """
+    def fake_get(url, *args, **kwargs):
+        for key, payload in routes.items():
+            if key in url:
+                return StubResponse(payload)
+        raise ConnectionError(f"benchmark 不允許連網：{url}")
+
+    # 關閉磁碟快取：替身 payload 不可被當成歷史資料寫進 cache/http；替身不必限速
+    with mock.patch.dict(os.environ, {'HTTP_CACHE_MODE': 'off', 'RATE_LIMIT_ENABLED': '0'}), mock.patch('requests.get', side_effect=fake_get):
+        yield
@@ -0,0 +1,251 @@
+"""
+多使用者壓測：N 個無頭 session 同時操作各頁主要功能，量測端到端延遲、峰值記憶體與上游請求數
+
+每個 session 以 Streamlit AppTest 在同一個行程內執行頁面腳本 (與正式部署相同：所有 session 共用
+st.cache_data / st.cache_resource)，上游全部改連 benchmarks/stub_server.py 的替身伺服器。
+
+每個情境跑 --rounds 輪：
+  cold  先清空 st.cache_data，模擬收盤後第一批使用者同時湧入
+  warm  快取已就緒，之後每一輪都應該幾乎不再打上游
+macd 的 cold 輪會把全市場 K 線同步進暫存的本地資料庫 (約 1800 個 chart 請求)，單核機器上需數分鐘。
+
+報表欄位：p50 / p99 / max 延遲、峰值 RSS、每個 session 平均的上游 (交易所 + Yahoo) 與 Supabase 請求數、
+合併到其他 session 的計算次數 (core/single_flight.py)、等待上游限速的總時間 (core/rate_limit.py)、頁面錯誤數。
+JSON 報表格式與 run_suite 相同 (median_ms = p50)，可用 --baseline 比對找出快取或延遲退化。
+
+執行方式 (專案根目錄)：
+  python -m benchmarks.load_test --sessions 8 --latency-ms 80
+  python -m benchmarks.load_test --scenario chips_rank --scenario macd --sessions 16 --rounds 3
+  python -m benchmarks.load_test --upstream http://127.0.0.1:8765     # 改用已在執行的替身伺服器
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import datetime
+import tempfile
+import threading
+
+import requests
+
+from benchmarks.common import ROOT
+
+DEFAULT_OUT = os.path.join(ROOT, "cache", "benchmarks", "load_test.json")
+PAGE_TIMEOUT = 600   # 單次頁面執行上限 (秒)；第一個 cold session 可能要同步全市場 K 線
+
+
+def _default_date():
+    """最近一個已收盤的平日 (替身伺服器不分假日，只需避開週末讓頁面不被休市檢查擋下)"""
+    d = datetime.date.today() - datetime.timedelta(days=1)
+    while d.weekday() >= 5:
+        d -= datetime.timedelta(days=1)
+    return d
+
+
+# ==========================================
+# 1. 情境：頁面腳本 + 主要操作
+# ==========================================
+def _click(at, label):
+    next(b for b in at.button if label in b.label).click()
+    at.run()
+
+
+def _set_date_and_click(label):
+    def action(at, target_date):
+        at.date_input[0].set_value(target_date)
+        _click(at, label)
+    return action
+
+
+SCENARIOS = {
+    'home': ("Home.py", None),
+    'strong_weak': ("pages/1_強弱勢股100.py", None),
+    'chips_rank': ("pages/2_法人買賣超排行v5.py", _set_date_and_click("開始抓取與精算")),
+    'chip_streak': ("pages/3_法人連續買賣超v4.py", lambda at, d: _click(at, "執行分析")),
+    'macd': ("pages/4_MACD選股v6_Turbo.py", lambda at, d: _click(at, "開始全市場深度掃描")),
+    'warnings': ("pages/5_注意警示股v6.py", _set_date_and_click("執行公告同步")),
+}
+
+
+def run_session(script, action, target_date):
+    """執行一次頁面 (載入 + 主要操作)，回傳 (耗時秒數, 錯誤訊息列表)"""
+    from streamlit.testing.v1 import AppTest
+    t0 = time.perf_counter()
+    errors = []
+    try:
+        at = AppTest.from_file(os.path.join(ROOT, script), default_timeout=PAGE_TIMEOUT)
+        at.run()
+        if action and not at.exception:
+            action(at, target_date)
+        errors = [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+    except Exception as e:
+        errors = [f"{type(e).__name__}: {e}"]
+    return time.perf_counter() - t0, errors
+
+
+# ==========================================
+# 2. 量測工具：百分位數、RSS 取樣、替身伺服器計數
+# ==========================================
+def percentile(samples, q):
+    """nearest-rank 百分位數 (樣本少時 p99 即為最大值)"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource   # 非 Linux：退而使用行程至今的峰值 (macOS 單位為 bytes，Linux 為 KB)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RssSampler:
+    """背景執行緒每 interval 秒取樣一次 RSS，記錄區間內峰值"""
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="rss-sampler", daemon=True)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def stub_counts(base_url):
+    """替身伺服器的請求計數，分成 (上游：交易所 + Yahoo, Supabase)"""
+    counts = requests.get(f"{base_url}/__stats", timeout=10).json()
+    supabase = sum(v for k, v in counts.items() if k.startswith('supabase:'))
+    return sum(counts.values()) - supabase, supabase
+
+
+# ==========================================
+# 3. 執行一個情境的一輪
+# ==========================================
+def run_round(name, sessions, target_date, base_url, phase):
+    import streamlit as st
+    from core import http_cache, rate_limit, single_flight
+    script, action = SCENARIOS[name]
+    if phase == 'cold':
+        st.cache_data.clear()
+
+    upstream_before, supabase_before = stub_counts(base_url)
+    cache_before = http_cache.stats['upstream']
+    shared_before = single_flight.stats['shared']
+    waited_before = sum(v for k, v in rate_limit.stats.items() if k.endswith(':waited_ms'))
+    results = [None] * sessions
+
+    def worker(i, barrier):
+        barrier.wait()   # 所有 session 同時起跑
+        results[i] = run_session(script, action, target_date)
+
+    barrier = threading.Barrier(sessions)
+    threads = [threading.Thread(target=worker, args=(i, barrier), name=f"session-{i}") for i in range(sessions)]
+    with RssSampler() as rss:
+        wall0 = time.perf_counter()
+        for t in threads: t.start()
+        for t in threads: t.join()
+        wall = time.perf_counter() - wall0
+
+    upstream_after, supabase_after = stub_counts(base_url)
+    latencies = [r[0] * 1000 for r in results]
+    errors = [e for r in results for e in r[1]]
+    return {
+        'name': f"{name} ({phase}, {sessions} sessions)", 'page': script.split('/')[-1].replace('.py', ''),
+        'scenario': name, 'phase': phase, 'sessions': sessions,
+        'median_ms': round(percentile(latencies, 50), 1), 'p50_ms': round(percentile(latencies, 50), 1),
+        'p90_ms': round(percentile(latencies, 90), 1), 'p99_ms': round(percentile(latencies, 99), 1),
+        'max_ms': round(max(latencies), 1), 'wall_ms': round(wall * 1000, 1),
+        'peak_rss_mb': round(rss.peak / 2 ** 20, 1),
+        'upstream_per_session': round((upstream_after - upstream_before) / sessions, 2),
+        'supabase_per_session': round((supabase_after - supabase_before) / sessions, 2),
+        'http_get_upstream': http_cache.stats['upstream'] - cache_before,
+        'coalesced': single_flight.stats['shared'] - shared_before,
+        'rate_limit_wait_ms': sum(v for k, v in rate_limit.stats.items() if k.endswith(':waited_ms')) - waited_before,
+        'errors': len(errors), 'error_samples': sorted(set(errors))[:3],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多使用者壓測 (AppTest + 替身伺服器)")
+    parser.add_argument('--scenario', choices=list(SCENARIOS), action='append', help="只跑指定情境 (可重複指定)")
+    parser.add_argument('--sessions', type=int, default=8, help="同時操作的 session 數")
+    parser.add_argument('--rounds', type=int, default=2, help="每個情境的輪數 (第一輪 cold，其餘 warm)")
+    parser.add_argument('--date', type=datetime.date.fromisoformat, default=_default_date(), help="頁面查詢日期 (YYYY-MM-DD)")
+    parser.add_argument('--upstream', help="已在執行的替身伺服器網址；未指定則在本行程內啟動一個")
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="內建替身伺服器的每請求延遲")
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--tickers', type=int, default=1800, help="內建替身伺服器的合成股票檔數")
+    parser.add_argument('--no-rate-limit', action='store_true', help="關閉上游限速 (core/rate_limit.py)，只量測本機負載")
+    parser.add_argument('--out', default=DEFAULT_OUT, help="JSON 報表輸出路徑")
+    parser.add_argument('--baseline', help="比對用的基準報表 (p50 變慢超過門檻即以代碼 1 結束)")
+    args = parser.parse_args(argv)
+
+    # 環境變數必須在載入 core.* / streamlit 之前設定 (快取目錄、log 等級在 import 時決定)
+    work_dir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ.update({
+        'PREWARM_ENABLED': '0', 'HTTP_CACHE_MODE': 'off', 'STREAMLIT_LOGGER_LEVEL': 'error',
+        'RATE_LIMIT_ENABLED': '0' if args.no_rate_limit else '1',
+        'OHLCV_STORE_DIR': os.path.join(work_dir, 'ohlcv'), 'PREWARM_STATE_FILE': os.path.join(work_dir, 'prewarm_state.json'),
+    })
+
+    server = None
+    base_url = args.upstream
+    if not base_url:
+        from benchmarks.stub_server import StubConfig, start_server
+        server, base_url = start_server(StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.tickers))
+    base_url = base_url.rstrip('/')
+    os.environ.update({'UPSTREAM_BASE_URL': base_url, 'SUPABASE_URL': f"{base_url}/supabase", 'SUPABASE_KEY': 'stub.stub.stub'})
+
+    results = []
+    for name in args.scenario or SCENARIOS:
+        for i in range(args.rounds):
+            phase = 'cold' if i == 0 else 'warm'
+            print(f"▶ {name} ({phase}) x {args.sessions} sessions ...", flush=True)
+            results.append(run_round(name, args.sessions, args.date, base_url, phase))
+
+    from benchmarks.run_suite import build_report, compare
+    report = build_report(results)
+    report['load_test'] = {'sessions': args.sessions, 'rounds': args.rounds, 'date': args.date.isoformat(), 'upstream': base_url,
+                           'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms, 'error_rate': args.error_rate}
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f))
+        report['regressions'] = regressions
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+
+    print(f"{'情境':<36} {'p50':>9} {'p99':>9} {'RSS':>8} {'上游/人':>7} {'DB/人':>6} {'合併':>4} {'錯誤':>4}")
+    for r in results:
+        print(f"{r['name']:<36} {r['p50_ms']:>7.0f}ms {r['p99_ms']:>7.0f}ms {r['peak_rss_mb']:>6.0f}MB "
+              f"{r['upstream_per_session']:>7.1f} {r['supabase_per_session']:>6.1f} {r['coalesced']:>4} {r['errors']:>4}")
+        for sample in r['error_samples']:
+            print(f"    ⚠️ {sample[:160]}")
+    print(f"📄 報表：{args.out}")
+    for reg in regressions:
+        print(f"⚠️ 效能退化：{reg['name']} {reg['baseline_ms']} ms → {reg['median_ms']} ms (x{reg['ratio']})")
+    if server:
+        server.shutdown()
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
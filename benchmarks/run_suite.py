@@ -0,0 +1,100 @@
+"""
+離線效能量測總表：執行所有 benchmark，輸出 JSON 報表，並可與基準報表比對找出退化
+
+執行方式 (專案根目錄)：
+  python -m benchmarks.run_suite                                  # 輸出到 cache/benchmarks/report.json
+  python -m benchmarks.run_suite --out base.json                  # 存一份基準
+  python -m benchmarks.run_suite --baseline base.json             # 任一項 median 變慢超過門檻即以代碼 1 結束
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import datetime
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import bench_cache_writes, bench_cold_start, bench_http_cache, bench_official_parser, bench_pages, bench_table_render
+from benchmarks.common import ROOT
+
+SUITES = {'official_parser': bench_official_parser.run, 'pages': bench_pages.run, 'table_render': bench_table_render.run,
+          'cache_writes': bench_cache_writes.run, 'http_cache': bench_http_cache.run, 'cold_start': bench_cold_start.run}
+DEFAULT_OUT = os.path.join(ROOT, "cache", "benchmarks", "report.json")
+REGRESSION_THRESHOLD = 1.25   # median 比基準慢 25% 以上視為退化
+NOISE_FLOOR_MS = 1.0          # 1 ms 以下的項目計時雜訊太大，不列入退化判斷
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        return ""
+
+
+def build_report(results):
+    return {
+        'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'environment': {
+            'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'machine': platform.machine(), 'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """回傳退化項目 [{name, baseline_ms, median_ms, ratio}]；以 (page, name) 對應"""
+    base = {(r['page'], r['name']): r for r in baseline.get('results', [])}
+    regressions = []
+    for r in report['results']:
+        old = base.get((r['page'], r['name']))
+        if not old or old['median_ms'] < NOISE_FLOOR_MS:
+            continue
+        ratio = r['median_ms'] / old['median_ms']
+        r['baseline_ms'] = old['median_ms']
+        r['vs_baseline'] = round(ratio, 2)
+        if ratio > threshold:
+            regressions.append({'name': f"[{r['page']}] {r['name']}", 'baseline_ms': old['median_ms'], 'median_ms': r['median_ms'], 'ratio': round(ratio, 2)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="離線效能量測")
+    parser.add_argument('--out', default=DEFAULT_OUT, help="JSON 報表輸出路徑")
+    parser.add_argument('--baseline', help="比對用的基準報表")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="median 超過基準幾倍視為退化")
+    parser.add_argument('--repeat', type=int, default=20, help="每個項目的量測次數")
+    parser.add_argument('--suite', choices=list(SUITES), action='append', help="只跑指定的量測組 (可重複指定)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.suite or SUITES:
+        print(f"▶ {name} ...", flush=True)
+        results += SUITES[name](repeat=args.repeat)
+
+    report = build_report(results)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report['regressions'] = regressions
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+
+    for r in results:
+        extra = f"  x{r['vs_baseline']} vs 基準" if 'vs_baseline' in r else ""
+        print(f"[{r['page']}] {r['name']:<44} median={r['median_ms']:>9.2f} ms  p90={r['p90_ms']:>9.2f} ms{extra}")
+    print(f"📄 報表：{args.out}")
+    for reg in regressions:
+        print(f"⚠️ 效能退化：{reg['name']} {reg['baseline_ms']} ms → {reg['median_ms']} ms (x{reg['ratio']})")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""
+本地替身伺服器：模擬證交所 / 櫃買中心 / Yahoo chart API / Supabase REST，給壓測與離線操作使用
+
+  /{原始 host}/{原始 path}?...   交易所與 Yahoo 端點 (app 以 UPSTREAM_BASE_URL 改連，見 core/http_cache.py)
+  /supabase/rest/v1/{table}      Supabase PostgREST 子集 (select / eq / lt / in / order / offset / limit、insert / upsert / delete)
+  /__stats                       GET：各端點請求次數；DELETE：歸零
+
+資料由 benchmarks/synthetic 產生 (固定亂數種子，規模由 --tickers 決定)，同一日期的回應內容每次相同。
+延遲 (--latency-ms / --jitter-ms) 與錯誤率 (--error-rate，預設回 503；--error-status 429 模擬限速) 套用在每一個請求上。
+
+執行方式 (專案根目錄)：
+  python -m benchmarks.stub_server --port 8765 --latency-ms 80 --error-rate 0.02 --tickers 1800
+  UPSTREAM_BASE_URL=http://127.0.0.1:8765 SUPABASE_URL=http://127.0.0.1:8765/supabase SUPABASE_KEY=stub.stub.stub \
+      streamlit run Home.py
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import threading
+from collections import Counter
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from benchmarks import synthetic
+from core.http_cache import url_dates
+
+SUPABASE_PREFIX = "/supabase/rest/v1/"
+# 各表的主鍵 (upsert 沒帶 on_conflict 時以此判斷重複)；其餘表單純 append
+PRIMARY_KEYS = {'stock_info': ['stock_id'], 'user_settings': ['key'], 'chips_streak_state': ['stock_id']}
+
+
+class StubConfig:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, tickers=synthetic.N_TICKERS, seed=0, error_status=503):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.tickers = tickers
+        self.seed = seed
+        self.error_status = error_status
+
+
+# ==========================================
+# 1. 交易所 / Yahoo 端點
+# ==========================================
+def _target_date(query):
+    dates = url_dates("?" + query)
+    return max(dates) if dates else (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).date()
+
+
+@lru_cache(maxsize=64)
+def _chips_payloads(tickers, date_ordinal):
+    # 以日期當種子：每天的法人買賣超不同，連續買賣超才有長短
+    return synthetic.chips_payloads(tickers, seed=date_ordinal)
+
+
+@lru_cache(maxsize=64)
+def _announcements(target_date):
+    return synthetic.announcement_payloads(target_date)
+
+
+def _holdings_string(tickers):
+    codes = synthetic.stock_codes(tickers)
+    return ", ".join(["^TWII 加權指數"] + [f"{c} 公司{c}" for c in codes[:: max(1, tickers // 7)][:7]])
+
+
+def exchange_payload(host, path, query, config):
+    """回傳 JSON 可序列化的 payload；不認得的端點回傳 None (404)"""
+    d = _target_date(query)
+    n = config.tickers
+    if host == 'openapi.twse.com.tw':
+        if path.endswith('/exchangeReport/STOCK_DAY_ALL'): return synthetic.stock_day_all_records(n, d)
+        if path.endswith('/opendata/t187ap03_L'): return synthetic.company_records("上市", n)
+        if path.endswith('/holidaySchedule/holidaySchedule'): return []
+    elif host == 'www.twse.com.tw':
+        chips = _chips_payloads(n, d.toordinal())
+        if '/fund/T86' in path: return chips['TWSE 法人']
+        if '/afterTrading/MI_INDEX' in path: return chips['TWSE 行情']
+        if '/afterTrading/BWIBBU_d' in path: return chips['TWSE 本益比']
+        if '/announcement/notice' in path: return _announcements(d)['announcement/notice']
+        if '/announcement/punish' in path: return _announcements(d)['announcement/punish']
+    elif host == 'www.tpex.org.tw':
+        chips = _chips_payloads(n, d.toordinal())
+        if '3itrade_hedge_result' in path: return chips['TPEX 法人']
+        if 'stk_quote_result' in path: return chips['TPEX 行情']
+        if 'pera_result' in path: return chips['TPEX 本益比']
+        if path.endswith('/tpex_mainboard_quotes'): return synthetic.tpex_quote_records(max(1, n - int(n * synthetic.TWSE_SHARE)))
+        if path.endswith('/t187ap03_O'): return synthetic.company_records("上櫃", n)
+        if path.endswith('/tpex_disposal_information'): return _announcements(d)['tpex_disposal_information']
+        if path.endswith('/tpex_trading_warning_information'): return _announcements(d)['tpex_trading_warning_information']
+    elif host == 'query2.finance.yahoo.com' and '/v8/finance/chart/' in path:
+        ticker = path.rsplit('/', 1)[-1]
+        params = dict(parse_qsl(query))
+        end = datetime.date.today()
+        if 'period2' in params:
+            start = datetime.datetime.utcfromtimestamp(int(params['period1'])).date()
+            end = datetime.datetime.utcfromtimestamp(int(params['period2'])).date() - datetime.timedelta(days=1)
+        else:
+            months = {'1mo': 1, '3mo': 3, '6mo': 6, '1y': 12}.get(params.get('range', '6mo'), 6)
+            start = end - datetime.timedelta(days=31 * months)
+        return synthetic.yahoo_chart(ticker, start, end)
+    return None
+
+
+# ==========================================
+# 2. Supabase (PostgREST 子集，資料存在記憶體)
+# ==========================================
+class SupabaseStore:
+    def __init__(self, config):
+        self.lock = threading.Lock()
+        twse, tpex = synthetic.split_markets(synthetic.stock_codes(config.tickers))
+        self.tables = {
+            'stock_info': [{'stock_id': c, 'stock_name': f"上市{c}", 'market': '上市', 'suffix': '.TW'} for c in twse]
+                          + [{'stock_id': c, 'stock_name': f"上櫃{c}", 'market': '上櫃', 'suffix': '.TWO'} for c in tpex],
+            'user_settings': [{'key': 'holdings', 'value': _holdings_string(config.tickers)}],
+            'chips_ranking_cache': [], 'daily_chips_cache': [], 'warning_stocks_cache': [], 'chips_streak_state': [],
+        }
+
+    @staticmethod
+    def _match(row, filters):
+        for col, op, value in filters:
+            v = row.get(col)
+            if op == 'in':
+                if str(v) not in value: return False
+                continue
+            try:
+                left, right = (float(v), float(value)) if isinstance(v, (int, float)) else (str(v), value)
+            except ValueError:
+                left, right = str(v), value
+            if op == 'eq' and not left == right: return False
+            if op == 'neq' and not left != right: return False
+            if op == 'lt' and not left < right: return False
+            if op == 'lte' and not left <= right: return False
+            if op == 'gt' and not left > right: return False
+            if op == 'gte' and not left >= right: return False
+        return True
+
+    @staticmethod
+    def parse_query(query):
+        """回傳 (filters, select 欄位, order [(欄位, 是否遞減)], offset, limit, on_conflict)"""
+        filters, select, order, offset, limit, on_conflict = [], None, [], 0, None, None
+        for key, value in parse_qsl(query, keep_blank_values=True):
+            if key == 'select':
+                select = None if value.strip() == '*' else [c.strip() for c in value.split(',')]
+            elif key == 'order':
+                for part in value.split(','):
+                    col, _, direction = part.partition('.')
+                    order.append((col, direction.startswith('desc')))
+            elif key == 'offset': offset = int(value)
+            elif key == 'limit': limit = int(value)
+            elif key == 'on_conflict': on_conflict = [c.strip() for c in value.split(',')]
+            elif key == 'columns': continue
+            else:
+                op, _, arg = value.partition('.')
+                if op == 'in':
+                    arg = {v.strip().strip('"') for v in arg.strip('()').split(',')}
+                filters.append((key, op, arg))
+        return filters, select, order, offset, limit, on_conflict
+
+    def select(self, table, query):
+        filters, select, order, offset, limit, _ = self.parse_query(query)
+        with self.lock:
+            rows = [r for r in self.tables.get(table, []) if self._match(r, filters)]
+        for col, desc in reversed(order):
+            rows.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+        rows = rows[offset:offset + limit] if limit is not None else rows[offset:]
+        return [{c: r.get(c) for c in select} if select else dict(r) for r in rows]
+
+    def write(self, table, query, body, merge):
+        _, _, _, _, _, on_conflict = self.parse_query(query)
+        rows = body if isinstance(body, list) else [body]
+        keys = on_conflict or PRIMARY_KEYS.get(table)
+        with self.lock:
+            data = self.tables.setdefault(table, [])
+            if merge and keys:
+                index = {tuple(r.get(k) for k in keys): i for i, r in enumerate(data)}
+                for row in rows:
+                    k = tuple(row.get(c) for c in keys)
+                    if k in index: data[index[k]].update(row)
+                    else:
+                        index[k] = len(data)
+                        data.append(dict(row))
+            else:
+                data.extend(dict(r) for r in rows)
+        return rows
+
+    def delete(self, table, query):
+        filters = self.parse_query(query)[0]
+        with self.lock:
+            data = self.tables.get(table, [])
+            removed = [r for r in data if self._match(r, filters)]
+            self.tables[table] = [r for r in data if not self._match(r, filters)]
+        return removed
+
+
+# ==========================================
+# 3. HTTP 伺服器
+# ==========================================
+def make_handler(config, store, counts, counts_lock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload=None, headers=None):
+            body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _endpoint(self):
+            parts = urlsplit(self.path)
+            if parts.path.startswith(SUPABASE_PREFIX):
+                return f"supabase:{parts.path[len(SUPABASE_PREFIX):]}", parts
+            return parts.path.lstrip('/').split('?')[0], parts
+
+        def _begin(self):
+            """讀完 body、計數 + 模擬延遲；命中錯誤率時直接回 503 並回傳 None"""
+            length = int(self.headers.get('Content-Length') or 0)
+            self.body = self.rfile.read(length) if length else b''   # keep-alive 連線上未讀完的 body 會污染下一個請求
+            name, parts = self._endpoint()
+            if parts.path.startswith('/__stats'):
+                return parts
+            with counts_lock:
+                counts[name] += 1
+            delay = config.latency_ms + random.uniform(0, config.jitter_ms)
+            if delay > 0:
+                time.sleep(delay / 1000)
+            if config.error_rate and random.random() < config.error_rate:
+                # 429 附 Retry-After，用來驗證 core/rate_limit.py 的退讓
+                headers = {'Retry-After': '1'} if config.error_status == 429 else None
+                self._send(config.error_status, {'message': 'stub: injected error'}, headers)
+                return None
+            return parts
+
+        def _read_body(self):
+            return json.loads(self.body) if self.body else None
+
+        def do_GET(self):
+            parts = self._begin()
+            if parts is None: return
+            if parts.path == '/__stats':
+                with counts_lock:
+                    return self._send(200, dict(counts))
+            if parts.path.startswith(SUPABASE_PREFIX):
+                return self._send(200, store.select(parts.path[len(SUPABASE_PREFIX):], parts.query))
+            host, _, path = parts.path.lstrip('/').partition('/')
+            payload = exchange_payload(host, '/' + path, parts.query, config)
+            if payload is None:
+                return self._send(404, {'message': f'stub: unknown endpoint {parts.path}'})
+            self._send(200, payload)
+
+        def do_POST(self):
+            parts = self._begin()
+            if parts is None: return
+            if not parts.path.startswith(SUPABASE_PREFIX):
+                return self._send(404, {'message': 'stub: POST only for supabase'})
+            prefer = self.headers.get('Prefer', '')
+            rows = store.write(parts.path[len(SUPABASE_PREFIX):], parts.query, self._read_body(), 'merge-duplicates' in prefer)
+            self._send(201, None if 'return=minimal' in prefer else rows)
+
+        def do_DELETE(self):
+            parts = self._begin()
+            if parts is None: return
+            if parts.path == '/__stats':
+                with counts_lock:
+                    counts.clear()
+                return self._send(200, {})
+            if not parts.path.startswith(SUPABASE_PREFIX):
+                return self._send(404, {'message': 'stub: DELETE only for supabase'})
+            removed = store.delete(parts.path[len(SUPABASE_PREFIX):], parts.query)
+            self._send(200, None if 'return=minimal' in self.headers.get('Prefer', '') else removed)
+
+    return Handler
+
+
+def start_server(config=None, host='127.0.0.1', port=0):
+    """在背景執行緒啟動替身伺服器，回傳 (server, base_url)；port=0 由系統挑選空閒埠"""
+    config = config or StubConfig()
+    random.seed(config.seed)
+    counts, counts_lock = Counter(), threading.Lock()
+    server = ThreadingHTTPServer((host, port), make_handler(config, SupabaseStore(config), counts, counts_lock))
+    server.daemon_threads = True
+    server.counts = counts
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="交易所 / Yahoo / Supabase 本地替身伺服器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="每個請求固定延遲 (毫秒)")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="額外隨機延遲上限 (毫秒)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="回傳錯誤的機率 (0 ~ 1)")
+    parser.add_argument('--error-status', type=int, default=503, help="注入錯誤的狀態碼 (429 會附 Retry-After: 1)")
+    parser.add_argument('--tickers', type=int, default=synthetic.N_TICKERS, help="合成資料的股票檔數")
+    parser.add_argument('--seed', type=int, default=0, help="延遲 / 錯誤注入的亂數種子")
+    args = parser.parse_args(argv)
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.tickers, args.seed, args.error_status)
+    server, base_url = start_server(config, args.host, args.port)
+    print(f"替身伺服器：{base_url}  (UPSTREAM_BASE_URL={base_url}  SUPABASE_URL={base_url}/supabase)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+離線效能量測用的合成資料 (固定亂數種子，每次產生的內容完全相同)
+格式比照官方 / Yahoo 回傳，規模預設為全市場約 1800 檔
+"""
+import datetime
+import numpy as np
+import pandas as pd
+
+N_TICKERS = 1800
+TWSE_SHARE = 0.55        # 上市檔數佔比，其餘為上櫃
+
+
+def stock_codes(n=N_TICKERS):
+    return [str(1101 + i) for i in range(n)]
+
+
+def split_markets(codes):
+    cut = int(len(codes) * TWSE_SHARE)
+    return codes[:cut], codes[cut:]
+
+
+def yahoo_tickers(n=N_TICKERS):
+    twse, tpex = split_markets(stock_codes(n))
+    return [c + '.TW' for c in twse] + [c + '.TWO' for c in tpex]
+
+
+def ohlcv_panel(n_tickers=N_TICKERS, n_days=150, seed=0):
+    """
+    合成 OHLCV 寬表 {欄位: DataFrame(日期 × Yahoo 代號)}，格式同 core.ohlcv_store.load_ohlcv_panel
+    含少量停牌空白日與新上市 (前段無資料) 的代號，讓對齊邏輯走到真實情境
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp('2026-03-06'), periods=n_days)
+    tickers = yahoo_tickers(n_tickers)
+    drift = rng.normal(0.0005, 0.001, n_tickers)
+    returns = rng.normal(drift, 0.02, (n_days, n_tickers))
+    close = 50 * np.exp(np.cumsum(returns, axis=0)) * rng.uniform(0.2, 20, n_tickers)
+    spread = np.abs(rng.normal(0, 0.01, (n_days, n_tickers)))
+    volume = rng.lognormal(13, 1.2, (n_days, n_tickers)).round()
+
+    halted = rng.random((n_days, n_tickers)) < 0.005
+    listed_late = rng.random(n_tickers) < 0.03
+    first_bar = np.where(listed_late, rng.integers(n_days // 2, n_days - 10, n_tickers), 0)
+    missing = halted | (np.arange(n_days)[:, None] < first_bar[None, :])
+
+    fields = {
+        'Open': close * (1 + rng.normal(0, 0.005, (n_days, n_tickers))),
+        'High': close * (1 + spread),
+        'Low': close * (1 - spread),
+        'Close': close,
+        'Volume': volume,
+    }
+    return {f: pd.DataFrame(np.where(missing, np.nan, arr), index=dates, columns=tickers) for f, arr in fields.items()}
+
+
+def daily_chips(n_tickers=N_TICKERS, n_days=60, seed=1):
+    """合成多日法人買賣超 (由新到舊)，每日為 DataFrame(代號, 名稱, 外資, 投信)，單位：張"""
+    rng = np.random.default_rng(seed)
+    codes = stock_codes(n_tickers)
+    names = [f"公司{c}" for c in codes]
+    # 帶一點自我相關，才會出現長短不一的連買/連賣
+    bias = rng.normal(0, 1, (2, n_tickers))
+    frames = []
+    for _ in range(n_days):
+        bias = 0.8 * bias + rng.normal(0, 0.6, (2, n_tickers))
+        present = rng.random(n_tickers) > 0.01
+        frames.append(pd.DataFrame({
+            '代號': np.array(codes)[present], '名稱': np.array(names)[present],
+            '外資': (bias[0] * 500).round()[present].astype(int),
+            '投信': (bias[1] * 80).round()[present].astype(int),
+        }))
+    return frames
+
+
+def _fmt(v, decimals=0):
+    return f"{v:,.{decimals}f}"
+
+
+def chips_payloads(n_tickers=N_TICKERS, seed=2):
+    """
+    合成 pages/2 的六個官方端點回傳 (T86 / MI_INDEX / BWIBBU_d / 櫃買三大法人 / 櫃買行情 / 櫃買本益比)
+    只保證程式實際讀取的欄位位置與格式正確，其餘欄位填佔位值
+    """
+    rng = np.random.default_rng(seed)
+    twse, tpex = split_markets(stock_codes(n_tickers))
+    # 加入少量 ETF (00 開頭) 與權證 (6 碼)，驗證排除邏輯
+    twse = twse + ['0050', '0056', '030001']
+    n_twse, n_tpex = len(twse), len(tpex)
+
+    def chips_cols(n):
+        return (rng.normal(0, 1, (3, n)) * [[2_000_000], [300_000], [500_000]]).round()
+
+    def prices(n):
+        close = rng.uniform(10, 1000, n).round(2)
+        change = rng.normal(0, 0.02, n) * close
+        return close, change.round(2), rng.lognormal(15, 1.5, n).round()
+
+    t_chips = chips_cols(n_twse)
+    t86_rows = []
+    for i, code in enumerate(twse):
+        row = ['0'] * 19
+        row[0], row[1] = code, f"上市{code}"
+        row[4], row[10], row[11] = _fmt(t_chips[0, i]), _fmt(t_chips[1, i]), _fmt(t_chips[2, i])
+        t86_rows.append(row)
+
+    t_close, t_change, t_vol = prices(n_twse)
+    mi_fields = ['證券代號', '證券名稱', '成交股數', '成交筆數', '成交金額', '開盤價', '最高價', '最低價', '收盤價', '漲跌(+/-)', '漲跌價差']
+    mi_rows = [[code, f"上市{code}", _fmt(t_vol[i]), '1,000', '0', '0', '0', '0', _fmt(t_close[i], 2),
+                "<p style= color:green>-</p>" if t_change[i] < 0 else "<p style= color:red>+</p>", _fmt(abs(t_change[i]), 2)]
+               for i, code in enumerate(twse)]
+    bw_rows = [[code, f"上市{code}", _fmt(t_close[i], 2), '2.5', '114', _fmt(rng.uniform(5, 40), 2), _fmt(rng.uniform(0.5, 8), 2), '114/4Q']
+               for i, code in enumerate(twse)]
+
+    o_chips = chips_cols(n_tpex)
+    o_close, o_change, o_vol = prices(n_tpex)
+    tp_chips_rows = []
+    for i, code in enumerate(tpex):
+        row = ['0'] * 24
+        row[0], row[1] = code, f"上櫃{code}"
+        row[10], row[13], row[22] = _fmt(o_chips[0, i]), _fmt(o_chips[1, i]), _fmt(o_chips[2, i])
+        tp_chips_rows.append(row)
+    tp_quote_rows = []
+    for i, code in enumerate(tpex):
+        row = ['0'] * 17
+        row[0], row[1], row[2], row[3], row[8] = code, f"上櫃{code}", _fmt(o_close[i], 2), f"{o_change[i]:+.2f}", _fmt(o_vol[i])
+        tp_quote_rows.append(row)
+    tp_pe_rows = [[code, f"上櫃{code}", _fmt(rng.uniform(5, 40), 2), '1.5', '114', '2.0', _fmt(rng.uniform(0.5, 8), 2)]
+                  for code in tpex]
+
+    return {
+        'TWSE 法人': {'stat': 'OK', 'fields': [f"f{i}" for i in range(19)], 'data': t86_rows},
+        'TWSE 行情': {'stat': 'OK', 'tables': [{'fields': ['指數', '收盤指數'], 'data': [['發行量加權股價指數', '20,000']]},
+                                               {'fields': mi_fields, 'data': mi_rows}]},
+        'TWSE 本益比': {'stat': 'OK', 'data': bw_rows},
+        'TPEX 法人': {'aaData': tp_chips_rows},
+        'TPEX 行情': {'aaData': tp_quote_rows},
+        'TPEX 本益比': {'aaData': tp_pe_rows},
+    }
+
+
+def calibration_frame(yf_tickers, seed=3):
+    """模擬 Yahoo 校準結果：約一成代號與官方收盤價不同"""
+    rng = np.random.default_rng(seed)
+    n = len(yf_tickers)
+    price = rng.uniform(10, 1000, n).round(2)
+    change = (rng.normal(0, 0.02, n) * price).round(2)
+    return pd.DataFrame({
+        '精準收盤價': price, '精準漲跌': change, '精準漲幅%': (change / (price - change) * 100).round(2),
+    }, index=list(yf_tickers))
+
+
+def tpex_quote_records(n=800, seed=4):
+    """合成 tpex_mainboard_quotes (OpenAPI list[dict])，含少量無成交 ('---') 的股票"""
+    rng = np.random.default_rng(seed)
+    records = []
+    for i, code in enumerate(split_markets(stock_codes())[1][:n]):
+        close = rng.uniform(10, 500)
+        idle = rng.random() < 0.03
+        records.append({
+            'Date': '1150306', 'SecuritiesCompanyCode': code, 'CompanyName': f"上櫃{code}",
+            'Close': '---' if idle else f"{close:.2f}", 'Change': '0.00' if idle else f"{rng.normal(0, 0.02) * close:+.2f}",
+            'Open': '---' if idle else f"{close * 0.99:.2f}", 'High': '---' if idle else f"{close * 1.02:.2f}",
+            'Low': '---' if idle else f"{close * 0.97:.2f}", 'TradingVolume': '0' if idle else _fmt(rng.lognormal(12, 1.5)),
+        })
+    return records
+
+
+def announcement_payloads(target_date, n_notice=60, n_punish=30, n_history=400, seed=5):
+    """
+    合成 pages/5 四個公告端點的回傳，以 URL 片段為 key
+    處置股含大量「已過期」的歷史紀錄 (n_history)，比照官方近 30 天公告的實際規模
+    """
+    rng = np.random.default_rng(seed)
+    twse, tpex = split_markets(stock_codes())
+    roc = lambda d: f"{d.year - 1911}{d.strftime('%m%d')}"
+    roc_slash = lambda d: f"{d.year - 1911}/{d.strftime('%m/%d')}"
+    today = target_date
+
+    notice_rows = [[str(i + 1), code, f"上市{code}", '1', '本益比異常', '0.5', today.strftime('%Y%m%d')]
+                   for i, code in enumerate(rng.choice(twse, n_notice, replace=False))]
+    punish_rows = []
+    for i in range(n_punish + n_history):
+        code = str(rng.choice(twse))
+        start = today - datetime.timedelta(days=int(rng.integers(0, 30)))
+        end = start + datetime.timedelta(days=10 if i < n_punish else -int(rng.integers(1, 5)))
+        punish_rows.append([str(i + 1), roc_slash(start), code, f"上市{code}", '1', '第一次處置', f"{roc_slash(start)}～{roc_slash(end)}",
+                            "每二十分鐘撮合一次" if i % 3 == 0 else "每五分鐘撮合一次", ''])
+
+    disposal = []
+    for i in range(n_punish + n_history):
+        code = str(rng.choice(tpex)) if i % 10 else f"{rng.choice(tpex)}1"   # 少量可轉債代號 (5 碼)
+        start = today - datetime.timedelta(days=int(rng.integers(0, 30)))
+        active = i < n_punish
+        disposal.append({
+            'Date': roc(start), 'SecuritiesCompanyCode': code, 'CompanyName': f"上櫃{code}",
+            'DispositionPeriod': f"{roc(start)}~{roc(start + datetime.timedelta(days=10))}" if active else '',
+            'DisposalCondition': "每二十分鐘撮合一次" if i % 4 == 0 else "每五分鐘撮合一次",
+        })
+    warning = [{'Date': roc(today) if i < n_notice else roc(today - datetime.timedelta(days=1)),
+                'SecuritiesCompanyCode': str(code), 'CompanyName': f"上櫃{code}"}
+               for i, code in enumerate(rng.choice(tpex, n_notice * 3, replace=False))]
+
+    return {
+        'announcement/notice': {'date': today.strftime('%Y%m%d'), 'title': f"{today.year - 1911}年{today.strftime('%m')}月{today.strftime('%d')}日 公布注意交易資訊", 'data': notice_rows},
+        'announcement/punish': {'data': punish_rows},
+        'tpex_disposal_information': disposal,
+        'tpex_trading_warning_information': warning,
+    }
+
+
+def quote_display(n_rows, seed=6):
+    """合成 pages/1 結果表 (df_display 欄位)，約 5% 漲停、3% 跌停，驗證整列底色"""
+    rng = np.random.default_rng(seed)
+    codes = (stock_codes() * (n_rows // N_TICKERS + 1))[:n_rows]
+    prev = rng.uniform(10, 1000, n_rows)
+    pct = np.clip(rng.normal(0, 3.5, n_rows), -10, 10)
+    pct[rng.random(n_rows) < 0.05] = 9.98
+    pct[rng.random(n_rows) < 0.03] = -9.95
+    close = (prev * (1 + pct / 100)).round(2)
+    high = np.maximum(close, prev) * (1 + rng.uniform(0, 0.03, n_rows))
+    low = np.minimum(close, prev) * (1 - rng.uniform(0, 0.03, n_rows))
+    return pd.DataFrame({
+        '代碼': codes, '商品': [f"公司{c}" for c in codes],
+        '開盤': (prev * (1 + rng.normal(0, 0.01, n_rows))).round(2), '最高': high.round(2), '最低': low.round(2),
+        '收盤': close, '漲跌': (close - prev).round(2), '漲幅%': pct.round(2),
+        '振幅%': ((high - low) / prev * 100).round(2), '成交量(張)': rng.lognormal(8, 1.5, n_rows).round(),
+    })
+
+
+def stock_day_all_records(n=N_TICKERS, target_date=datetime.date(2026, 3, 6), seed=8):
+    """合成 STOCK_DAY_ALL (上市全部個股當日行情，OpenAPI list[dict])，格式同 STOCK_DAY_ALL.json"""
+    rng = np.random.default_rng(seed)
+    roc = f"{target_date.year - 1911}{target_date.strftime('%m%d')}"
+    records = []
+    for code in split_markets(stock_codes(n))[0]:
+        prev = rng.uniform(10, 1000)
+        close = prev * (1 + np.clip(rng.normal(0, 0.03), -0.1, 0.1))
+        volume = rng.lognormal(14, 1.5)
+        records.append({
+            'Date': roc, 'Code': code, 'Name': f"上市{code}", 'TradeVolume': f"{volume:.0f}", 'TradeValue': f"{volume * close:.0f}",
+            'OpeningPrice': f"{prev * 1.001:.2f}", 'HighestPrice': f"{max(prev, close) * 1.01:.2f}",
+            'LowestPrice': f"{min(prev, close) * 0.99:.2f}", 'ClosingPrice': f"{close:.2f}",
+            'Change': f"{close - prev:.4f}", 'Transaction': f"{rng.integers(100, 100000)}",
+        })
+    return records
+
+
+def company_records(market, n=N_TICKERS, seed=9):
+    """合成上市 (t187ap03_L) / 上櫃 (t187ap03_O) 公司基本資料"""
+    rng = np.random.default_rng(seed)
+    twse, tpex = split_markets(stock_codes(n))
+    codes, prefix = (twse, "上市") if market == "上市" else (tpex, "上櫃")
+    return [{'公司代號': c, '公司簡稱': f"{prefix}{c}", '產業別': f"{rng.integers(1, 39):02d}"} for c in codes]
+
+
+def yahoo_chart(ticker, start, end, seed=10):
+    """
+    合成 Yahoo chart API 日K (v8/finance/chart) 回傳，start ~ end 之間的平日各一根 K 棒
+    同一代號每次產生的價格走勢相同 (種子取自代號)，不同查詢區間的重疊日價格一致
+    """
+    rng = np.random.default_rng([seed] + [ord(ch) for ch in ticker])
+    origin = pd.Timestamp('2024-01-01')
+    all_days = pd.bdate_range(origin, pd.Timestamp(end))
+    close_all = rng.uniform(10, 1000) * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(all_days))))
+    volume_all = rng.lognormal(13, 1.2, len(all_days)).round()
+    keep = all_days >= pd.Timestamp(start)
+    days, close, volume = all_days[keep], close_all[keep], volume_all[keep]
+    spread = np.abs(rng.normal(0, 0.01, len(days)))
+    timestamps = [int((d - pd.Timedelta(hours=8)).timestamp()) + 9 * 3600 for d in days]   # 台北 09:00 開盤時刻
+    quote = {'open': (close * (1 - spread / 2)).round(2).tolist(), 'high': (close * (1 + spread)).round(2).tolist(),
+             'low': (close * (1 - spread)).round(2).tolist(), 'close': close.round(2).tolist(), 'volume': volume.tolist()}
+    meta = {'symbol': ticker, 'currency': 'TWD', 'regularMarketPrice': quote['close'][-1] if len(days) else None,
+            'regularMarketVolume': quote['volume'][-1] if len(days) else 0}
+    return {'chart': {'result': [{'meta': meta, 'timestamp': timestamps,
+                                  'indicators': {'quote': [quote], 'adjclose': [{'adjclose': quote['close']}]}}], 'error': None}}
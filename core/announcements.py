@@ -0,0 +1,175 @@
+import re
+import datetime
+from core.http_cache import http_get
+from core.single_flight import single_flight
+
+# ==========================================
+# 注意 / 處置股公告 (上市 + 上櫃)
+# ==========================================
+# 解析與抓取分開：parse_* 只吃官方 JSON，可離線測試與量測效能；
+# fetch_official_announcements 負責連線，失敗時呼叫 on_error(訊息) (例如 st.toast)；
+# 同一日期同時只抓一次 (core/single_flight.py)，失敗訊息會轉給每一個等待中的呼叫者。
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+TWSE_CODE_PATTERN = re.compile(r'^[0-9A-Z]{4,6}$')   # 上市保留 4~6 碼
+TPEX_CODE_PATTERN = re.compile(r'^\d{4}$')           # 上櫃嚴格限制 4 碼純數字，剔除可轉債
+
+
+def _date_keys(target_date):
+    return {
+        'twse': target_date.strftime('%Y%m%d'),
+        'roc': f"{target_date.year - 1911}{target_date.strftime('%m%d')}",
+        'roc_title': f"{target_date.year - 1911}年{target_date.strftime('%m')}月{target_date.strftime('%d')}日",
+    }
+
+
+def _match_time(text):
+    return "20分" if "20分" in text or "二十分" in text else ("45分" if "45分" in text or "四十五分" in text else "5分")
+
+
+def _find_code(row):
+    """上市公告每列欄位位置不固定：取第一個像股票代號的欄位，其下一欄為名稱"""
+    for idx, item in enumerate(row):
+        val = str(item).strip()
+        if TWSE_CODE_PATTERN.match(val):
+            name = str(row[idx + 1]).strip() if idx + 1 < len(row) else ""
+            return val, name
+    return "", ""
+
+
+def parse_twse_notice(res_json, target_date):
+    """證交所注意股公告，回傳 (注意股代號集合, 名稱表, 是否已有當日資料)"""
+    keys = _date_keys(target_date)
+    notice_set, name_dict, is_updated = set(), {}, False
+    if res_json.get('date', '') == keys['twse'] or keys['roc_title'] in res_json.get('title', ''):
+        data_list = res_json.get('data', [])
+        if data_list: is_updated = True
+        for row in data_list:
+            code, name = _find_code(row)
+            if code:
+                notice_set.add(code)
+                if name: name_dict[code] = {"名稱": name, "市場": "上市", "suffix": ".TW"}
+    return notice_set, name_dict, is_updated
+
+
+def parse_twse_punish(res_json, target_date):
+    """證交所處置股公告 (近 30 天)，只保留處置期間涵蓋 target_date 者，回傳 (處置表, 名稱表)"""
+    roc_date_str = _date_keys(target_date)['roc']
+    punish_db, name_dict = {}, {}
+    for row in res_json.get('data', []):
+        code, name = _find_code(row)
+        if not code: continue
+        row_str = " ".join(str(item) for item in row)
+        period = next((str(item) for item in row if "~" in str(item) or "～" in str(item)), "")
+        is_active = False
+        if "~" in period or "～" in period:
+            parts = re.split(r'[~～]', period)
+            if len(parts) >= 2:
+                start_d = parts[0].replace('/', '').strip()
+                end_d = parts[1].replace('/', '').strip()
+                if start_d <= roc_date_str <= end_d: is_active = True
+        if is_active:
+            punish_db[code] = {"期間": period, "分盤": _match_time(row_str)}
+            if name: name_dict[code] = {"名稱": name, "市場": "上市", "suffix": ".TW"}
+    return punish_db, name_dict
+
+
+def parse_tpex_disposal(rows, target_date):
+    """櫃買中心處置資訊，回傳 (處置表, 名稱表, 是否已有當日資料)"""
+    roc_date_str = _date_keys(target_date)['roc']
+    punish_db, name_dict, is_updated = {}, {}, False
+    for row in rows:
+        if str(row.get("Date")) == roc_date_str: is_updated = True
+        code = str(row.get("SecuritiesCompanyCode", "")).strip()
+        name = str(row.get("CompanyName", "")).strip()
+        if not TPEX_CODE_PATTERN.match(code): continue
+
+        period = str(row.get("DispositionPeriod", ""))
+        is_active = False
+        if "~" in period or "～" in period:
+            parts = re.split(r'[~～]', period)
+            if len(parts) >= 2:
+                start_d, end_d = parts[0].strip(), parts[1].strip()
+                if len(start_d) == len(roc_date_str) and len(end_d) == len(roc_date_str): is_active = True
+        if not is_active and str(row.get("Date")) == roc_date_str: is_active = True
+        if is_active:
+            punish_db[code] = {"期間": period, "分盤": _match_time(str(row.get("DisposalCondition", "")))}
+            if name: name_dict[code] = {"名稱": name, "市場": "上櫃", "suffix": ".TWO"}
+    return punish_db, name_dict, is_updated
+
+
+def parse_tpex_warning(rows, target_date):
+    """櫃買中心注意股資訊，回傳 (注意股代號集合, 名稱表, 是否已有當日資料)"""
+    roc_date_str = _date_keys(target_date)['roc']
+    notice_set, name_dict, is_updated = set(), {}, False
+    for row in rows:
+        if str(row.get("Date")) != roc_date_str: continue
+        is_updated = True
+        code = str(row.get("SecuritiesCompanyCode", "")).strip()
+        name = str(row.get("CompanyName", "")).strip()
+        if TPEX_CODE_PATTERN.match(code):
+            notice_set.add(code)
+            if name: name_dict[code] = {"名稱": name, "市場": "上櫃", "suffix": ".TWO"}
+    return notice_set, name_dict, is_updated
+
+
+def _get_json(url):
+    """回傳 JSON；非 200 或空內容回傳 None"""
+    res = http_get(url, timeout=10, headers=HEADERS, verify=False)
+    if res.status_code == 200 and res.text.strip():
+        return res.json()
+    return None
+
+
+def fetch_official_announcements(target_date, on_error=None):
+    """
+    抓取並解析 target_date 的注意/處置股公告
+    回傳 (注意股集合, 處置表, 名稱表, 官方是否已更新當日資料)
+    """
+    result, errors = _fetch_announcements(target_date)
+    if on_error:
+        for msg in errors:
+            on_error(msg)
+    return result
+
+
+@single_flight("announcements")
+def _fetch_announcements(target_date):
+    """回傳 (公告結果, 失敗訊息列表)"""
+    errors = []
+    on_error = errors.append
+    keys = _date_keys(target_date)
+    notice_set, punish_db, name_dict = set(), {}, {}
+    is_data_updated = False
+
+    # --- 上市 (TWSE) ---
+    try:
+        res_json = _get_json(f"https://www.twse.com.tw/rwd/zh/announcement/notice?startDate={keys['twse']}&endDate={keys['twse']}&response=json")
+        if res_json is not None:
+            n_set, names, updated = parse_twse_notice(res_json, target_date)
+            notice_set |= n_set; name_dict.update(names); is_data_updated |= updated
+    except:
+        on_error("⚠️ 證交所資料讀取受阻")
+
+    try:
+        start_date_30 = (target_date - datetime.timedelta(days=30)).strftime('%Y%m%d')
+        res_json = _get_json(f"https://www.twse.com.tw/rwd/zh/announcement/punish?startDate={start_date_30}&endDate={keys['twse']}&response=json")
+        if res_json is not None:
+            p_db, names = parse_twse_punish(res_json, target_date)
+            punish_db.update(p_db); name_dict.update(names)
+    except: pass
+
+    # --- 上櫃 (TPEX) ---
+    try:
+        rows = _get_json("https://www.tpex.org.tw/openapi/v1/tpex_disposal_information")
+        if rows is not None:
+            p_db, names, updated = parse_tpex_disposal(rows, target_date)
+            punish_db.update(p_db); name_dict.update(names); is_data_updated |= updated
+
+        rows = _get_json("https://www.tpex.org.tw/openapi/v1/tpex_trading_warning_information")
+        if rows is not None:
+            n_set, names, updated = parse_tpex_warning(rows, target_date)
+            notice_set |= n_set; name_dict.update(names); is_data_updated |= updated
+    except:
+        on_error("⚠️ 櫃買中心 OpenAPI 連線失敗")
+
+    return (notice_set, punish_db, name_dict, is_data_updated), errors
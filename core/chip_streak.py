@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 法人連續買賣超天數 (向量化版)
+# ==========================================
+# daily_frames 依日期由新到舊排列 (index 0 = 最近交易日)，每個 DataFrame 至少含 代號/外資/投信。
+# 規則與原本逐檔迴圈相同：
+#   1. 以最近一日的正負號決定方向 (0 代表無方向，連續天數為 0)
+#   2. 往前逐日累計同方向天數，遇到反向、0 或當日查無此代號即停止
+#   3. 連買為正數、連賣為負數
+STREAK_COLUMNS = {'外資': '外資連買', '投信': '投信連買'}
+
+
+def pivot_daily_chips(daily_frames, codes, col):
+    """
+    將多日籌碼轉成 代號 × 日期 的矩陣，回傳 (數值矩陣, 是否有資料矩陣)
+    同一天重複出現的代號以第一筆為準 (與原本 row.iloc[0] 相同)
+    """
+    codes = pd.Index(codes)
+    values = np.zeros((len(codes), len(daily_frames)))
+    present = np.zeros((len(codes), len(daily_frames)), dtype=bool)
+    for i, df in enumerate(daily_frames):
+        day = df.drop_duplicates('代號', keep='first').set_index('代號')[col]
+        pos = codes.get_indexer(day.index)
+        hit = pos >= 0
+        values[pos[hit], i] = np.nan_to_num(day.to_numpy(dtype='float64')[hit])
+        present[pos[hit], i] = True
+    return values, present
+
+
+def signed_run_length(values, present):
+    """對每一列 (每檔股票) 計算從第 0 欄開始、與第 0 欄同號的連續長度，連賣以負數表示"""
+    sign = np.sign(values)
+    first = sign[:, :1]
+    same = (sign == first) & present & (first != 0)
+    run = np.cumprod(same, axis=1).sum(axis=1)
+    return (first[:, 0] * run).astype(int)
+
+
+def compute_chip_streaks(daily_frames, lookback=None):
+    """
+    一次算出全部股票的外資/投信連續買賣超天數
+    回傳 DataFrame(代號, 外資連買, 投信連買)，只保留至少一項不為 0 的股票
+    """
+    if not daily_frames:
+        return pd.DataFrame(columns=['代號', *STREAK_COLUMNS.values()])
+    frames = daily_frames[:lookback] if lookback else daily_frames
+    codes = frames[0]['代號'].unique()
+    result = pd.DataFrame({'代號': codes})
+    for col, out_col in STREAK_COLUMNS.items():
+        values, present = pivot_daily_chips(frames, codes, col)
+        result[out_col] = signed_run_length(values, present)
+    return result[(result['外資連買'] != 0) | (result['投信連買'] != 0)].reset_index(drop=True)
+
+
+# ==========================================
+# 逐日推進的連續天數狀態 (可持久化)
+# ==========================================
+# 狀態 = 每檔股票「截至最後處理日」的外資/投信連續天數 (正=連買、負=連賣)。
+# 新的一個交易日進來時只需一次合併即可推進；查詢任意天數 L 時，
+# 連續天數 = 正負號 × min(|狀態|, L)，與重新讀取 L 日資料計算的結果相同。
+STATE_COLUMNS = ['代號', '名稱', '外資連買', '投信連買']
+
+
+def empty_streak_state():
+    return pd.DataFrame({'代號': pd.Series(dtype=str), '名稱': pd.Series(dtype=str), '外資連買': pd.Series(dtype=int), '投信連買': pd.Series(dtype=int)})
+
+
+def advance_streak_state(state, df_day):
+    """
+    以新交易日的籌碼推進狀態：同方向則 ±1 累加，反向或 0 則重新起算
+    當日查無資料的股票會被移出狀態 (原本逐日回溯遇到缺資料也是中斷)
+    """
+    day = df_day.drop_duplicates('代號', keep='first')[['代號', '名稱', *STREAK_COLUMNS]]
+    merged = day.merge(state[['代號', *STREAK_COLUMNS.values()]], on='代號', how='left')
+    for col, out_col in STREAK_COLUMNS.items():
+        sign = np.sign(np.nan_to_num(merged[col].to_numpy(dtype='float64')))
+        prev = np.nan_to_num(merged[out_col].to_numpy(dtype='float64'))
+        keep_going = (sign != 0) & (np.sign(prev) == sign)
+        merged[out_col] = np.where(keep_going, prev + sign, sign).astype(int)
+    return merged[STATE_COLUMNS].reset_index(drop=True)
+
+
+def build_streak_state(daily_frames):
+    """由多日籌碼 (由新到舊) 從頭重建狀態，用於初始化、補資料或資料更正後重算"""
+    state = empty_streak_state()
+    for df_day in reversed(daily_frames):
+        state = advance_streak_state(state, df_day)
+    return state
+
+
+def lookup_streaks(state, lookback):
+    """
+    直接由狀態查詢近 lookback 日的連續天數，回傳 DataFrame(代號, 名稱, 外資連買, 投信連買)
+    只保留至少一項不為 0 的股票 (與 compute_chip_streaks 相同)
+    """
+    result = state[STATE_COLUMNS].copy()
+    for out_col in STREAK_COLUMNS.values():
+        v = result[out_col].to_numpy()
+        result[out_col] = (np.sign(v) * np.minimum(np.abs(v), lookback)).astype(int)
+    return result[(result['外資連買'] != 0) | (result['投信連買'] != 0)].reset_index(drop=True)
+
+
+# ==========================================
+# 雲端快取 (daily_chips_cache) 的寫入格式
+# ==========================================
+DAILY_CACHE_KEY = "date,stock_id"   # upsert 的唯一鍵：同一天重抓只會覆寫，不會多出重複列
+
+
+def daily_cache_rows(date_str, df_daily):
+    """
+    過濾掉 ETF 與權證後轉成 daily_chips_cache 的列 (整欄轉型後 tolist 再 zip，不逐列 iterrows)
+    同一代號只留第一筆：同一批 upsert 裡不能出現重複鍵
+    """
+    codes = df_daily['代號'].astype(str)
+    df = df_daily[(codes.str.len() == 4) & (~codes.str.startswith('00'))].drop_duplicates('代號')
+    columns = {
+        "date": [date_str] * len(df), "stock_id": df['代號'].astype(str).tolist(), "stock_name": df['名稱'].astype(str).tolist(),
+        "foreign_buy": df['外資'].astype(int).tolist(), "it_buy": df['投信'].astype(int).tolist(),
+    }
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*columns.values())]
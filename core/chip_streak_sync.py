@@ -0,0 +1,247 @@
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from core.chip_streak import STATE_COLUMNS, DAILY_CACHE_KEY, advance_streak_state, build_streak_state, daily_cache_rows
+from core.shared_data import get_supabase, upsert_error, upsert_rows
+from core.http_cache import http_get
+from core.rate_limit import inherit_priority
+from core.single_flight import single_flight
+from core.timing import span
+from core.trading_calendar import recent_trading_days, trading_days_between
+
+# ==========================================
+# 法人連續買賣超：每日籌碼快取 + 連續天數狀態的同步
+# ==========================================
+# 頁面 (pages/3) 與盤後預熱排程 (core/prewarm.py) 共用；不含任何 UI。
+
+# ==========================================
+# Supabase 籌碼快取 (daily_chips_cache / chips_streak_state)
+# ==========================================
+def get_daily_chips_batch_from_cache(date_strs):
+    """
+    一次讀出多個日期的籌碼快取，回傳 {日期字串: DataFrame}
+    使用分頁機制 (Pagination)，避免單次查詢 1000 筆上限把資料截斷
+    """
+    rows = []
+    try:
+        step = 1000
+        for i in range(0, 200000, step):
+            res = get_supabase().table("daily_chips_cache").select("date, stock_id, stock_name, foreign_buy, it_buy")\
+                .in_("date", list(date_strs)).order("date").order("stock_id").range(i, i + step - 1).execute()
+            rows.extend(res.data)
+            if len(res.data) < step:
+                break
+    except: return {}
+
+    cached = {}
+    if rows:
+        for date_str, df in pd.DataFrame(rows).groupby('date', sort=False):
+            if len(df) > 300:
+                df = df[['stock_id', 'stock_name', 'foreign_buy', 'it_buy']].reset_index(drop=True)
+                df.columns = ['代號', '名稱', '外資', '投信']
+                cached[date_str] = df
+    return cached
+
+
+def get_daily_chips_from_cache(date_str):
+    return get_daily_chips_batch_from_cache([date_str]).get(date_str)
+
+
+def save_daily_chips_to_cache(date_str, df_daily):
+    """過濾掉 ETF 與權證後以 (date, stock_id) upsert 存入雲端；回傳各分塊的寫入結果"""
+    return upsert_rows("daily_chips_cache", daily_cache_rows(date_str, df_daily), DAILY_CACHE_KEY)
+
+
+def load_streak_state():
+    """
+    讀取雲端的連續天數狀態 (chips_streak_state 表：stock_id, stock_name, foreign_streak, it_streak, as_of, history_days)
+    回傳 (狀態 DataFrame, 最後處理日, 累計處理天數)；沒有狀態時回傳 (None, None, 0)
+    """
+    rows = []
+    try:
+        step = 1000
+        for i in range(0, 20000, step):
+            res = get_supabase().table("chips_streak_state").select("stock_id, stock_name, foreign_streak, it_streak, as_of, history_days")\
+                .order("stock_id").range(i, i + step - 1).execute()
+            rows.extend(res.data)
+            if len(res.data) < step:
+                break
+    except: return None, None, 0
+    if not rows: return None, None, 0
+
+    df = pd.DataFrame(rows)
+    # 最後處理日沒有出現的股票 (當日查無資料) 已中斷連續，只取最新一批
+    as_of = df['as_of'].max()
+    df = df[df['as_of'] == as_of]
+    state_df = df[['stock_id', 'stock_name', 'foreign_streak', 'it_streak']].reset_index(drop=True)
+    state_df.columns = STATE_COLUMNS
+    return state_df, dt.date.fromisoformat(as_of), int(df['history_days'].max())
+
+
+def save_streak_state(state_df, as_of, history_days):
+    """以 stock_id 為鍵 upsert 整份狀態，並清掉已中斷 (較舊 as_of) 的列；回傳寫入失敗摘要 (全部成功為 None)"""
+    as_of_str = as_of.strftime('%Y-%m-%d')
+    payload = pd.DataFrame({
+        "stock_id": state_df['代號'].astype(str), "stock_name": state_df['名稱'].astype(str),
+        "foreign_streak": state_df['外資連買'].astype(int), "it_streak": state_df['投信連買'].astype(int),
+        "as_of": as_of_str, "history_days": int(history_days)
+    }).to_dict('records')
+    error = upsert_error(upsert_rows("chips_streak_state", payload, "stock_id"))
+    # 有分塊寫入失敗時不清舊列，否則那些代號的狀態會整個消失
+    if error is None:
+        try: get_supabase().table("chips_streak_state").delete().lt("as_of", as_of_str).execute()
+        except: pass
+    return error
+
+
+# ==========================================
+# 抓取單日籌碼
+# ==========================================
+CHIPS_FETCH_WORKERS = 4     # 同時向官方抓取的日期數上限，避免短時間湧入過多請求
+CHIPS_WAVE_MARGIN = 1       # 每一波多抓幾個候選日，吸收今日盤後資料尚未公布的空缺
+
+
+@single_flight("daily_chips")
+def fetch_official_day_chips(target_date):
+    """
+    向證交所/櫃買中心抓取單日三大法人買賣超，成功後寫回快取 (同一日期同時只抓一次)
+    回傳 (DataFrame 或 None, 寫入快取失敗摘要或 None)
+    """
+    date_str_db = target_date.strftime('%Y-%m-%d')
+    date_str_twse = target_date.strftime('%Y%m%d')
+    roc_year = target_date.year - 1911
+    date_str_tpex = f"{roc_year}/{target_date.strftime('%m/%d')}"
+    headers = {'User-Agent': 'Mozilla/5.0'}
+
+    try:
+        url_l = f"https://www.twse.com.tw/rwd/zh/fund/T86?date={date_str_twse}&selectType=ALL&response=json"
+        res_l = http_get(url_l, headers=headers, verify=False, timeout=10).json()
+        df_l = pd.DataFrame(res_l['data'], columns=res_l['fields']).iloc[:, [0, 1, 4, 10]] if res_l.get('stat') == 'OK' else pd.DataFrame()
+        
+        url_o = f"https://www.tpex.org.tw/web/stock/3insti/daily_trade/3itrade_hedge_result.php?l=zh-tw&o=json&se=AL&t=D&d={date_str_tpex}"
+        res_o = http_get(url_o, headers=headers, verify=False, timeout=10).json()
+        raw_o = res_o.get('aaData') or []
+        df_o = pd.DataFrame(raw_o).iloc[:, [0, 1, 10, 13]] if raw_o else pd.DataFrame()
+        
+        if df_l.empty and df_o.empty: return None, None
+        
+        # 上市與上櫃欄位名稱不同，先統一欄名再合併
+        for df_part in [df_l, df_o]:
+            if not df_part.empty: df_part.columns = ['代號', '名稱', '外資', '投信']
+        df_combined = pd.concat([d for d in [df_l, df_o] if not d.empty], ignore_index=True)
+        df_combined['代號'] = df_combined['代號'].astype(str).str.strip()
+        df_combined['名稱'] = df_combined['名稱'].astype(str).str.strip()
+        for col in ['外資', '投信']:
+            df_combined[col] = pd.to_numeric(df_combined[col].astype(str).str.replace(',', ''), errors='coerce').fillna(0).astype(int) // 1000
+        
+        save_error = upsert_error(save_daily_chips_to_cache(date_str_db, df_combined))
+        return df_combined[(df_combined['代號'].str.len() == 4) & (~df_combined['代號'].str.startswith('00'))], save_error
+    except: return None, None
+
+
+def fetch_one_day_chips(target_date):
+    cached = get_daily_chips_from_cache(target_date.strftime('%Y-%m-%d'))
+    if cached is not None:
+        return cached
+    return fetch_official_day_chips(target_date)[0]
+
+
+def fetch_days_chips(candidate_dates):
+    """
+    一次處理多個候選日：快取以單一批次查詢讀出，
+    未命中的日期再以有上限的執行緒池並行向官方抓取
+    回傳 ({日期: DataFrame 或 None}, [寫入快取失敗的訊息])
+    """
+    date_strs = [d.strftime('%Y-%m-%d') for d in candidate_dates]
+    cached = get_daily_chips_batch_from_cache(date_strs)
+    results = {d: cached.get(s) for d, s in zip(candidate_dates, date_strs)}
+    misses = [d for d in candidate_dates if results[d] is None]
+    cache_errors = []
+    if misses:
+        with ThreadPoolExecutor(max_workers=min(CHIPS_FETCH_WORKERS, len(misses)), initializer=inherit_priority()) as pool:
+            for d, (df_day, save_error) in zip(misses, pool.map(fetch_official_day_chips, misses)):
+                results[d] = df_day
+                if save_error:
+                    cache_errors.append(f"{d} 籌碼快取 {save_error}")
+    return results, cache_errors
+
+
+def collect_recent_day_chips(n_days):
+    """
+    依交易日曆往回湊滿 n_days 個「有資料」的交易日，回傳 ([(日期, DataFrame)] 由新到舊排列, [寫入快取失敗的訊息])
+    分波並行抓取：每波只抓「還缺幾天 + 緩衝」個候選日
+    """
+    # 多留 3 天緩衝：今日盤後資料可能尚未公布，或個別日期官方查無資料
+    candidates = recent_trading_days(n_days + 3, end=dt.date.today())
+    collected, cache_errors = [], []
+    pos = 0
+    while len(collected) < n_days and pos < len(candidates):
+        wave = candidates[pos:pos + (n_days - len(collected)) + CHIPS_WAVE_MARGIN]
+        pos += len(wave)
+        day_results, errors = fetch_days_chips(wave)
+        cache_errors += errors
+        for d in wave:
+            if day_results[d] is not None and len(collected) < n_days:
+                collected.append((d, day_results[d]))
+    return collected, cache_errors
+
+
+# ==========================================
+# 連續天數狀態：每個新交易日只做一次合併
+# ==========================================
+STREAK_STATE_MIN_WINDOW = 20    # 重建狀態時至少回溯的交易日數
+STREAK_STATE_MAX_GAP = 10       # 狀態落後超過此交易日數時，直接重建比逐日補齊划算
+
+
+def rebuild_streak_state(window):
+    """從最近 window 個交易日的原始籌碼重建狀態 (初始化或資料更正後使用)，回傳值同 sync_streak_state"""
+    with span("fetch", f"collect_recent_day_chips ({window} 日)"):
+        days, cache_errors = collect_recent_day_chips(window)
+    if not days: return None, 0, cache_errors
+    with span("compute", "build_streak_state"):
+        state_df = build_streak_state([df_day for _, df_day in days])
+    with span("fetch", "save_streak_state"):
+        save_error = save_streak_state(state_df, days[0][0], len(days))
+    if save_error:
+        cache_errors.append(f"連續天數狀態 {save_error}")
+    return state_df, len(days), cache_errors
+
+
+def sync_streak_state(lookback, force_rebuild=False):
+    """
+    將狀態推進到最新已公布的交易日，回傳 (狀態 DataFrame, 累計處理天數, [寫入雲端快取失敗的訊息])
+    落後的交易日依序補齊 (backfill)；遇到查無資料的日期就停在它之前，該日與其後留待下次
+    """
+    with span("fetch", "load_streak_state"):
+        state_df, as_of, history_days = (None, None, 0) if force_rebuild else load_streak_state()
+    if state_df is None or history_days < lookback:
+        return rebuild_streak_state(max(lookback, STREAK_STATE_MIN_WINDOW))
+
+    pending = trading_days_between(as_of + dt.timedelta(days=1), dt.date.today())
+    if len(pending) > STREAK_STATE_MAX_GAP:
+        return rebuild_streak_state(max(lookback, STREAK_STATE_MIN_WINDOW))
+    if not pending:
+        return state_df, history_days, []
+
+    # pending 都是交易日曆上的開市日，查無資料代表抓取失敗或尚未公布：只推進到第一個缺口之前，
+    # 缺口與其後的日期留待下次重抓，不能跳過 (as_of 一旦越過就不會再補)
+    with span("fetch", f"fetch_days_chips ({len(pending)} 日)"):
+        day_results, cache_errors = fetch_days_chips(pending)
+    published = []
+    for d in pending:
+        if day_results[d] is None:
+            break
+        published.append(d)
+    if not published:
+        return state_df, history_days, cache_errors
+    with span("compute", "advance_streak_state"):
+        for d in published:
+            state_df = advance_streak_state(state_df, day_results[d])
+    history_days += len(published)
+    with span("fetch", "save_streak_state"):
+        save_error = save_streak_state(state_df, published[-1], history_days)
+    if save_error:
+        cache_errors.append(f"連續天數狀態 {save_error}")
+    return state_df, history_days, cache_errors
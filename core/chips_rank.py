@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+from core.official_parser import to_number, signed_change
+
+# ==========================================
+# 法人買賣超排行：官方 payload 合併 → 排行 → Yahoo 校準
+# ==========================================
+# payloads 為 {端點名稱: JSON 或 None}，端點名稱見 core/chips_rank_sync.py 的 official_urls。
+# 部分失敗策略：法人資料是必要的；行情或本益比缺漏時以空值補上，該市場照常排行。
+# 有任何端點缺漏時只給當次頁面顯示，不寫入快取 (見 core/chips_rank_sync.py 的 compute_chips_ranking)。
+RANK_SIZE = 100
+OUTPUT_COLUMNS = ['排名', '代號', '名稱', '產業類別', '收盤價', '漲跌', '漲幅%', '成交量', '外資', '投信', '自營商', '法人買賣超', '本益比', '股價淨值比', '每股淨值']
+
+
+def missing_endpoints(payloads):
+    """六個端點中抓取失敗或尚未公布 (沒有資料) 的端點名稱"""
+    def published(name, res):
+        if not res: return False
+        if name == 'TWSE 行情':
+            return any('收盤價' in t.get('fields', []) and t.get('data') for t in res.get('tables', []))
+        if name.startswith('TWSE'):
+            return res.get('stat') == 'OK' and bool(res.get('data'))
+        return bool(res.get('aaData'))
+    return [name for name, res in payloads.items() if not published(name, res)]
+
+
+def build_twse_data(payloads):
+    try:
+        res = payloads.get('TWSE 法人')
+        if not res or res.get('stat') != 'OK': return None
+        df_chips = pd.DataFrame(res['data'], columns=res['fields']).iloc[:, [0, 1, 4, 10, 11]]
+        df_chips.columns = ['代號', '名稱', '外資', '投信', '自營商']
+    except: return None
+
+    df_price = pd.DataFrame(columns=['代號', '成交量_股', '收盤價', '漲跌'])
+    try:
+        res_price = payloads.get('TWSE 行情') or {}
+        valid_tables = [t for t in res_price.get('tables', []) if '收盤價' in t.get('fields', [])]
+        if valid_tables:
+            target_table = max(valid_tables, key=lambda x: len(x.get('data', [])))
+            df_price = pd.DataFrame(target_table['data'], columns=target_table['fields'])
+            sign_col = next((c for c in target_table['fields'] if '漲跌' in c and '價差' not in c), '漲跌(+/-)')
+            df_price = df_price[['證券代號', '成交股數', '收盤價', sign_col, '漲跌價差']]
+            df_price.columns = ['代號', '成交量_股', '收盤價', '漲跌符號', '漲跌價差']
+            df_price['漲跌'] = signed_change(df_price['漲跌符號'], df_price['漲跌價差'])
+    except:
+        df_price = pd.DataFrame(columns=['代號', '成交量_股', '收盤價', '漲跌'])
+
+    df_pe = pd.DataFrame(columns=['代號', '本益比', '股價淨值比'])
+    try:
+        res_pe = payloads.get('TWSE 本益比') or {}
+        if res_pe.get('stat') == 'OK':
+            df_pe = pd.DataFrame(res_pe['data']).iloc[:, [0, 5, 6]]
+            df_pe.columns = ['代號', '本益比', '股價淨值比']
+    except: pass
+
+    merged = pd.merge(df_chips, df_price[['代號', '收盤價', '漲跌', '成交量_股']], on='代號', how='left')
+    return pd.merge(merged, df_pe, on='代號', how='left')
+
+
+def build_tpex_data(payloads):
+    try:
+        raw = (payloads.get('TPEX 法人') or {}).get('aaData') or []
+        if not raw: return None
+        df_chips = pd.DataFrame(raw).iloc[:, [0, 1, 10, 13, 22]]
+        df_chips.columns = ['代號', '名稱', '外資', '投信', '自營商']
+    except: return None
+
+    df_price = pd.DataFrame(columns=['代號', '收盤價', '漲跌', '成交量_股'])
+    try:
+        raw_price = (payloads.get('TPEX 行情') or {}).get('aaData') or []
+        if raw_price:
+            df_price = pd.DataFrame(raw_price).iloc[:, [0, 2, 3, 8]]
+            df_price.columns = ['代號', '收盤價', '漲跌', '成交量_股']
+    except: pass
+
+    df_pe = pd.DataFrame(columns=['代號', '本益比', '股價淨值比'])
+    try:
+        raw_pe = (payloads.get('TPEX 本益比') or {}).get('aaData') or []
+        if raw_pe:
+            df_pe = pd.DataFrame(raw_pe).iloc[:, [0, 2, 6]]
+            df_pe.columns = ['代號', '本益比', '股價淨值比']
+    except: pass
+
+    merged = pd.merge(df_chips, df_price, on='代號', how='left')
+    return pd.merge(merged, df_pe, on='代號', how='left')
+
+
+def merge_market_chips(df_twse, df_tpex, industry_map):
+    """上市/上櫃合併、數字欄轉型 (股→張)，剔除 ETF 與權證並標上產業；回傳可排行的個股表"""
+    # 上市/上櫃來源已知，Yahoo 後綴不必再盲猜
+    if df_twse is not None: df_twse['suffix'] = '.TW'
+    if df_tpex is not None: df_tpex['suffix'] = '.TWO'
+    df_all = pd.concat([d for d in [df_twse, df_tpex] if d is not None], ignore_index=True)
+    for col in ['外資', '投信', '自營商', '成交量_股']:
+        df_all[col] = to_number(df_all[col]).fillna(0).astype(int)
+
+    df_all['外資'] //= 1000; df_all['投信'] //= 1000; df_all['自營商'] //= 1000
+    df_all['成交量'] = df_all['成交量_股'] // 1000
+    df_all['法人買賣超'] = df_all['外資'] + df_all['投信'] + df_all['自營商']
+    for col in ['收盤價', '漲跌', '本益比', '股價淨值比']: df_all[col] = to_number(df_all[col]).fillna(0.0)
+
+    df_stock = df_all[~df_all['代號'].str.startswith('00') & (df_all['代號'].str.len() < 6)].copy()
+    df_stock['產業類別'] = df_stock['代號'].map(industry_map).fillna('其他')
+    return df_stock
+
+
+def top_chips(df_stock, n=RANK_SIZE):
+    """回傳 (法人買超前 n 名, 法人賣超前 n 名)"""
+    df_buy_raw = df_stock.sort_values(by='法人買賣超', ascending=False).head(n).copy()
+    df_sell_raw = df_stock.sort_values(by='法人買賣超', ascending=True).head(n).copy()
+    return df_buy_raw, df_sell_raw
+
+
+def calibration_tickers(*frames):
+    """排行榜上所有股票的 Yahoo 代號 (排序後的 tuple，可直接當快取鍵)"""
+    return tuple(sorted(set().union(*[(df['代號'] + df['suffix']).tolist() for df in frames])))
+
+
+def apply_calibration(df_target, calibrated_data):
+    # 先以官方收盤/漲跌算出漲幅，僅在 Yahoo 收盤價與官方不一致時才以 Yahoo 精算值覆蓋
+    yest_close = df_target['收盤價'] - df_target['漲跌']
+    df_target['漲幅%'] = np.where(yest_close > 0, (df_target['漲跌'] / yest_close.where(yest_close > 0) * 100).round(2), 0.0)
+    calib = calibrated_data.reindex(df_target['代號'] + df_target['suffix'])
+    calib.index = df_target.index
+    mismatch = calib['精準收盤價'].notna() & ((calib['精準收盤價'] - df_target['收盤價']).abs() >= 0.005)
+    df_target.loc[mismatch, '收盤價'] = calib.loc[mismatch, '精準收盤價']
+    df_target.loc[mismatch, '漲跌'] = calib.loc[mismatch, '精準漲跌']
+    df_target.loc[mismatch, '漲幅%'] = calib.loc[mismatch, '精準漲幅%']
+    pb = df_target['股價淨值比']
+    df_target['每股淨值'] = np.where(pb > 0, (df_target['收盤價'] / pb.where(pb > 0)).round(2), 0)
+    df_target = df_target.reset_index(drop=True)
+    df_target['排名'] = df_target.index + 1
+    return df_target
+
+
+def finalize_rank(df_buy_raw, df_sell_raw, calibrated_data):
+    """套用校準並整理成顯示/快取用欄位，回傳 (買超榜, 賣超榜)"""
+    df_buy = apply_calibration(df_buy_raw, calibrated_data)[OUTPUT_COLUMNS].rename(columns={'法人買賣超': '法人買超'})
+    df_sell = apply_calibration(df_sell_raw, calibrated_data)[OUTPUT_COLUMNS].rename(columns={'法人買賣超': '法人賣超'})
+    return df_buy, df_sell
+
+
+# ==========================================
+# 雲端快取 (chips_ranking_cache) 的寫入格式
+# ==========================================
+RANK_CACHE_KEY = "date,rank_type,rank_no"   # upsert 的唯一鍵：同一天重算只會覆寫，不會多出重複列
+
+
+def rank_cache_rows(date_str, df_buy, df_sell):
+    """買 / 賣超榜轉成 chips_ranking_cache 的列：整欄轉型後 tolist (Python 原生型別) 再 zip 成 dict，不逐列 iterrows"""
+    rows = []
+    for df, r_type, total_col in [(df_buy, 'buy', '法人買超'), (df_sell, 'sell', '法人賣超')]:
+        n = len(df)
+        columns = {
+            "date": [date_str] * n, "rank_type": [r_type] * n, "rank_no": df['排名'].astype(int).tolist(),
+            "stock_id": df['代號'].astype(str).tolist(), "stock_name": df['名稱'].astype(str).tolist(),
+            "industry": df['產業類別'].astype(str).tolist(), "close_price": df['收盤價'].astype(float).tolist(),
+            "change_val": df['漲跌'].astype(float).tolist(), "change_pct": df['漲幅%'].astype(float).tolist(),
+            "volume": df['成交量'].astype(int).tolist(), "foreign_buy": df['外資'].astype(int).tolist(),
+            "it_buy": df['投信'].astype(int).tolist(), "dealer_buy": df['自營商'].astype(int).tolist(),
+            "total_buy": df[total_col].astype(int).tolist(),
+            "pe_ratio": df['本益比'].astype(float).tolist(), "pb_ratio": df['股價淨值比'].astype(float).tolist(),
+            "nav": df['每股淨值'].astype(float).tolist(),
+        }
+        keys = list(columns)
+        rows += [dict(zip(keys, values)) for values in zip(*columns.values())]
+    return rows
@@ -0,0 +1,185 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from core.chips_rank import missing_endpoints, build_twse_data, build_tpex_data, merge_market_chips, top_chips, calibration_tickers, finalize_rank, \
+    rank_cache_rows, RANK_CACHE_KEY
+from core.shared_data import get_supabase, get_industry_map, upsert_error, upsert_rows
+from core.http_cache import http_get, yf_download
+from core.rate_limit import inherit_priority
+from core.single_flight import single_flight
+from core.timing import span
+
+# ==========================================
+# 法人買賣超排行：抓取 → 排行 → 校準 → 雲端快取
+# ==========================================
+# 頁面 (pages/2) 與盤後預熱排程 (core/prewarm.py) 共用同一條流程與同一份快取。
+
+# ==========================================
+# Yahoo 校準
+# ==========================================
+@st.cache_data(ttl=3600)
+def fetch_calibration_closes(yf_tickers, date_obj):
+    """
+    一次批次下載多檔 Yahoo 還原收盤價，回傳 DataFrame(index=Yahoo 代號, 精準收盤價/精準漲跌/精準漲幅%)
+    只回傳目標日有 K 棒、且目標日前有前一根 K 棒的代號
+    """
+    target_ts = pd.Timestamp(date_obj).normalize()
+    columns = ['精準收盤價', '精準漲跌', '精準漲幅%']
+    if not yf_tickers:
+        return pd.DataFrame(columns=columns)
+    try:
+        data = yf_download(list(yf_tickers), start=date_obj - datetime.timedelta(days=20), end=date_obj + datetime.timedelta(days=1),
+                           group_by='ticker', auto_adjust=True, threads=True, progress=False)
+        if not isinstance(data.columns, pd.MultiIndex):
+            data = pd.concat({yf_tickers[0]: data}, axis=1)
+        closes = data.xs('Close', axis=1, level=1)
+        closes.index = pd.to_datetime(closes.index).tz_localize(None).normalize()
+    except Exception:
+        return pd.DataFrame(columns=columns)
+    if target_ts not in closes.index:
+        return pd.DataFrame(columns=columns)
+
+    past = closes[closes.index < target_ts]
+    if past.empty:
+        return pd.DataFrame(columns=columns)
+    price = closes.loc[target_ts]
+    yest_close = past.ffill().iloc[-1]
+    calib = pd.DataFrame({'price': price, 'yest': yest_close}).dropna()
+    return pd.DataFrame({
+        '精準收盤價': calib['price'].round(2),
+        '精準漲跌': (calib['price'] - calib['yest']).round(2),
+        '精準漲幅%': ((calib['price'] - calib['yest']) / calib['yest'] * 100).round(2),
+    }, index=calib.index)
+
+
+# ==========================================
+# 官方大盤資料抓取 (六個端點同時發出；合併與排行見 core/chips_rank.py)
+# ==========================================
+OFFICIAL_TIMEOUT = 10   # 每個官方端點各自的逾時秒數
+
+
+@st.cache_data(ttl=3600)
+def fetch_official_json(url):
+    """抓取單一官方端點；失敗時直接丟出例外 (例外不會被快取，下次會重試)"""
+    headers = {'User-Agent': 'Mozilla/5.0'}
+    res = http_get(url, headers=headers, verify=False, timeout=OFFICIAL_TIMEOUT)
+    res.raise_for_status()
+    return res.json()
+
+
+def official_urls(date_obj):
+    date_str = date_obj.strftime('%Y%m%d')
+    roc_date_str = f"{date_obj.year - 1911}/{date_obj.strftime('%m/%d')}"
+    return {
+        'TWSE 法人': f"https://www.twse.com.tw/rwd/zh/fund/T86?date={date_str}&selectType=ALL&response=json",
+        'TWSE 行情': f"https://www.twse.com.tw/rwd/zh/afterTrading/MI_INDEX?date={date_str}&type=ALL&response=json",
+        'TWSE 本益比': f"https://www.twse.com.tw/rwd/zh/afterTrading/BWIBBU_d?date={date_str}&selectType=ALL&response=json",
+        'TPEX 法人': f"https://www.tpex.org.tw/web/stock/3insti/daily_trade/3itrade_hedge_result.php?l=zh-tw&o=json&se=AL&t=D&d={roc_date_str}",
+        'TPEX 行情': f"https://www.tpex.org.tw/web/stock/aftertrading/daily_close_quotes/stk_quote_result.php?l=zh-tw&o=json&d={roc_date_str}",
+        'TPEX 本益比': f"https://www.tpex.org.tw/web/stock/aftertrading/peratio_analysis/pera_result.php?l=zh-tw&o=json&d={roc_date_str}",
+    }
+
+
+def fetch_official_payloads(date_obj):
+    """
+    六個官方端點以執行緒池同時發出，各自逾時互不影響
+    回傳 ({端點名稱: JSON 或 None}, 失敗的端點名稱清單)
+    """
+    urls = official_urls(date_obj)
+    ctx = get_script_run_ctx()
+    inherit = inherit_priority()   # 預熱排程呼叫時，工作執行緒也以背景優先順序限速
+
+    def init_worker():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        inherit()
+
+    with ThreadPoolExecutor(max_workers=len(urls), initializer=init_worker) as pool:
+        futures = {name: pool.submit(fetch_official_json, url) for name, url in urls.items()}
+    payloads, failed = {}, []
+    for name, future in futures.items():
+        try:
+            payloads[name] = future.result()
+        except Exception:
+            payloads[name] = None
+            failed.append(name)
+    return payloads, failed
+
+
+# ==========================================
+# Supabase 快取 (chips_ranking_cache)
+# ==========================================
+def get_chips_rank_from_cache(date_str):
+    try:
+        res = get_supabase().table("chips_ranking_cache").select("*").eq("date", date_str).execute()
+        if res.data:
+            df = pd.DataFrame(res.data)
+            df_buy = df[df['rank_type'] == 'buy'].sort_values('rank_no')
+            df_sell = df[df['rank_type'] == 'sell'].sort_values('rank_no')
+            # 重新映射欄位名稱以符合 UI 顯示
+            mapping = {
+                'rank_no': '排名', 'stock_id': '代號', 'stock_name': '名稱',
+                'industry': '產業類別', 'close_price': '收盤價', 'change_val': '漲跌',
+                'change_pct': '漲幅%', 'volume': '成交量', 'foreign_buy': '外資',
+                'it_buy': '投信', 'dealer_buy': '自營商', 'total_buy': '法人買超',
+                'pe_ratio': '本益比', 'pb_ratio': '股價淨值比', 'nav': '每股淨值'
+            }
+            return df_buy.rename(columns=mapping), df_sell.rename(columns=mapping).rename(columns={'法人買超': '法人賣超'})
+    except: pass
+    return None, None
+
+
+def save_chips_rank_to_cache(date_str, df_buy, df_sell):
+    """以 (date, rank_type, rank_no) upsert 買 / 賣超榜，重算同一天只會覆寫；回傳各分塊的寫入結果"""
+    return upsert_rows("chips_ranking_cache", rank_cache_rows(date_str, df_buy, df_sell), RANK_CACHE_KEY)
+
+# ==========================================
+# 完整流程
+# ==========================================
+@single_flight("chips_rank")
+def compute_chips_ranking(target_date, require_complete=False):
+    """
+    全市場抓取 → 排行 → Yahoo 校準 → 寫入 chips_ranking_cache
+    回傳 (買超榜, 賣超榜, 失敗或尚未公布的端點清單, 寫入快取失敗摘要或 None)；查無法人資料時買/賣超榜為 None
+    六個端點都有資料才寫入快取：缺了行情 / 本益比或半個市場的排行只回傳給頁面顯示，不會被快取永久保存
+    require_complete=True 時有任何端點缺漏就不排行 (預熱排程使用，稍後重試)
+    同一日期同時只會有一次計算，其他同時按下的使用者等待並共用結果
+    """
+    with span("fetch", "官方法人 / 行情 / 本益比 (6 端點)"):
+        payloads, _ = fetch_official_payloads(target_date)   # 失敗的端點 payload 為 None，一併算在 missing
+    with span("parse", "build_twse_data / build_tpex_data"):
+        df_twse = build_twse_data(payloads)
+        df_tpex = build_tpex_data(payloads)
+    missing = missing_endpoints(payloads)
+    if missing:
+        # 「尚未公布」的回應也會被 st.cache_data 快取一小時，清掉才能在公布後立刻重抓
+        urls = official_urls(target_date)
+        for name in missing:
+            fetch_official_json.clear(urls[name])
+    if (df_twse is None and df_tpex is None) or (require_complete and missing):
+        return None, None, missing, None
+
+    with span("fetch", "get_industry_map"):
+        industry_map = get_industry_map()
+    with span("compute", "合併 + 排行") as s:
+        df_stock = merge_market_chips(df_twse, df_tpex, industry_map)
+        df_buy_raw, df_sell_raw = top_chips(df_stock)
+        s['rows'] = len(df_stock)
+
+    # Yahoo 精算邏輯：前 200 檔一次批次下載
+    with span("fetch", "Yahoo 校準 (fetch_calibration_closes)") as s:
+        tickers = calibration_tickers(df_buy_raw, df_sell_raw)
+        calibrated_data = fetch_calibration_closes(tickers, target_date)
+        s['rows'] = len(tickers)
+    with span("compute", "finalize_rank"):
+        df_buy, df_sell = finalize_rank(df_buy_raw, df_sell_raw, calibrated_data)
+
+    save_error = None
+    if not missing:
+        with span("fetch", "save_chips_rank_to_cache"):
+            save_error = upsert_error(save_chips_rank_to_cache(target_date.strftime('%Y-%m-%d'), df_buy, df_sell))
+    return df_buy, df_sell, missing, save_error
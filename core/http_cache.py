@@ -0,0 +1,302 @@
+"""
+上游 HTTP 回應的本地磁碟快取 (證交所 / 櫃買中心 / Yahoo)
+
+所有抓取一律經過 http_get() (取代 requests.get) 與 yf_download() (取代 yf.download)，
+以正規化後的 URL (查詢參數排序) 為鍵存在 cache/http/ 底下。
+
+模式由環境變數 HTTP_CACHE_MODE 決定：
+  cache   (預設) URL 帶的日期參數全部早於今天 → 歷史資料，命中即直接回傳、永不過期；
+          其餘 (今日 / 不帶日期的「最新」端點) 照常連線
+  record  每次都連線，並把所有回應 (含 yf.download 結果) 錄下來
+  replay  完全離線：只回放錄過的回應，沒錄過就丟出 ConnectionError，不會連網
+  off     直接連線，不讀也不寫
+
+真正連線前一律經過 core/rate_limit.py 的每 host 限速 (以原始 host 計，改連替身時也一樣)。
+
+環境變數 UPSTREAM_BASE_URL (例如 http://127.0.0.1:8765) 會把所有上游改連到本地替身伺服器
+(benchmarks/stub_server.py)：https://host/path?q → {UPSTREAM_BASE_URL}/host/path?q。
+
+錄製一次、離線重播 (專案根目錄)：
+  HTTP_CACHE_MODE=record streamlit run Home.py      # 逐頁操作一輪
+  HTTP_CACHE_MODE=replay streamlit run Home.py      # 之後不需連網，結果與錄製時相同
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+import datetime
+import threading
+from collections import Counter
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from core import rate_limit, timing
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", os.path.join(_ROOT, "cache", "http"))
+MODES = ('cache', 'record', 'replay', 'off')
+DATE_PARAMS = ('date', 'startDate', 'endDate', 'd')   # 證交所 YYYYMMDD、櫃買中心民國 YYY/MM/DD
+KEPT_HEADERS = ('Content-Type', 'Date')   # body 以解壓後內容保存，不保留 Content-Encoding
+
+stats = Counter()          # upstream / hit / stored / replay_miss 次數，供效能量測與壓測報表使用
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        stats[key] += 1
+
+
+def cache_mode():
+    mode = os.environ.get("HTTP_CACHE_MODE", "cache").strip().lower()
+    return mode if mode in MODES else 'cache'
+
+
+def upstream_base():
+    return os.environ.get("UPSTREAM_BASE_URL", "").strip().rstrip('/')
+
+
+def upstream_url(url):
+    """有設定 UPSTREAM_BASE_URL 時改寫成替身伺服器的網址，否則原樣回傳"""
+    base = upstream_base()
+    if not base:
+        return url
+    parts = urlsplit(url)
+    return f"{base}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+
+def _tw_today():
+    return (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).date()
+
+
+# ==========================================
+# 1. URL 正規化與歷史日期判斷
+# ==========================================
+def normalize_url(url, params=None):
+    """scheme / host 轉小寫、查詢參數 (含 params) 依名稱排序，去掉 fragment"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query += list(params.items()) if isinstance(params, dict) else list(params)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(sorted(query)), ''))
+
+
+def _parse_date(value):
+    value = value.strip()
+    if re.fullmatch(r'\d{8}', value):
+        return datetime.date(int(value[:4]), int(value[4:6]), int(value[6:]))
+    m = re.fullmatch(r'(\d{2,3})/(\d{1,2})/(\d{1,2})', value)
+    if m:
+        return datetime.date(int(m.group(1)) + 1911, int(m.group(2)), int(m.group(3)))
+    return None
+
+
+def url_dates(url):
+    """URL 查詢參數裡的交易日期 (無法解析的值略過)"""
+    dates = []
+    for key, value in parse_qsl(urlsplit(url).query):
+        if key in DATE_PARAMS:
+            try:
+                d = _parse_date(value)
+            except ValueError:
+                d = None
+            if d: dates.append(d)
+    return dates
+
+
+def is_historical(url, today=None):
+    """URL 帶有日期、且全部早於今天 → 官方已定稿，內容不會再變"""
+    dates = url_dates(url)
+    return bool(dates) and max(dates) < (today or _tw_today())
+
+
+def _is_final_payload(res):
+    """只有完整的 200 回應才永久保存：官方「查無資料」/ 空表 (可能是暫時性錯誤) 留待下次重抓"""
+    if res.status_code != 200 or not res.content:
+        return False
+    try:
+        payload = res.json()
+    except ValueError:
+        return False
+    if isinstance(payload, dict):
+        if 'stat' in payload and str(payload['stat']).upper() != 'OK':
+            return False
+        if 'aaData' in payload and not payload['aaData']:
+            return False
+        if payload.get('iTotalRecords') == 0:
+            return False
+    return True
+
+
+# ==========================================
+# 2. 磁碟存取
+# ==========================================
+def _paths(key, kind='http'):
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    host = urlsplit(key).netloc or kind
+    folder = os.path.join(CACHE_DIR, host)
+    return os.path.join(folder, f"{digest}.json"), os.path.join(folder, f"{digest}.body.gz")
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def store_response(key, res):
+    meta_path, body_path = _paths(key)
+    meta = {
+        'url': key, 'status': res.status_code, 'encoding': res.encoding,
+        'headers': {k: res.headers[k] for k in KEPT_HEADERS if k in res.headers},
+        'recorded_at': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    # 先寫 body 再寫 meta：讀取端以 meta 是否存在判斷命中，不會讀到寫一半的內容
+    _write_atomic(body_path, gzip.compress(res.content))
+    _write_atomic(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+    _count('stored')
+
+
+def load_response(key):
+    """組回 requests.Response (json() / text / raise_for_status 行為與連線時相同)；沒有錄過回傳 None"""
+    meta_path, body_path = _paths(key)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(body_path, 'rb') as f:
+            body = gzip.decompress(f.read())
+    except (OSError, ValueError, EOFError):
+        return None
+    res = requests.Response()
+    res.status_code = meta['status']
+    res._content = body
+    res.headers = CaseInsensitiveDict(meta.get('headers', {}))
+    res.encoding = meta.get('encoding')
+    res.url = meta['url']
+    res.reason = 'OK' if res.status_code == 200 else 'Recorded'
+    return res
+
+
+# ==========================================
+# 3. 對外介面
+# ==========================================
+def _fetch(origin, url, params, kwargs, limited=True):
+    """真正連線：先依原始 host 限速，回應再回報給限速器 (429 / 轉址到錯誤頁會退讓)"""
+    host = rate_limit.acquire(origin) if limited else None
+    _count('upstream')
+    res = requests.get(url, params=params, **kwargs)
+    if limited:
+        rate_limit.observe(host, res)
+    timing.count_io(timing.source_of(urlsplit(origin).netloc), len(getattr(res, 'content', None) or b''))
+    return res
+
+
+def http_get(url, params=None, **kwargs):
+    """requests.get 的替代品，依 HTTP_CACHE_MODE 讀寫磁碟快取"""
+    return _get(url, params, kwargs)
+
+
+def _get(url, params, kwargs, limited=True):
+    mode = cache_mode()
+    origin = url
+    url = upstream_url(url)   # 改連替身伺服器時，快取鍵也跟著換 host，不會混進真實資料
+    if mode == 'off':
+        return _fetch(origin, url, params, kwargs, limited)
+
+    key = normalize_url(url, params)
+    if mode == 'replay':
+        res = load_response(key)
+        if res is None:
+            _count('replay_miss')
+            raise requests.ConnectionError(f"HTTP replay：沒有錄製過 {key}")
+        _count('hit')
+        return res
+
+    historical = is_historical(key)
+    if mode == 'cache' and historical:
+        res = load_response(key)
+        if res is not None:
+            _count('hit')
+            return res
+
+    res = _fetch(origin, url, params, kwargs, limited)
+    if mode == 'record' or (historical and _is_final_payload(res)):
+        store_response(key, res)
+    return res
+
+
+def _download_key(tickers, kwargs):
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    args = {k: (v.isoformat() if isinstance(v, (datetime.date, datetime.datetime)) else v) for k, v in sorted(kwargs.items())}
+    return "yfinance:download?" + json.dumps({'tickers': tickers, **args}, ensure_ascii=False, sort_keys=True, default=str)
+
+
+def _download_via_chart(tickers, kwargs):
+    """
+    UPSTREAM_BASE_URL 模式專用：yfinance 的連線位址無法設定，改以 chart API 逐檔抓取 (經 http_get 改連替身)，
+    組成與 yf.download(group_by='ticker') 相同的 (代號, 欄位) 雙層欄位寬表
+    """
+    import pandas as pd
+    from concurrent.futures import ThreadPoolExecutor
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    if kwargs.get('start') is not None or kwargs.get('end') is not None:
+        start = pd.Timestamp(kwargs.get('start') or '2000-01-01')
+        end = pd.Timestamp(kwargs.get('end') or _tw_today() + datetime.timedelta(days=1))
+        query = f"period1={int(start.timestamp())}&period2={int(end.timestamp())}&interval=1d"
+    else:
+        query = f"range={kwargs.get('period', '1mo')}&interval=1d"
+    adjusted = kwargs.get('auto_adjust', True)
+
+    def fetch(ticker):
+        try:
+            url = f"https://query2.finance.yahoo.com/v8/finance/chart/{ticker}?{query}"
+            result = _get(url, None, {'timeout': 10}, limited=False).json()['chart']['result'][0]
+            quote = result['indicators']['quote'][0]
+            close = result['indicators']['adjclose'][0]['adjclose'] if adjusted else quote['close']
+            return ticker, pd.DataFrame({'Open': quote['open'], 'High': quote['high'], 'Low': quote['low'], 'Close': close, 'Volume': quote['volume']},
+                                        index=pd.to_datetime(result['timestamp'], unit='s').normalize())
+        except Exception:
+            return ticker, None
+
+    with ThreadPoolExecutor(max_workers=8 if kwargs.get('threads', True) else 1) as pool:
+        frames = {t: df for t, df in pool.map(fetch, tickers) if df is not None}
+    return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+
+def yf_download(tickers, **kwargs):
+    """
+    yf.download 的替代品 (yfinance 走自己的連線，無法在 HTTP 層攔截，改存整個 DataFrame)
+    還原價會隨除權息改寫，cache 模式不保存；只有 record / replay 會錄製與回放
+    """
+    import pandas as pd
+    mode = cache_mode()
+    key = _download_key(tickers, kwargs)
+    frame_path = _paths(key, kind='yfinance')[0].replace('.json', '.pkl')
+    if mode == 'replay':
+        try:
+            frame = pd.read_pickle(frame_path)
+        except (OSError, ValueError, EOFError):
+            _count('replay_miss')
+            raise requests.ConnectionError(f"yfinance replay：沒有錄製過 {key}")
+        _count('hit')
+        return frame
+
+    # yfinance 自行連線，無法逐一限速：每次批次下載計一個 token (替身模式的 chart 逐檔抓取也比照辦理)
+    rate_limit.acquire('query2.finance.yahoo.com')
+    if upstream_base():
+        frame = _download_via_chart(tickers, kwargs)
+    else:
+        import yfinance as yf
+        _count('upstream')
+        timing.count_io('yahoo')
+        frame = yf.download(tickers, **kwargs)
+    if mode == 'record' and frame is not None:
+        os.makedirs(os.path.dirname(frame_path), exist_ok=True)
+        frame.to_pickle(frame_path)
+        _count('stored')
+    return frame
@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# MACD 爆量選股策略 (單檔版 + 全市場向量化版)
+# ==========================================
+PANEL_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+MIN_BARS = 60
+
+
+def _build_result(ticker, info_map, p_close, y_close, p_ma20, p_dif, p_dem, y_dif, y_dem, current_vol_k, notes=None):
+    if notes is None:
+        notes = ["均線回測成功"]
+        if (y_dif < y_dem) and (p_dif > p_dem):
+            notes.append("MACD剛金叉")
+        notes.append("爆量轉強")
+
+    pct = ((p_close - y_close) / y_close) * 100
+
+    info = (info_map or {}).get(ticker, {})
+    return {
+        "產業類別": info.get("產業", ""),
+        "代碼": info.get("代碼", ticker),
+        "名稱": info.get("名稱", ""),
+        "收盤": round(p_close, 2),
+        "漲跌幅": pct, # 用於排序
+        "漲幅%": round(pct, 2),
+        "成交量(張)": current_vol_k,
+        "MA20": round(p_ma20, 2),
+        "MACD快線": round(p_dif, 2),
+        "型態描述": " + ".join(notes)
+    }
+
+
+# ==========================================
+# 1. 單檔版 (100% 移植自您的附件，作為向量化版的比對基準)
+# ==========================================
+def calculate_macd_strategy(ticker, df, min_volume_k, info_map=None):
+    if df.empty or len(df) < MIN_BARS:
+        return None
+
+    close = df['Close']
+    volume = df['Volume']
+
+    ma20 = close.rolling(window=20).mean()
+    ma60 = close.rolling(window=60).mean()
+    vol_ma5 = volume.rolling(window=5).mean()
+
+    exp12 = close.ewm(span=12, adjust=False).mean()
+    exp26 = close.ewm(span=26, adjust=False).mean()
+    dif = exp12 - exp26
+    dem = dif.ewm(span=9, adjust=False).mean()
+
+    curr_idx = -1
+    prev_idx = -2
+
+    p_close = close.iloc[curr_idx]
+    y_close = close.iloc[prev_idx]
+
+    p_ma20 = ma20.iloc[curr_idx]
+    y_ma20 = ma20.iloc[prev_idx]
+    p_ma60 = ma60.iloc[curr_idx]
+    y_ma60 = ma60.iloc[prev_idx]
+
+    p_dif = dif.iloc[curr_idx]
+    p_dem = dem.iloc[curr_idx]
+    y_dif = dif.iloc[prev_idx]
+    y_dem = dem.iloc[prev_idx]
+
+    p_vol = volume.iloc[curr_idx]
+    p_vol_ma5 = vol_ma5.iloc[curr_idx]
+
+    current_vol_k = int(p_vol // 1000)
+
+    # --- 您的核心選股條件 ---
+    cond_trend = (p_ma20 > y_ma20) and (p_ma60 > y_ma60)
+    cond_rebound = (y_close <= y_ma20 * 1.015) and (p_close > p_ma20) and (p_close > y_close)
+    cond_macd_bull = p_dif > p_dem
+    cond_volume = (current_vol_k >= min_volume_k) and (p_vol > p_vol_ma5)
+
+    if cond_trend and cond_rebound and cond_macd_bull and cond_volume:
+        return _build_result(ticker, info_map, p_close, y_close, p_ma20, p_dif, p_dem, y_dif, y_dem, current_vol_k)
+    return None
+
+
+# ==========================================
+# 2. 全市場向量化版 (日期 × 代號 矩陣一次算完)
+# ==========================================
+def _right_align(panel, tickers, fields=('Close', 'Volume')):
+    """
+    把每檔股票的有效 K 棒「靠下對齊」：最後一根放在最後一列、前一根放在倒數第二列…
+    效果等同於單檔版的 df.dropna(how='all')，停牌或尚未上市的空白日不會打斷
+    rolling / ewm 的計算順序，因此結果與單檔版逐位元相同
+    """
+    frames = {f: panel[f].reindex(columns=tickers) for f in PANEL_FIELDS}
+    valid = np.zeros(frames['Close'].shape, dtype=bool)
+    for f in PANEL_FIELDS:
+        valid |= frames[f].notna().to_numpy()
+
+    n_rows = valid.shape[0]
+    valid_after = valid[::-1].cumsum(axis=0)[::-1]
+    rows, cols = np.nonzero(valid)
+    target = n_rows - valid_after[rows, cols]
+
+    aligned = {}
+    for f in fields:
+        arr = np.full(valid.shape, np.nan)
+        arr[target, cols] = frames[f].to_numpy(dtype='float64')[rows, cols]
+        aligned[f] = pd.DataFrame(arr, columns=tickers)
+    return aligned, valid.sum(axis=0)
+
+
+def _indicator_series(close, volume):
+    """MA20 / MA60 / 量MA5 / EMA12 / EMA26 / DIF / DEM 的完整 (日期 × 代號) 矩陣"""
+    exp12 = close.ewm(span=12, adjust=False).mean()
+    exp26 = close.ewm(span=26, adjust=False).mean()
+    dif = exp12 - exp26
+    return {
+        'close': close,
+        'volume': volume,
+        'ma20': close.rolling(window=20).mean(),
+        'ma60': close.rolling(window=60).mean(),
+        'vol_ma5': volume.rolling(window=5).mean(),
+        'dif': dif,
+        'dem': dif.ewm(span=9, adjust=False).mean(),
+    }
+
+
+def _last_two(series, n_tickers):
+    last_two = {}
+    for name, df in series.items():
+        arr = df.to_numpy()
+        if len(arr) >= 2:
+            last_two[name] = (arr[-1], arr[-2])
+        else:
+            empty = np.full(n_tickers, np.nan)
+            last_two[name] = (empty, empty)
+    return last_two
+
+
+def compute_macd_indicators(panel, tickers):
+    """
+    對全市場一次計算 MA20 / MA60 / 量MA5 / EMA12 / EMA26 / DIF / DEM，
+    回傳 {指標名稱: (今日值陣列, 昨日值陣列)} 與每檔有效 K 棒數
+    """
+    aligned, n_bars = _right_align(panel, tickers)
+    return _last_two(_indicator_series(aligned['Close'], aligned['Volume']), len(tickers)), n_bars
+
+
+def screen_macd_market(panel, tickers, min_volume_k, info_map=None):
+    """
+    全市場向量化選股：四大條件以布林遮罩一次判斷，
+    回傳結果與「逐檔呼叫 calculate_macd_strategy」完全相同 (順序亦同)
+    """
+    tickers = list(tickers)
+    if not tickers:
+        return []
+    ind, n_bars = compute_macd_indicators(panel, tickers)
+    p_close, y_close = ind['close']
+    p_ma20, y_ma20 = ind['ma20']
+    p_ma60, y_ma60 = ind['ma60']
+    p_dif, y_dif = ind['dif']
+    p_dem, y_dem = ind['dem']
+    p_vol, _ = ind['volume']
+    p_vol_ma5, _ = ind['vol_ma5']
+
+    with np.errstate(invalid='ignore'):
+        vol_k = np.floor_divide(p_vol, 1000)
+        # 單檔版遇到今日量為 NaN 時 int() 會丟例外而略過該檔
+        has_bars = (n_bars >= MIN_BARS) & ~np.isnan(p_vol)
+
+        cond_trend = (p_ma20 > y_ma20) & (p_ma60 > y_ma60)
+        cond_rebound = (y_close <= y_ma20 * 1.015) & (p_close > p_ma20) & (p_close > y_close)
+        cond_macd_bull = p_dif > p_dem
+        cond_volume = (vol_k >= min_volume_k) & (p_vol > p_vol_ma5)
+
+    hits = np.flatnonzero(has_bars & cond_trend & cond_rebound & cond_macd_bull & cond_volume)
+    return [
+        _build_result(tickers[j], info_map, p_close[j], y_close[j], p_ma20[j], p_dif[j], p_dem[j], y_dif[j], y_dem[j], int(p_vol[j] // 1000))
+        for j in hits
+    ]
+
+
+# ==========================================
+# 3. 自訂條件式 (core/screener_expr.py 編譯，全市場矩陣一次求值)
+# ==========================================
+def rule_variables(aligned):
+    """條件式欄位 (PANEL_VARIABLES) 的取值；用到才計算，DIF / DEM 共用同一次 EMA"""
+    close = aligned['Close']
+    macd = {}
+
+    def dif():
+        if 'dif' not in macd:
+            macd['dif'] = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+        return macd['dif']
+
+    def dem():
+        if 'dem' not in macd:
+            macd['dem'] = dif().ewm(span=9, adjust=False).mean()
+        return macd['dem']
+
+    return {
+        'open': lambda: aligned['Open'], 'high': lambda: aligned['High'], 'low': lambda: aligned['Low'], 'close': close,
+        'vol': lambda: aligned['Volume'] / 1000,
+        'pct': lambda: (close - close.shift(1)) / close.shift(1) * 100,
+        'dif': dif, 'dem': dem,
+        'macd': lambda: dif() - dem(),
+    }
+
+
+def screen_rule_market(panel, tickers, rule, min_volume_k, info_map=None):
+    """
+    以自訂條件式取代四大條件選股 (有效 K 棒數與成交量門檻照舊)，
+    回傳欄位與 screen_macd_market 相同，型態描述為「自訂條件」
+    只對齊條件式用到的欄位；表格要顯示的 MA20 / MACD 只對選中的代號計算
+    """
+    tickers = list(tickers)
+    if not tickers:
+        return []
+    fields = ['Close', 'Volume'] + [f for f in ('Open', 'High', 'Low') if f.lower() in rule.names]
+    aligned, n_bars = _right_align(panel, tickers, fields=fields)
+    if len(aligned['Close']) < 2:
+        return []
+    mask = np.asarray(rule.evaluate(rule_variables(aligned)), dtype=bool)[-1]
+
+    p_vol = aligned['Volume'].to_numpy()[-1]
+    with np.errstate(invalid='ignore'):
+        vol_k = np.floor_divide(p_vol, 1000)
+        has_bars = (n_bars >= MIN_BARS) & ~np.isnan(p_vol)
+        hits = np.flatnonzero(has_bars & (vol_k >= min_volume_k) & mask)
+    if not len(hits):
+        return []
+
+    ind = _last_two(_indicator_series(aligned['Close'].iloc[:, hits], aligned['Volume'].iloc[:, hits]), len(hits))
+    p_close, y_close = ind['close']
+    p_dif, y_dif = ind['dif']
+    p_dem, y_dem = ind['dem']
+    return [
+        _build_result(tickers[j], info_map, p_close[k], y_close[k], ind['ma20'][0][k], p_dif[k], p_dem[k], y_dif[k], y_dem[k],
+                      int(p_vol[j] // 1000), notes=["自訂條件"])
+        for k, j in enumerate(hits)
+    ]
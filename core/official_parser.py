@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 官方 (證交所/櫃買中心) 資料欄式解析器
+# ==========================================
+# 整份 payload 先拆成「欄」，逐欄批次轉型後一次組成 DataFrame，取代逐列建 dict + try/except 整列丟棄。
+# 共用規則：
+#   - 數字欄去除千分位逗號
+#   - '-'、'--'、'---'、'X'、'' 等無成交/停牌符號一律視為缺值 (NaN)
+#   - 漲跌符號欄 (可能夾帶 HTML，如 <p style= color:green>-</p>) 含 '-' 即為負
+#   - 民國日期 (1150306 或 115/03/06) 轉成西元 Timestamp
+
+MISSING_SENTINELS = frozenset(['', '-', '--', '---', 'X', 'x', 'N/A', 'None', 'nan'])
+
+
+def _parse_float(v):
+    if isinstance(v, str):
+        v = v.strip()
+        if v in MISSING_SENTINELS:
+            return np.nan
+        v = v.replace(',', '')
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def to_number(values):
+    """
+    整欄轉數字 (Series 或 list)：去逗號、前後空白，無法解析或屬於缺值符號者為 NaN
+    千筆上下的 payload 以 list + np.fromiter 最快 (實測比 .str.replace + pd.to_numeric 快約 5 倍)
+    """
+    index = values.index if isinstance(values, pd.Series) else None
+    try:
+        # 快速路徑：整欄都是字串 (OpenAPI 的正常格式)，缺值符號直接換成 'nan'
+        cleaned = ['nan' if v in MISSING_SENTINELS else v.replace(',', '') for v in values]
+        arr = np.fromiter(map(float, cleaned), dtype='float64', count=len(cleaned))
+    except (AttributeError, TypeError, ValueError):
+        arr = np.fromiter(map(_parse_float, values), dtype='float64', count=len(values))
+    return pd.Series(arr, index=index)
+
+
+def signed_change(sign_series, value_series):
+    """依漲跌符號欄決定正負號 (value 欄本身為絕對值)"""
+    sign = np.where(sign_series.astype(str).str.contains('-', regex=False), -1.0, 1.0)
+    return to_number(value_series) * sign
+
+
+def _roc_scalar(v):
+    digits = ''.join(ch for ch in str(v) if ch.isdigit())
+    if len(digits) != 7:
+        return pd.NaT
+    return pd.to_datetime(f"{int(digits[:3]) + 1911}{digits[3:]}", format='%Y%m%d', errors='coerce')
+
+
+def roc_to_date(values):
+    """民國日期轉西元：支援 1150306、115/03/06、115-03-06，無法解析者為 NaT (同一份 payload 通常只有一個日期，只轉換不重複值)"""
+    index = values.index if isinstance(values, pd.Series) else None
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    converted = pd.DatetimeIndex([_roc_scalar(v) for v in uniques])
+    return pd.Series(converted.take(codes, allow_fill=True, fill_value=pd.NaT), index=index)
+
+
+def _parse_columns(records, columns, numeric=(), dates=()):
+    """逐欄轉型，回傳 {輸出欄名: 陣列}，尚未組成 DataFrame (方便先過濾再建表)"""
+    records = records or []
+    data = {}
+    for src, col in columns.items():
+        raw = [r.get(src) for r in records]
+        if col in numeric:
+            data[col] = to_number(raw).to_numpy()
+        elif col in dates:
+            data[col] = roc_to_date(raw).to_numpy()
+        else:
+            data[col] = np.array([str(v).strip() for v in raw], dtype=object)
+    return data
+
+
+# ==========================================
+# 盤後行情 (強弱勢股掃描用)
+# ==========================================
+QUOTE_COLUMNS = ['代碼', '商品', '開盤', '最高', '最低', '收盤', '漲跌', '成交量(張)']
+
+TWSE_DAY_ALL_COLUMNS = {
+    'Date': '日期', 'Code': '代碼', 'Name': '商品', 'TradeVolume': '成交量(張)',
+    'OpeningPrice': '開盤', 'HighestPrice': '最高', 'LowestPrice': '最低',
+    'ClosingPrice': '收盤', 'Change': '漲跌',
+}
+TPEX_QUOTES_COLUMNS = {
+    'Date': '日期', 'SecuritiesCompanyCode': '代碼', 'CompanyName': '商品', 'TradingVolume': '成交量(張)',
+    'Open': '開盤', 'High': '最高', 'Low': '最低', 'Close': '收盤', 'Change': '漲跌',
+}
+_PRICE_FIELDS = ['開盤', '最高', '最低', '收盤', '漲跌', '成交量(張)']
+
+
+def _finish_quotes(data):
+    # 任一價量欄無法解析 (停牌、無成交) 即剔除，並只保留有量有價的股票
+    keep = ~np.isnan(np.column_stack([data[c] for c in _PRICE_FIELDS])).any(axis=1)
+    keep &= (data['成交量(張)'] > 0) & (data['收盤'] > 0)
+    out = {c: data[c][keep] for c in QUOTE_COLUMNS + ['日期']}
+    out['成交量(張)'] = out['成交量(張)'].astype('int64')
+    return pd.DataFrame(out)
+
+
+def parse_twse_stock_day_all(records):
+    """證交所 STOCK_DAY_ALL：成交股數換算成張"""
+    data = _parse_columns(records, TWSE_DAY_ALL_COLUMNS, numeric=_PRICE_FIELDS, dates=['日期'])
+    data['成交量(張)'] = data['成交量(張)'] // 1000
+    return _finish_quotes(data)
+
+
+def parse_tpex_mainboard_quotes(records):
+    """櫃買中心 tpex_mainboard_quotes"""
+    return _finish_quotes(_parse_columns(records, TPEX_QUOTES_COLUMNS, numeric=_PRICE_FIELDS, dates=['日期']))
+
+
+def compute_quote_metrics(df):
+    """加上 昨收 / 漲幅% / 振幅%，並剔除昨收無效的股票"""
+    if not df.empty:
+        df['昨收'] = df['收盤'] - df['漲跌']
+        df = df[df['昨收'] > 0].copy()
+        df['漲幅%'] = (df['漲跌'] / df['昨收']) * 100
+        df['振幅%'] = ((df['最高'] - df['最低']) / df['昨收']) * 100
+    return df
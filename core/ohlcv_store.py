@@ -0,0 +1,339 @@
+import os
+import json
+import datetime
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from core.rate_limit import inherit_priority
+from core.trading_calendar import is_trading_day, latest_trading_day, previous_trading_day
+from core.http_cache import yf_download   # yfinance 只有真的要補資料時才載入 (見 core/http_cache.py)
+
+# ==========================================
+# 本地 OHLCV 欄式資料庫 (Parquet，日期 × 股票 寬表)
+# ==========================================
+# 每個欄位 (開高低收量) 各存成一個 Parquet 檔，列為交易日、欄為 Yahoo 代號。
+# 第一次使用時補齊近 SEED_DAYS 天歷史，之後每次只向 Yahoo 要「最後一天之後」的缺口，
+# 上游流量只跟新增天數成正比，與歷史長度無關。
+
+STORE_DIR = os.environ.get("OHLCV_STORE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "ohlcv"))
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+SEED_DAYS = 150          # 新代號第一次入庫時抓取的歷史天數 (與 MACD 掃描視窗相同)
+KEEP_DAYS = 400          # 資料庫最多保留的日曆天數，避免檔案無限長大
+CHUNK_SIZE = 50          # 每批向 Yahoo 下載的代號數
+PIPELINE_DEPTH = 3       # 同時在下載中的批次數 (也是已下載、尚未合併的批次上限，記憶體與全市場檔數無關)
+MARKET_OPEN = datetime.time(9, 0)
+MARKET_CLOSE = datetime.time(14, 30)   # 收盤後 Yahoo 日K 才算定稿
+INTRADAY_TTL = 300       # 盤中資料的有效秒數 (盤中 K 棒會持續變動)
+ADJ_TOLERANCE = 1e-6     # 重疊日收盤價差異超過此比例，視為除權息還原價被改寫
+
+
+def _tw_now():
+    return datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=8))).replace(tzinfo=None)
+
+
+def _field_path(field):
+    return os.path.join(STORE_DIR, f"{field.lower()}.parquet")
+
+
+def _meta_path():
+    return os.path.join(STORE_DIR, "meta.json")
+
+
+def _read_meta():
+    try:
+        with open(_meta_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path, writer):
+    """先寫到暫存檔再 rename，避免多個 session 同時讀到寫一半的檔案"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    writer(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_ohlcv_panel(start=None, tickers=None):
+    """
+    讀出整個寬表：回傳 {欄位: DataFrame(日期 × 代號)}
+    start 可指定起始日 (含)，tickers 可只取部分代號
+    """
+    panel = {}
+    for field in FIELDS:
+        try:
+            df = pd.read_parquet(_field_path(field))
+        except (OSError, ValueError):
+            df = pd.DataFrame(dtype='float64')
+        df.index = pd.to_datetime(df.index)
+        panel[field] = df
+    return panel_window(panel, start, tickers)
+
+
+def panel_window(panel, start=None, tickers=None):
+    """切出 start (含) 之後、指定代號的部分 (load_ohlcv_panel 與同步途中的逐批選股共用)"""
+    window = {}
+    for field, df in panel.items():
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start).normalize()]
+        if tickers is not None:
+            df = df.reindex(columns=list(tickers))
+        window[field] = df
+    return window
+
+
+def ohlcv_frame(panel, ticker):
+    """從寬表切出單一代號的 OHLCV，格式與 yf_download(group_by='ticker')[ticker] 相同"""
+    if ticker not in panel['Close'].columns:
+        return pd.DataFrame(columns=FIELDS)
+    df = pd.DataFrame({field: panel[field][ticker] for field in FIELDS})
+    return df.dropna(how='all')
+
+
+def _save_panel(panel):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    for field in FIELDS:
+        df = panel[field].sort_index()
+        df.columns = df.columns.astype(str)
+        _write_atomic(_field_path(field), lambda p, d=df: d.to_parquet(p))
+
+
+def is_store_fresh(now=None, meta=None):
+    """判斷資料庫是否已涵蓋最近一次收盤 (盤中則以 INTRADAY_TTL 秒為限)"""
+    now = now or _tw_now()
+    meta = _read_meta() if meta is None else meta
+    if not meta.get('last_sync'):
+        return False
+    last_sync = datetime.datetime.fromisoformat(meta['last_sync'])
+
+    if is_trading_day(now.date()) and MARKET_OPEN <= now.time() < MARKET_CLOSE:
+        return (now - last_sync).total_seconds() < INTRADAY_TTL
+
+    # 找最近一個「交易日收盤時刻」，只要在那之後同步過就不必再抓
+    close_day = latest_trading_day(now.date()) if now.time() >= MARKET_CLOSE else previous_trading_day(now.date())
+    return last_sync >= datetime.datetime.combine(close_day, MARKET_CLOSE)
+
+
+def store_last_date():
+    """資料庫最後一根 K 棒的日期 (只讀 meta，不載入 Parquet)；尚未同步過回傳 None"""
+    last_date = _read_meta().get('last_date')
+    return datetime.date.fromisoformat(last_date) if last_date else None
+
+
+def _download_chunk(chunk, start, end):
+    """批次下載並拆成 {欄位: DataFrame(日期 × 代號)}"""
+    data = yf_download(chunk, start=start, end=end, group_by='ticker', threads=True, progress=False, auto_adjust=True)
+    if data is None or data.empty:
+        return {}
+    if not isinstance(data.columns, pd.MultiIndex):
+        data = pd.concat({chunk[0]: data}, axis=1)
+    data.index = pd.to_datetime(data.index).tz_localize(None).normalize()
+    frames = {}
+    for field in FIELDS:
+        try:
+            frames[field] = data.xs(field, axis=1, level=1).astype('float64').dropna(how='all', axis=1)
+        except KeyError:
+            continue
+    return frames
+
+
+def _pipelined(jobs, download):
+    """
+    依序產出 (job, future)：背景執行緒保持最多 PIPELINE_DEPTH 批同時下載，
+    呼叫端合併前一批、逐批選股的同時，後面幾批已經在網路上；呼叫端取走一批才補送下一批 (背壓)
+    呼叫端中途離開 (例如頁面被中斷) 時，尚未開始的批次直接取消
+    """
+    jobs = iter(jobs)
+    pool = ThreadPoolExecutor(max_workers=PIPELINE_DEPTH, initializer=inherit_priority())
+    try:
+        window = deque((job, pool.submit(download, job)) for job in itertools.islice(jobs, PIPELINE_DEPTH))
+        while window:
+            yield window.popleft()
+            for job in itertools.islice(jobs, 1):
+                window.append((job, pool.submit(download, job)))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _merge_into(panel, frames):
+    """新資料覆蓋舊資料 (同日以新下載為準)，其餘保留"""
+    for field, new_df in frames.items():
+        old_df = panel[field]
+        if old_df.empty:
+            panel[field] = new_df
+        else:
+            panel[field] = new_df.combine_first(old_df)
+
+
+def _replace_columns(panel, frames):
+    """整段重抓的代號：先清空舊欄位再寫入，避免殘留不同還原基準的舊價格"""
+    for field, new_df in frames.items():
+        old_df = panel[field].drop(columns=[c for c in new_df.columns if c in panel[field].columns])
+        panel[field] = new_df if old_df.empty else new_df.combine_first(old_df)
+
+
+def _drop_columns(panel, tickers):
+    for field in FIELDS:
+        panel[field] = panel[field].drop(columns=[t for t in tickers if t in panel[field].columns])
+
+
+def _adjusted_tickers(panel, frames, overlap_ts):
+    """比對重疊日的收盤價；不一致代表 Yahoo 已重新還原歷史價格，需整段重抓"""
+    new_close = frames.get('Close')
+    old_close = panel['Close']
+    if new_close is None or old_close.empty or overlap_ts not in new_close.index or overlap_ts not in old_close.index:
+        return []
+    common = [c for c in new_close.columns if c in old_close.columns]
+    old_row = old_close.loc[overlap_ts, common]
+    new_row = new_close.loc[overlap_ts, common]
+    diff = ((new_row - old_row).abs() / old_row.abs()) > ADJ_TOLERANCE
+    return list(diff[diff & old_row.notna() & new_row.notna()].index)
+
+
+def sync_ohlcv_store(tickers, on_progress=None, force=False, on_batch=None):
+    """
+    將資料庫同步到最新交易日：
+    1. 已入庫代號：只下載最後一個交易日 (重疊校驗) 到今天的缺口
+    2. 新代號或還原價被改寫的代號：下載近 SEED_DAYS 天完整歷史
+       (Yahoo 查無資料的新代號記在 meta 的 empty，同一個交易日內不再重試，否則資料庫永遠不會被判定為最新)
+    3. 增量下載失敗的代號記在 meta 的 retry (需從哪天補起)，下次同步優先補齊，補齊前資料庫不算最新；
+       還原價整段重抓失敗的代號則從庫存移除 (新舊還原基準混在一起)，下次當作新代號重新初始化
+    on_progress(done, total, text) 可接 Streamlit 進度條
+    on_batch(chunk, panel) 在每批寫入記憶體中的寬表後呼叫 (下載失敗的批次也會呼叫，此時為庫存舊資料)，
+    讓頁面邊下載邊選股；還原價被改寫而整段重抓的代號會再以新資料呼叫一次
+    中途被中斷 (頁面停止鈕觸發的 rerun 會在 on_progress / on_batch 內拋出例外) 時，已完成的初始化批次仍會存檔
+    回傳同步統計 dict
+    """
+    now = _tw_now()
+    meta = _read_meta()
+    panel = load_ohlcv_panel()
+    stored = set(panel['Close'].columns)
+    tickers = list(dict.fromkeys(tickers))
+    close_day = latest_trading_day(now.date()).isoformat()
+    empty = {t: d for t, d in meta.get('empty', {}).items() if d >= close_day}   # 本交易日已試過、Yahoo 沒資料的代號
+    new_tickers = [t for t in tickers if t not in stored and t not in empty]
+    retry = {t: d for t, d in meta.get('retry', {}).items() if t in stored}      # 增量下載失敗、需從該日補起的代號
+    stats = {'incremental': 0, 'seeded': 0, 'readjusted': 0, 'failed': 0, 'skipped': False}
+
+    if not force and not new_tickers and not retry and is_store_fresh(now, meta):
+        stats['skipped'] = True
+        return stats
+
+    end_date = now.date() + datetime.timedelta(days=1)
+    seed_start = end_date - datetime.timedelta(days=SEED_DAYS)
+    known = [t for t in tickers if t in stored]
+    last_ts = panel['Close'].index.max() if not panel['Close'].empty else None
+
+    jobs = []
+    if known and last_ts is not None:
+        # 上次失敗的代號另成一組，從最早的缺口日補起 (該日也作為重疊校驗日)
+        lagging = [t for t in known if t in retry]
+        current = [t for t in known if t not in retry]
+        retry_ts = pd.Timestamp(min(retry[t] for t in lagging)) if lagging else None
+        jobs += [('incremental', current[i:i + CHUNK_SIZE], last_ts) for i in range(0, len(current), CHUNK_SIZE)]
+        jobs += [('incremental', lagging[i:i + CHUNK_SIZE], retry_ts) for i in range(0, len(lagging), CHUNK_SIZE)]
+    else:
+        new_tickers = [t for t in tickers if t not in empty]
+    jobs += [('seed', new_tickers[i:i + CHUNK_SIZE], None) for i in range(0, len(new_tickers), CHUNK_SIZE)]
+
+    def download(job):
+        kind, chunk, start_ts = job
+        return _download_chunk(chunk, start_ts.date() if kind == 'incremental' else seed_start, end_date)
+
+    # 下載與合併 / 選股重疊進行：處理第 n 批時，第 n+1 ~ n+PIPELINE_DEPTH 批已在下載
+    total = len(jobs)
+    readjust = []
+    base = dict(panel)      # 同步前的寬表 (合併都是換成新的 DataFrame，不會改到這份)
+    seeded = []             # 已完成的整段下載，中斷時存檔用
+    completed = False
+    try:
+        if on_progress and total:
+            on_progress(0, total, f"📥 同步本地 K 線資料庫：共 {total} 批，下載中 ...")
+        for n, ((kind, chunk, start_ts), future) in enumerate(_pipelined(jobs, download), start=1):
+            if on_progress:
+                on_progress(n - 1, total, f"📥 同步本地 K 線資料庫 ({'增量' if kind == 'incremental' else '初始化'}) 批次 {n} / {total} ...")
+            try:
+                frames = future.result()
+                if kind == 'incremental':
+                    readjust += _adjusted_tickers(panel, frames, start_ts)
+                    _merge_into(panel, frames)
+                    stats['incremental'] += len(chunk)
+                    for t in chunk:
+                        retry.pop(t, None)
+                else:
+                    _replace_columns(panel, frames)
+                    seeded.append(frames)
+                    stats['seeded'] += len(chunk)
+                    got = frames['Close'].columns if 'Close' in frames else []
+                    empty.update({t: close_day for t in chunk if t not in got})
+            except Exception:
+                if kind == 'incremental':
+                    # 這批沒有補到，記下缺口起點；已記錄的代號保留較早的日期
+                    for t in chunk:
+                        retry.setdefault(t, start_ts.date().isoformat())
+                    stats['failed'] += len(chunk)
+            if on_batch:
+                on_batch(chunk, panel)
+
+        # 除權息造成還原價改寫的代號，整段重抓以確保均線/MACD 與 Yahoo 一致
+        readjust_jobs = [('seed', readjust[i:i + CHUNK_SIZE], None) for i in range(0, len(readjust), CHUNK_SIZE)]
+        for (_, chunk, _), future in _pipelined(readjust_jobs, download):
+            try:
+                frames = future.result()
+                _replace_columns(panel, frames)
+                seeded.append(frames)
+                stats['readjusted'] += len(chunk)
+            except Exception:
+                # 寬表裡已是「新基準的近期 K 棒 + 舊基準的歷史」，下次重疊校驗也看不出來：整段移除，下次重新初始化
+                _drop_columns(panel, chunk)
+                stats['failed'] += len(chunk)
+                continue
+            if on_batch:
+                on_batch(chunk, panel)
+        completed = True
+    finally:
+        if not completed:
+            _save_interrupted(base, seeded, last_ts, meta, empty)
+
+    if on_progress:
+        on_progress(total, total, "💾 寫入本地 K 線資料庫 ...")
+    keep_from = pd.Timestamp(now.date() - datetime.timedelta(days=KEEP_DAYS))
+    for field in FIELDS:
+        panel[field] = panel[field][panel[field].index >= keep_from]
+    _save_panel(panel)
+    _save_meta(panel, now.isoformat(timespec='seconds'), empty, retry)
+    return stats
+
+
+def _save_interrupted(base, seeded, last_ts, meta, empty):
+    """
+    同步被中斷：以同步前的寬表加上已完成的整段下載存檔，下次不必重抓這些代號
+    增量合併只做了一部分 (各代號最新日期不一)，直接丟棄；整段下載也只留到原本的最新日，
+    之後的缺口由下次增量同步補齊。last_sync 不更新，下次仍會照常同步
+    """
+    panel = dict(base)
+    for frames in seeded:
+        if 'Close' not in frames:
+            continue
+        if last_ts is not None:
+            close = frames['Close'][frames['Close'].index <= last_ts]
+            keep = close.columns[close.notna().any()]   # 原最新日之前沒有資料的新代號，下次重新初始化
+            frames = {field: df.loc[df.index <= last_ts, df.columns.intersection(keep)] for field, df in frames.items()}
+        _replace_columns(panel, frames)
+    _save_panel(panel)
+    _save_meta(panel, meta.get('last_sync'), empty, meta.get('retry', {}))
+
+
+def _save_meta(panel, last_sync, empty, retry):
+    last_date = panel['Close'].index.max().date().isoformat() if not panel['Close'].empty else None
+    empty = {t: d for t, d in empty.items() if t not in panel['Close'].columns}
+    retry = {t: d for t, d in retry.items() if t in panel['Close'].columns}
+    _write_atomic(_meta_path(), lambda p: _dump_meta(p, {'last_sync': last_sync, 'last_date': last_date,
+                                                         'tickers': len(panel['Close'].columns), 'empty': empty, 'retry': retry}))
+
+
+def _dump_meta(path, meta):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
@@ -0,0 +1,224 @@
+"""
+盤後預熱排程：在官方 / Yahoo 發布盤後資料後，自動把各頁面要用的快取先算好
+
+  ohlcv        14:45 起  本地 K 線資料庫同步 (pages/4 MACD 選股)
+  chips_rank   16:30 起  法人買賣超排行寫入 chips_ranking_cache (pages/2)
+  chip_streak  排行完成後  連續買賣超狀態推進到今日 (pages/3)
+  warnings     17:45 起  注意 / 處置股寫入 warning_stocks_cache (pages/5)
+
+資料尚未公布時每 RETRY_INTERVAL 秒重試一次，GIVE_UP_AT 之後當日不再嘗試；休市日整天不執行。
+各工作的執行狀態存在 cache/prewarm_state.json，伺服器重啟後不會重複已完成的工作。
+
+Streamlit 伺服器內：各頁面呼叫 start_prewarm_scheduler()，整個行程只會啟動一條背景執行緒
+(環境變數 PREWARM_ENABLED=0 可關閉)。
+命令列 (專案根目錄)：
+  python -m core.prewarm --once                         # 執行現在到期的工作
+  python -m core.prewarm --once --job chips_rank        # 不看排程，直接執行指定工作
+  python -m core.prewarm --once --job warnings --date 2026-03-06
+  python -m core.prewarm                                # 前景常駐 (給 cron / systemd 使用)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import threading
+
+import streamlit as st
+
+from core.rate_limit import background_priority
+from core.timing import begin_trace
+from core.trading_calendar import is_trading_day
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_FILE = os.environ.get("PREWARM_STATE_FILE", os.path.join(_ROOT, "cache", "prewarm_state.json"))
+RETRY_INTERVAL = 600                   # 資料尚未公布時的重試間隔 (秒)
+GIVE_UP_AT = datetime.time(21, 0)      # 超過此時間當日不再嘗試
+POLL_SECONDS = 60                      # 背景執行緒檢查排程的間隔 (秒)
+
+_state_lock = threading.Lock()
+
+
+def _tw_now():
+    return datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=8))).replace(tzinfo=None)
+
+
+# ==========================================
+# 1. 預熱工作 (回傳 (是否完成, 訊息)；資料尚未公布回傳 False 等待重試)
+# ==========================================
+def _prewarm_ohlcv(target_date):
+    from core.ohlcv_store import store_last_date, sync_ohlcv_store
+    from core.shared_data import get_all_stock_tickers
+    if store_last_date() == target_date:
+        return True, "K 線資料庫已是最新"
+    yf_tickers, _ = get_all_stock_tickers()
+    # 同一天前一次嘗試時 Yahoo 還沒有今日 K 棒，is_store_fresh 仍會判定為新鮮，所以強制補抓
+    stats = sync_ohlcv_store(yf_tickers, force=True)
+    last_date = store_last_date()
+    # 有批次下載失敗時也視為未完成，排程稍後重試 (失敗的代號記在 meta 的 retry)
+    return last_date == target_date and not stats['failed'], \
+        f"增量 {stats['incremental']} / 初始化 {stats['seeded']} / 還原價重抓 {stats['readjusted']} / 失敗 {stats['failed']}，最新 K 棒 {last_date}"
+
+
+def _prewarm_chips_rank(target_date):
+    from core.chips_rank_sync import compute_chips_ranking, get_chips_rank_from_cache
+    df_buy, _ = get_chips_rank_from_cache(target_date.strftime('%Y-%m-%d'))
+    if df_buy is not None:
+        return True, "排行已在雲端快取"
+    df_buy, df_sell, missing, save_error = compute_chips_ranking(target_date, require_complete=True)
+    if df_buy is None:
+        return False, f"官方資料尚未完整公布 (缺少：{'、'.join(missing) or '法人資料'})"
+    if save_error:
+        return False, f"排行寫入雲端快取失敗：{save_error}"
+    return True, f"買超 {len(df_buy)} 檔 / 賣超 {len(df_sell)} 檔"
+
+
+def _prewarm_chip_streak(target_date):
+    from core.chip_streak_sync import STREAK_STATE_MIN_WINDOW, load_streak_state, sync_streak_state
+    _, _, cache_errors = sync_streak_state(STREAK_STATE_MIN_WINDOW)
+    if cache_errors:
+        return False, f"寫入雲端快取失敗：{'；'.join(cache_errors)}"
+    _, as_of, history_days = load_streak_state()
+    return as_of == target_date, f"狀態推進至 {as_of} (累計 {history_days} 日)"
+
+
+def _prewarm_warnings(target_date):
+    from core.warning_sync import register_stock_names, sync_warning_stocks
+    notice_set, punish_db, name_dict, is_updated, save_error = sync_warning_stocks(target_date)
+    if not is_updated:
+        return False, "官方尚未發布今日公告"
+    if save_error:
+        return False, f"公告寫入雲端快取失敗：{save_error}"
+    added = register_stock_names(name_dict)
+    return True, f"注意股 {len(notice_set)} 檔 / 處置股 {len(punish_db)} 檔，主檔新增 {added} 檔"
+
+
+# after：必須等該工作當日完成才執行 (連續買賣超沿用排行已確認完整的法人資料，避免存入只有半個市場的日資料)
+JOBS = [
+    {'name': 'ohlcv', 'label': 'K 線資料庫', 'publish': datetime.time(14, 45), 'after': None, 'run': _prewarm_ohlcv},
+    {'name': 'chips_rank', 'label': '法人買賣超排行', 'publish': datetime.time(16, 30), 'after': None, 'run': _prewarm_chips_rank},
+    {'name': 'chip_streak', 'label': '法人連續買賣超', 'publish': datetime.time(16, 30), 'after': 'chips_rank', 'run': _prewarm_chip_streak},
+    {'name': 'warnings', 'label': '注意 / 處置股', 'publish': datetime.time(17, 45), 'after': None, 'run': _prewarm_warnings},
+]
+JOB_MAP = {job['name']: job for job in JOBS}
+
+
+# ==========================================
+# 2. 排程狀態 (cache/prewarm_state.json)
+# ==========================================
+def load_state():
+    """{工作名稱: {date, status, attempts, last_run, message}}"""
+    try:
+        with open(STATE_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_path = f"{STATE_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def _done_on(state, name, date_str):
+    entry = state.get(name) or {}
+    return entry.get('date') == date_str and entry.get('status') == 'done'
+
+
+def due_jobs(now, state):
+    """now 這個時間點該執行的工作 (依 JOBS 順序)"""
+    if not is_trading_day(now.date()) or now.time() >= GIVE_UP_AT:
+        return []
+    date_str = now.date().isoformat()
+    due = []
+    for job in JOBS:
+        if now.time() < job['publish'] or _done_on(state, job['name'], date_str):
+            continue
+        if job['after'] and not _done_on(state, job['after'], date_str):
+            continue
+        entry = state.get(job['name']) or {}
+        if entry.get('date') == date_str and entry.get('last_run'):
+            if (now - datetime.datetime.fromisoformat(entry['last_run'])).total_seconds() < RETRY_INTERVAL:
+                continue
+        due.append(job)
+    return due
+
+
+def run_job(job, target_date, now=None):
+    """執行單一工作並寫回狀態；例外視為本次失敗，留待下次重試"""
+    now = now or _tw_now()
+    date_str = target_date.isoformat()
+    try:
+        begin_trace(f"prewarm/{job['name']}")   # 各階段耗時記入 core/timing 的 JSONL 記錄
+        with background_priority():   # 與使用者同時連線時讓出上游額度 (core/rate_limit.py)
+            done, message = job['run'](target_date)
+        status = 'done' if done else 'pending'
+    except Exception as e:
+        status, message = 'error', f"{type(e).__name__}: {e}"
+    with _state_lock:
+        state = load_state()
+        entry = state.get(job['name']) or {}
+        attempts = entry.get('attempts', 0) + 1 if entry.get('date') == date_str else 1
+        state[job['name']] = {'date': date_str, 'status': status, 'attempts': attempts,
+                              'last_run': now.isoformat(timespec='seconds'), 'message': message}
+        save_state(state)
+    print(f"[prewarm] {date_str} {job['label']}：{status} (第 {attempts} 次) {message}")
+    return status
+
+
+def run_due_jobs(now=None):
+    """執行現在到期的工作，回傳 {工作名稱: 狀態}；後面的工作可能依賴前面剛完成的工作，所以逐一重讀狀態"""
+    now = now or _tw_now()
+    results = {}
+    for job in JOBS:
+        if job in due_jobs(now, load_state()):
+            results[job['name']] = run_job(job, now.date(), now)
+    return results
+
+
+# ==========================================
+# 3. 背景執行緒 (每個 Streamlit 伺服器行程只啟動一次)
+# ==========================================
+def _scheduler_loop():
+    while True:
+        try:
+            run_due_jobs()
+        except Exception as e:
+            print(f"[prewarm] 排程錯誤：{e}")
+        time.sleep(POLL_SECONDS)
+
+
+@st.cache_resource
+def start_prewarm_scheduler():
+    if os.environ.get("PREWARM_ENABLED", "1") == "0":
+        return None
+    thread = threading.Thread(target=_scheduler_loop, name="prewarm-scheduler", daemon=True)
+    thread.start()
+    return thread
+
+
+# ==========================================
+# 4. 命令列
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="盤後預熱排程")
+    parser.add_argument('--once', action='store_true', help="只執行一輪後結束")
+    parser.add_argument('--job', choices=list(JOB_MAP), help="不看排程，直接執行指定工作")
+    parser.add_argument('--date', type=datetime.date.fromisoformat, help="指定交易日 (YYYY-MM-DD，搭配 --job)")
+    args = parser.parse_args(argv)
+
+    if args.job:
+        target_date = args.date or _tw_now().date()
+        return 0 if run_job(JOB_MAP[args.job], target_date) == 'done' else 1
+    if args.once:
+        run_due_jobs()
+        return 0
+    _scheduler_loop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+全行程共用的上游限速 (每個 host 一個 token bucket)
+
+所有真正連線的請求 (http_get / yf_download) 出發前都要向對應 host 的 bucket 取一個 token：
+  - 互動 (頁面操作) 優先：有互動請求在等時，背景請求 (盤後預熱) 讓出 token
+  - 自適應退讓：收到 429、或被轉址 (307/302) 到錯誤頁時，速率減半並暫停 Retry-After 秒 (預設 BACKOFF_SECONDS)；
+    之後每次成功回應逐步恢復到設定上限 (AIMD)
+
+背景工作以 with background_priority(): 標記；執行緒池以 initializer=inherit_priority() 讓工作執行緒沿用建立者的優先順序。
+環境變數 RATE_LIMIT_ENABLED=0 可關閉 (離線 benchmark 的 HTTP 替身使用)。
+"""
+import os
+import time
+import threading
+import contextlib
+from collections import Counter
+from urllib.parse import urlsplit
+
+# host: (每秒請求數上限, 突發上限)
+# 證交所 rwd 端點連續請求過快會暫時封鎖 IP (經驗值約每 5 秒 3 次)；openapi 與櫃買中心較寬鬆
+HOST_LIMITS = {
+    'www.twse.com.tw': (0.6, 3),
+    'openapi.twse.com.tw': (2.0, 5),
+    'www.tpex.org.tw': (2.0, 5),
+    'query2.finance.yahoo.com': (10.0, 20),
+}
+BACKOFF_SECONDS = 30        # 被限速且沒有 Retry-After 時的暫停秒數
+MIN_RATE_RATIO = 0.1        # 連續退讓時速率最低降到上限的 10%
+RECOVER_RATIO = 0.1         # 每次成功回應恢復上限的 10%
+
+stats = Counter()   # {host}:requests / {host}:waited_ms / {host}:throttled
+_local = threading.local()
+_buckets = {}
+_buckets_lock = threading.Lock()
+_stats_lock = threading.Lock()
+
+
+def _count(key, n=1):
+    with _stats_lock:
+        stats[key] += n
+
+
+# ==========================================
+# 1. 優先順序 (互動 / 背景)
+# ==========================================
+def is_background():
+    return getattr(_local, 'background', False)
+
+
+@contextlib.contextmanager
+def background_priority():
+    """區塊內 (同一執行緒) 的請求視為背景請求"""
+    previous = is_background()
+    _local.background = True
+    try:
+        yield
+    finally:
+        _local.background = previous
+
+
+def inherit_priority():
+    """ThreadPoolExecutor 的 initializer：工作執行緒沿用建立執行緒池的那個執行緒的優先順序"""
+    background = is_background()
+    def init():
+        _local.background = background
+    return init
+
+
+# ==========================================
+# 2. Token bucket
+# ==========================================
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.interactive_waiting = 0
+        self.cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, background=False):
+        """取得一個 token，回傳等待秒數"""
+        start = time.monotonic()
+        with self.cond:
+            if not background:
+                self.interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    yielding = background and self.interactive_waiting > 0
+                    if now >= self.paused_until and not yielding and self.tokens >= 1:
+                        self.tokens -= 1
+                        return now - start
+                    if now < self.paused_until:
+                        timeout = self.paused_until - now
+                    elif self.tokens < 1:
+                        timeout = (1 - self.tokens) / self.rate
+                    else:
+                        timeout = 0.05   # token 夠但讓給互動請求，稍後再看
+                    self.cond.wait(timeout)
+            finally:
+                if not background:
+                    self.interactive_waiting -= 1
+                self.cond.notify_all()
+
+    def penalize(self, retry_after=None):
+        with self.cond:
+            now = time.monotonic()
+            self.rate = max(self.max_rate * MIN_RATE_RATIO, self.rate / 2)
+            self.tokens = 0.0
+            self.updated = now
+            self.paused_until = max(self.paused_until, now + (retry_after if retry_after is not None else BACKOFF_SECONDS))
+
+    def reward(self):
+        with self.cond:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVER_RATIO)
+
+
+def get_bucket(host):
+    """沒有設定上限的 host 回傳 None (不限速)"""
+    if host not in HOST_LIMITS:
+        return None
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(*HOST_LIMITS[host])
+        return _buckets[host]
+
+
+# ==========================================
+# 3. 對外介面
+# ==========================================
+def enabled():
+    return os.environ.get("RATE_LIMIT_ENABLED", "1") != "0"
+
+
+def acquire(url_or_host):
+    """連線前呼叫：依 host 取得 token (必要時等待)"""
+    host = urlsplit(url_or_host).netloc.lower() if '://' in url_or_host else url_or_host.lower()
+    bucket = get_bucket(host) if enabled() else None
+    if bucket is None:
+        return host
+    waited = bucket.acquire(background=is_background())
+    _count(f"{host}:requests")
+    _count(f"{host}:waited_ms", int(waited * 1000))
+    return host
+
+
+def _retry_after(res):
+    try:
+        return float(res.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttled(res):
+    """429，或被轉址到錯誤頁 (證交所封鎖時以 307 導向 HTML 說明頁，requests 會自動跟隨)"""
+    if res.status_code == 429:
+        return True
+    redirected = any(r.status_code in (302, 307) for r in getattr(res, 'history', None) or [])
+    return redirected and 'html' in res.headers.get('Content-Type', '').lower()
+
+
+def observe(host, res):
+    """收到回應後呼叫：被限速就退讓，否則逐步恢復速率"""
+    bucket = get_bucket(host) if enabled() else None
+    if bucket is None:
+        return
+    if is_throttled(res):
+        _count(f"{host}:throttled")
+        bucket.penalize(_retry_after(res))
+    else:
+        bucket.reward()
@@ -0,0 +1,232 @@
+"""
+自訂選股條件式：解析一次，編譯成「整個市場一起算」的欄式運算
+
+  rule = compile_rule("close > ma(20) and dif > dem and vol > 2*ma(vol,5)", PANEL_VARIABLES)
+  mask = rule.evaluate(values)     # values: {欄位: 日期 × 代號 DataFrame (或回傳它的函式，用到才算)}
+
+語法只接受：數字、欄位名稱、+ - * /、比較 (> >= < <= == !=，可連寫 0 < pct < 5)、and / or / not、括號與下列函式；
+屬性、索引、字串等其餘語法一律在解析時拒絕，條件式不會被當成 Python 程式執行。
+每個運算子對整個矩陣做一次向量運算 (不逐檔迴圈)；同一個子式 (例如兩處都寫 ma(20)) 只算一次。
+"""
+import ast
+import operator
+from functools import reduce
+
+import numpy as np
+
+
+class RuleError(ValueError):
+    """條件式有誤 (訊息可直接顯示給使用者)"""
+
+
+# 日 K 寬表 (日期 × 代號) 可用的欄位：pages/4 MACD 選股 (取值見 core/macd_engine.rule_variables)
+PANEL_VARIABLES = {
+    'open': '開盤價', 'high': '最高價', 'low': '最低價', 'close': '收盤價',
+    'vol': '成交量 (張)', 'pct': '漲幅%',
+    'dif': 'MACD 快線 (EMA12 − EMA26)', 'dem': 'MACD 訊號線 (DIF 的 9 日 EMA)', 'macd': 'DIF − DEM 柱狀體',
+}
+
+# 單日行情 (每檔一列) 可用的欄位：pages/1 強弱勢股，值為 compute_quote_metrics 的欄名
+QUOTE_VARIABLES = {
+    'open': '開盤', 'high': '最高', 'low': '最低', 'close': '收盤', 'prev_close': '昨收',
+    'change': '漲跌', 'pct': '漲幅%', 'amp': '振幅%', 'vol': '成交量(張)',
+}
+
+# 時間序列函式 (只能用在日 K 寬表)：f(x, 天數)，只給天數時 x 為 close；ref(x) 為前一日
+WINDOW_FUNCTIONS = {
+    'ma': ('n 日均線', lambda x, n: x.rolling(window=n).mean()),
+    'ema': ('n 日指數均線', lambda x, n: x.ewm(span=n, adjust=False).mean()),
+    'highest': ('n 日最高', lambda x, n: x.rolling(window=n).max()),
+    'lowest': ('n 日最低', lambda x, n: x.rolling(window=n).min()),
+    'ref': ('n 日前的值', lambda x, n: x.shift(n)),
+}
+ELEMENT_FUNCTIONS = {
+    'abs': ('絕對值', 1, np.abs),
+    'max': ('兩者取大', 2, np.maximum),
+    'min': ('兩者取小', 2, np.minimum),
+}
+
+_COMPARE = {ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt, ast.LtE: operator.le,
+            ast.Eq: operator.eq, ast.NotEq: operator.ne}
+_ARITH = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+_FULLWIDTH = str.maketrans("（）＞＜＝，！＋－＊／．　", "()><=,!+-*/. ")
+
+
+def rule_help(variables, time_series=True):
+    """給 st.text_input(help=...) 用的欄位 / 函式說明"""
+    lines = ["**欄位**：" + "、".join(f"`{k}` {v}" for k, v in variables.items())]
+    if time_series:
+        lines.append("**函式**：" + "、".join(f"`{k}(x, n)` {v[0]}" for k, v in WINDOW_FUNCTIONS.items())
+                     + "；只給天數時以 close 計算，例如 `ma(20)`；`ref(x)` 為前一日")
+    lines.append("**其他**：" + "、".join(f"`{k}()` {v[0]}" for k, v in ELEMENT_FUNCTIONS.items())
+                 + "；運算 `+ - * /`、比較 `> >= < <= == !=`，以 `and` / `or` / `not` 組合")
+    return "\n\n".join(lines)
+
+
+# ==========================================
+# 1. 編譯：AST → 巢狀函式 (每個節點回傳整個矩陣)
+# ==========================================
+class _Scope:
+    """單次求值的欄位取值與子式快取"""
+    def __init__(self, values):
+        self.values = values
+        self.cache = {}
+
+    def variable(self, name):
+        value = self.values[name]
+        return value() if callable(value) else value
+
+
+class _Compiler:
+    def __init__(self, text, variables, time_series):
+        self.text = text
+        self.variables = variables
+        self.time_series = time_series
+        self.names = set()
+
+    def fail(self, node, message):
+        segment = ast.get_source_segment(self.text, node)
+        raise RuleError(f"{message}：{segment}" if segment else message)
+
+    def compile(self, node):
+        fn, kind = self._compile(node)
+        key = ast.dump(node)
+
+        def cached(scope):
+            if key not in scope.cache:
+                scope.cache[key] = fn(scope)
+            return scope.cache[key]
+        return cached, kind
+
+    def expect(self, node, kind, message):
+        fn, actual = self.compile(node)
+        if actual != kind:
+            self.fail(node, message)
+        return fn
+
+    def _compile(self, node):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            value = node.value
+            return (lambda scope: value), 'num'
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name in self.variables:
+                self.names.add(name)
+                return (lambda scope: scope.variable(name)), 'num'
+            if name in WINDOW_FUNCTIONS or name in ELEMENT_FUNCTIONS:
+                self.fail(node, f"{name} 是函式，請寫成 {name}(...)")
+            self.fail(node, f"未知的欄位 (可用：{', '.join(self.variables)})")
+
+        if isinstance(node, ast.BoolOp):
+            parts = [self.expect(v, 'bool', "and / or 兩側必須是條件 (例如 close > ma(20))") for v in node.values]
+            op = operator.and_ if isinstance(node.op, ast.And) else operator.or_
+            return (lambda scope: reduce(op, (p(scope) for p in parts))), 'bool'
+
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                inner = self.expect(node.operand, 'bool', "not 後面必須是條件")
+                return (lambda scope: ~inner(scope)), 'bool'
+            if isinstance(node.op, (ast.USub, ast.UAdd)):
+                inner = self.expect(node.operand, 'num', "正負號只能用在數值")
+                sign = -1 if isinstance(node.op, ast.USub) else 1
+                return (lambda scope: inner(scope) * sign), 'num'
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITH:
+            op = _ARITH[type(node.op)]
+            left = self.expect(node.left, 'num', "四則運算只能用在數值")
+            right = self.expect(node.right, 'num', "四則運算只能用在數值")
+            return (lambda scope: op(left(scope), right(scope))), 'num'
+
+        if isinstance(node, ast.Compare):
+            if any(type(op) not in _COMPARE for op in node.ops):
+                self.fail(node, "不支援的比較運算 (可用 > >= < <= == !=)")
+            operands = [self.expect(v, 'num', "比較的兩側必須是數值") for v in [node.left] + node.comparators]
+            ops = [_COMPARE[type(op)] for op in node.ops]
+
+            def compare(scope):
+                values = [f(scope) for f in operands]
+                return reduce(operator.and_, (op(a, b) for op, a, b in zip(ops, values, values[1:])))
+            return compare, 'bool'
+
+        if isinstance(node, ast.Call):
+            return self._call(node)
+
+        self.fail(node, "不支援的語法")
+
+    def _call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            self.fail(node, "函式只能以 名稱(參數, ...) 呼叫")
+        name, args = node.func.id, node.args
+
+        if name in ELEMENT_FUNCTIONS:
+            _, arity, fn = ELEMENT_FUNCTIONS[name]
+            if len(args) != arity:
+                self.fail(node, f"{name}() 需要 {arity} 個參數")
+            parts = [self.expect(a, 'num', f"{name}() 的參數必須是數值") for a in args]
+            return (lambda scope: fn(*(p(scope) for p in parts))), 'num'
+
+        if name not in WINDOW_FUNCTIONS:
+            self.fail(node.func, f"未知的函式 (可用：{', '.join(list(WINDOW_FUNCTIONS) + list(ELEMENT_FUNCTIONS))})")
+        if not self.time_series:
+            self.fail(node, f"{name}() 需要歷史 K 線，本頁只有單日行情")
+        if not 1 <= len(args) <= 2:
+            self.fail(node, f"{name}() 需要 1 或 2 個參數")
+        fn = WINDOW_FUNCTIONS[name][1]
+
+        # ref(x) = ref(x, 1)；其他函式只給一個參數時為天數，以 close 計算
+        if name == 'ref' and len(args) == 1:
+            series_node, days = args[0], 1
+        else:
+            series_node = args[0] if len(args) == 2 else ast.Name(id='close', ctx=ast.Load())
+            days = self._days(name, args[-1])
+        if series_node is not args[0] and 'close' not in self.variables:
+            self.fail(node, f"{name}() 請指定欄位，例如 {name}(vol, 5)")
+        series = self.expect(series_node, 'num', f"{name}() 的第一個參數必須是數值欄位")
+        return (lambda scope: fn(series(scope), days)), 'num'
+
+    def _days(self, name, node):
+        if not (isinstance(node, ast.Constant) and type(node.value) is int and node.value > 0):
+            self.fail(node, f"{name}() 的天數必須是正整數")
+        return node.value
+
+
+class Rule:
+    """編譯後的條件式；evaluate 回傳與輸入欄位同形狀的布林矩陣 / 欄位"""
+    def __init__(self, text, fn, names):
+        self.text = text
+        self.names = frozenset(names)
+        self._fn = fn
+
+    def evaluate(self, values):
+        return self._fn(_Scope(values))
+
+    def __repr__(self):
+        return f"Rule({self.text!r})"
+
+
+def compile_rule(text, variables, time_series=True):
+    """
+    解析並編譯條件式；variables 為可用欄位 (PANEL_VARIABLES / QUOTE_VARIABLES)，
+    time_series=False 時不允許 ma / ref 等需要歷史資料的函式。語法或名稱錯誤丟 RuleError
+    """
+    text = (text or '').translate(_FULLWIDTH).strip()
+    if not text:
+        raise RuleError("條件式是空的")
+    try:
+        tree = ast.parse(text, mode='eval')
+    except SyntaxError as e:
+        where = f"第 {e.offset} 個字附近" if e.offset else "條件式不完整"
+        raise RuleError(f"語法錯誤 ({where})：{text}") from None
+    compiler = _Compiler(text, variables, time_series)
+    fn, kind = compiler.compile(tree.body)
+    if kind != 'bool':
+        raise RuleError(f"條件式的結果必須是成立 / 不成立 (例如 close > ma(20))：{text}")
+    if not compiler.names:
+        raise RuleError(f"條件式至少要用到一個欄位：{text}")
+    return Rule(text, fn, compiler.names)
+
+
+def quote_rule_values(df):
+    """pages/1 單日行情 DataFrame → compile_rule(..., QUOTE_VARIABLES) 的欄位取值"""
+    return {name: df[col] for name, col in QUOTE_VARIABLES.items() if col in df.columns}
@@ -0,0 +1,198 @@
+import os
+import pandas as pd
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from core.http_cache import http_get
+from core.timing import supabase_response_hook
+
+# ==========================================
+# 跨頁共用資料層 (每種資料只有一份快取)
+# ==========================================
+# 各頁面若各自定義同名的 st.cache_data 函式，快取身分 (模組 + 函式名) 不同，
+# 同一份官方 / Yahoo / Supabase 資料就會被重複下載、重複佔用記憶體。
+# 所有頁面共用的資料一律從這裡取得；頁面只保留自己專屬的資料與顯示邏輯。
+
+# --- Supabase 連線 (整個程式共用一個 client) ---
+def _setting(name):
+    """環境變數優先 (例如壓測時改連 benchmarks/stub_server.py)，其次 .streamlit/secrets.toml"""
+    return os.environ.get(name) or st.secrets[name]
+
+
+def supabase_configured():
+    """只檢查設定是否齊全，不載入 supabase 套件 (頁面可在第一次繪製前就提示設定錯誤)"""
+    try:
+        return bool(_setting("SUPABASE_URL")) and bool(_setting("SUPABASE_KEY"))
+    except Exception:
+        return False
+
+
+@st.cache_resource
+def get_supabase():
+    # supabase 套件載入約需 0.25 秒，延到第一次讀寫資料庫時才載入
+    from supabase import create_client
+    client = create_client(_setting("SUPABASE_URL"), _setting("SUPABASE_KEY"))
+    try:
+        # 每個 REST 回應計入 core/timing 的請求數與傳輸量 (頁面側邊欄的耗時明細)
+        client.postgrest.session.event_hooks['response'].append(supabase_response_hook)
+    except AttributeError:
+        pass
+    return client
+
+
+# --- 批次寫入：以唯一鍵 upsert，分塊平行送出 ---
+# 快取表需有對應的唯一索引，重跑同一天才會覆寫而不是多出重複列 (建立前請先刪除既有的重複列)：
+#   create unique index on chips_ranking_cache (date, rank_type, rank_no);
+#   create unique index on daily_chips_cache (date, stock_id);
+#   create unique index on warning_stocks_cache (date, stock_id);
+UPSERT_CHUNK_SIZE = 500   # 每次請求的列數
+UPSERT_WORKERS = 4        # 同時送出的請求數
+
+
+def upsert_rows(table, rows, on_conflict, chunk_size=UPSERT_CHUNK_SIZE, workers=UPSERT_WORKERS):
+    """
+    rows 分塊後平行 upsert 到 table，on_conflict 為唯一鍵欄位 (逗號分隔)
+    各塊各自成功 / 失敗互不影響，回傳 [{'start': 起始列, 'rows': 列數, 'ok': bool, 'error': 訊息}]
+    """
+    chunks = [(i, rows[i:i + chunk_size]) for i in range(0, len(rows), chunk_size)]
+    if not chunks:
+        return []
+    from postgrest.types import ReturnMethod
+    client = get_supabase()
+
+    def write(chunk):
+        start, part = chunk
+        try:
+            # returning=minimal：不必把寫入的列再整批傳回來
+            client.table(table).upsert(part, on_conflict=on_conflict, returning=ReturnMethod.minimal).execute()
+            return {'start': start, 'rows': len(part), 'ok': True, 'error': None}
+        except Exception as e:
+            return {'start': start, 'rows': len(part), 'ok': False, 'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks)))) as pool:
+        return list(pool.map(write, chunks))
+
+
+def upsert_error(results):
+    """upsert_rows 的結果 → 失敗摘要 (可直接顯示給使用者)；全部成功時回傳 None"""
+    failed = [r for r in results if not r['ok']]
+    if not failed:
+        return None
+    return f"{len(failed)} 批 ({sum(r['rows'] for r in failed)} 列) 寫入失敗：{failed[0]['error']}"
+
+
+# --- 產業別 (上市 + 上櫃公司基本資料) ---
+INDUSTRY_CODE_MAP = {
+    "01": "水泥工業", "02": "食品工業", "03": "塑膠工業", "04": "紡織纖維",
+    "05": "電機機械", "06": "電器電纜", "07": "化學生技醫療", "08": "玻璃陶瓷",
+    "09": "造紙工業", "10": "鋼鐵工業", "11": "橡膠工業", "12": "汽車工業",
+    "13": "電子工業", "14": "建材營造", "15": "航運業", "16": "觀光餐旅",
+    "17": "金融保險", "18": "貿易百貨", "19": "綜合", "20": "其他",
+    "21": "化學工業", "22": "生技醫療", "23": "油電燃氣", "24": "半導體業",
+    "25": "電腦及週邊", "26": "光電業", "27": "通信網路", "28": "電子零組件",
+    "29": "電子通路", "30": "資訊服務", "31": "其他電子", "32": "文化創意",
+    "33": "農業科技", "34": "電子商務", "35": "綠能環保", "36": "數位雲端",
+    "37": "運動休閒", "38": "居家生活", "80": "管理股票", "91": "存託憑證",
+}
+
+
+@st.cache_data(ttl=86400)
+def get_industry_map():
+    """{代號: 產業名稱}"""
+    industry_map = {}
+    headers = {'User-Agent': 'Mozilla/5.0'}
+    try:
+        res = http_get("https://openapi.twse.com.tw/v1/opendata/t187ap03_L", headers=headers, verify=False, timeout=5)
+        for row in res.json(): industry_map[row.get('公司代號', '').strip()] = INDUSTRY_CODE_MAP.get(row.get('產業別', ''), '其他')
+        res = http_get("https://www.tpex.org.tw/openapi/v1/t187ap03_O", headers=headers, verify=False, timeout=5)
+        for row in res.json(): industry_map[row.get('公司代號', '').strip()] = INDUSTRY_CODE_MAP.get(row.get('產業別', ''), '其他')
+    except: pass
+    return industry_map
+
+
+# --- 股票主檔 (Supabase stock_info) ---
+STOCK_INFO_PAGE_SIZE = 1000   # Supabase 單次查詢上限
+
+
+@st.cache_data(ttl=86400)
+def get_stock_master():
+    """
+    {代號: {'name': 名稱, 'market': 上市/上櫃, 'suffix': Yahoo 後綴}}
+    分頁讀取完整 stock_info；讀取失敗會丟出例外 (不快取失敗結果)，由頁面決定如何提示
+    更新 stock_info 後請呼叫 get_stock_master.clear()
+    """
+    stock_dict = {}
+    start = 0
+    while True:
+        data = get_supabase().table("stock_info").select("stock_id, stock_name, market, suffix")\
+            .range(start, start + STOCK_INFO_PAGE_SIZE - 1).execute().data
+        for row in data:
+            sid = str(row['stock_id']).strip()
+            stock_dict[sid] = {
+                'name': str(row['stock_name']).strip(),
+                'market': str(row.get('market') or '').strip(),
+                'suffix': str(row.get('suffix') or '').strip(),
+            }
+        if len(data) < STOCK_INFO_PAGE_SIZE:
+            break
+        start += STOCK_INFO_PAGE_SIZE
+    return stock_dict
+
+
+# --- 全市場股票代號 (twstock) ---
+@st.cache_data(ttl=86400)
+def get_all_stock_tickers():
+    """上市櫃普通股 ([Yahoo 代號], {Yahoo 代號: {代碼, 名稱, 產業}})"""
+    import twstock  # 載入需時較久，只在快取失效時才載入
+    try:
+        twstock.__update_codes()
+    except: pass
+
+    yf_tickers = []
+    info_map = {}
+    for code, info in twstock.codes.items():
+        if info.type == '股票':
+            suffix = ".TWO" if info.market == "上櫃" else ".TW"
+            ticker = f"{code}{suffix}"
+            yf_tickers.append(ticker)
+            info_map[ticker] = {"代碼": code, "名稱": info.name, "產業": info.group}
+    return yf_tickers, info_map
+
+
+# --- 個股日 K (Yahoo chart API，近 6 個月) ---
+@st.cache_data(ttl=3600)
+def fetch_kline_data(ticker, specific_suffix=None, timeout=5):
+    """timeout 為每次請求的秒數 (未給 suffix 時 .TW / .TWO 各試一次)"""
+    headers = {'User-Agent': 'Mozilla/5.0'}
+
+    # 如果有明確的 suffix，就只抓一次；否則維持盲猜邏輯
+    if ticker.startswith('^'):
+        suffixes_to_try = ['']
+    elif specific_suffix is not None:
+        suffixes_to_try = [specific_suffix]
+    else:
+        suffixes_to_try = ['.TW', '.TWO']
+
+    for suffix in suffixes_to_try:
+        try:
+            url = f"https://query2.finance.yahoo.com/v8/finance/chart/{ticker}{suffix}?range=6mo&interval=1d"
+            res = http_get(url, headers=headers, timeout=timeout).json()
+            result = res.get('chart', {}).get('result')
+            if result:
+                meta = result[0].get('meta', {})
+                quote = result[0]['indicators']['quote'][0]
+                df = pd.DataFrame({
+                    'Close': result[0]['indicators']['adjclose'][0]['adjclose'],
+                    'Open': quote['open'], 'High': quote['high'], 'Low': quote['low'],
+                    'Volume': quote['volume']
+                })
+                df.index = pd.to_datetime(result[0]['timestamp'], unit='s') + pd.Timedelta(hours=8)
+                df.index = df.index.normalize()
+                df = df.dropna()
+
+                if not df.empty and df['Volume'].iloc[-1] == 0:
+                    reg_vol = meta.get('regularMarketVolume', 0)
+                    if reg_vol > 0: df.iloc[-1, df.columns.get_loc('Volume')] = reg_vol
+                return df
+        except:
+            continue
+    return pd.DataFrame()
@@ -0,0 +1,70 @@
+"""
+行程內 single-flight：同一份資料 (資料集 + 參數，例如日期) 同時只計算一次
+
+多個 session (或盤後預熱排程) 同時要求同一份尚未快取的資料時，第一個呼叫者實際執行，
+其餘呼叫者等待並共用它的結果；執行失敗時所有等待者收到同一個例外。
+結束後立即移除，不做快取 (快取仍由 st.cache_data / Supabase 負責)。
+"""
+import copy
+import inspect
+import threading
+from collections import Counter
+from functools import wraps
+
+stats = Counter()   # leader (實際執行) / shared (等待共用) 次數，供壓測報表使用
+_lock = threading.Lock()
+_inflight = {}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def run_once(key, fn, *args, **kwargs):
+    """同一個 key 進行中時等待其結果，否則自己執行；回傳 (結果, 是否為共用)"""
+    with _lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+        stats['leader' if leader else 'shared'] += 1
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+    try:
+        flight.result = fn(*args, **kwargs)
+        return flight.result, False
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        flight.done.set()
+
+
+def single_flight(name, ignore=()):
+    """
+    裝飾器：以 (name, 正規化後的參數) 為 key 合併同時進行的相同呼叫
+    ignore 為不影響結果的參數 (例如各呼叫者自己的 on_error 回呼)，不列入 key
+    等待者拿到的是結果的深拷貝，與 st.cache_data 相同，避免某個 session 就地修改 DataFrame 影響其他人
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (name,) + tuple((k, v) for k, v in bound.arguments.items() if k not in ignore)
+            result, shared = run_once(key, fn, *args, **kwargs)
+            return copy.deepcopy(result) if shared else result
+        return wrapper
+    return decorator
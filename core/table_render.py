@@ -0,0 +1,126 @@
+import hashlib
+import html
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 大字體 HTML 表格：欄位遮罩算樣式，相同樣式合併成 class
+# ==========================================
+# df.style.apply(axis=1) 逐列呼叫 Python 函式組 CSS 字串，to_html() 再替每一格各寫一條
+# #T_xxx_rowN_colM 規則；全市場結果表的渲染時間與送到瀏覽器的 HTML 都跟格數成正比。
+# 這裡改成：顏色 / 漲跌停規則以整欄 numpy 遮罩計算 → 相同的 CSS 只寫一次 (class) → 直接組出 <table>。
+
+UP_CSS = "color: #ff4b4b; "
+DOWN_CSS = "color: #1e7b1e; "
+BOLD_CSS = "font-weight: bold; "
+ACCENT_CSS = "color: #ff8c00; font-weight: bold; "   # 亮橘色強調 (振幅、型態描述)
+LIMIT_UP_CSS = "background-color: rgba(255, 75, 75, 0.2); "
+LIMIT_DOWN_CSS = "background-color: rgba(0, 136, 0, 0.15); "
+LIMIT_PCT = 9.85   # 漲幅% 超過即視為漲停 / 跌停，整列上底色
+
+TABLE_CSS = "width: 100%; border-collapse: collapse; text-align: center;"
+
+
+def header_css(font_size):
+    return f"font-size: {font_size}px; text-align: center; padding: 12px; border-bottom: 2px solid #555;"
+
+
+def cell_css(font_size):
+    return f"font-size: {font_size}px; text-align: center; padding: 12px; border-bottom: 1px solid #ddd;"
+
+
+# --- 樣式規則 (每個函式回傳整欄的 CSS 字串陣列) ---
+def _numeric(values):
+    return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype='float64')
+
+
+def sign_css(values):
+    """正數紅、負數綠 (台股慣例)"""
+    v = _numeric(values)
+    return np.where(v > 0, UP_CSS, np.where(v < 0, DOWN_CSS, "")).astype(object)
+
+
+def limit_css(pct_values):
+    """漲停列紅底、跌停列綠底"""
+    v = _numeric(pct_values)
+    return np.where(v >= LIMIT_PCT, LIMIT_UP_CSS, np.where(v <= -LIMIT_PCT, LIMIT_DOWN_CSS, "")).astype(object)
+
+
+def value_css(values, css_map):
+    """依儲存格內容對應樣式 {內容: CSS}，未列出的內容不加樣式"""
+    return pd.Series(values).map(css_map).fillna("").to_numpy(dtype=object)
+
+
+def quote_styles(df, sign_cols=('漲跌', '漲幅%'), bold_cols=('收盤',), accent_cols=(), pct_col='漲幅%', base=""):
+    """
+    行情表共用規則 (首頁持股、pages/1 強弱勢股、pages/4 MACD 選股)：
+    收盤粗體、漲跌紅綠、強調欄橘色、漲跌停整列底色
+    回傳 {欄位: CSS 字串陣列}
+    """
+    row_css = limit_css(df[pct_col])
+    styles = {}
+    for col in df.columns:
+        css = np.full(len(df), base, dtype=object)
+        if col in bold_cols: css = css + BOLD_CSS
+        if col in sign_cols: css = css + sign_css(df[col])
+        if col in accent_cols: css = css + ACCENT_CSS
+        styles[col] = css + row_css
+    return styles
+
+
+# --- 輸出 ---
+def _format_column(values, fmt):
+    """fmt 只套用在數值上 (同一欄混有 '-' 之類的文字時原樣輸出)；未指定格式時小數比照 Styler 預設"""
+    out = []
+    for v in values:
+        if isinstance(v, str):
+            out.append(v)
+        elif fmt is not None:
+            out.append(fmt.format(v))
+        elif isinstance(v, (float, np.floating)):
+            out.append(f"{v:.6f}")
+        else:
+            out.append(str(v))
+    return out
+
+
+def render_table(df, styles=None, formats=None, th_css="", td_css="", table_css=TABLE_CSS):
+    """
+    組出 <style> + <table> HTML 字串 (不含 index)，交給 st.markdown(..., unsafe_allow_html=True)
+    styles：{欄位: 每列的 CSS 字串}；formats：{欄位: '{:.2f}' 這類格式字串}
+    """
+    styles = styles or {}
+    formats = formats or {}
+    columns = list(df.columns)
+    n = len(df)
+
+    # 相同 CSS 只寫一次：每欄用 factorize 換成 class 編號
+    class_of = {"": ""}
+    cell_classes = []
+    for col in columns:
+        css = styles.get(col)
+        if css is None:
+            cell_classes.append([""] * n)
+            continue
+        codes, uniques = pd.factorize(np.asarray(css, dtype=object))
+        names = []
+        for u in uniques:
+            if u not in class_of:
+                class_of[u] = f"s{len(class_of) - 1}"
+            names.append(f' class="{class_of[u]}"' if class_of[u] else "")
+        cell_classes.append(np.array(names, dtype=object)[codes] if n else [])
+
+    rules = [f"th {{{th_css}}}", f"td {{{td_css}}}"] + [f".{name} {{{css.strip()}}}" for css, name in class_of.items() if name]
+    # 以樣式內容雜湊當 table id：同頁多張表格的 class 名稱不會互相覆蓋
+    table_id = "t" + hashlib.md5("".join(rules).encode('utf-8')).hexdigest()[:8]
+    style_block = "".join(f"#{table_id} {rule}" for rule in rules)
+
+    texts = [[html.escape(t) for t in _format_column(df[col].tolist(), formats.get(col))] for col in columns]
+    head = "".join(f"<th>{html.escape(str(col))}</th>" for col in columns)
+    body = "".join(
+        "<tr>" + "".join(f"<td{cell_classes[j][i]}>{texts[j][i]}</td>" for j in range(len(columns))) + "</tr>"
+        for i in range(n)
+    )
+    return (f'<style>{style_block}</style><table id="{table_id}" style="{table_css}">'
+            f'<thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>')
@@ -0,0 +1,160 @@
+"""
+頁面效能剖析：各階段 (fetch / parse / compute / render) 的耗時、上游請求數與傳輸量
+
+  begin_trace("2_法人買賣超排行v5")            頁面開頭 (set_page_config 之後)，名稱用頁面檔名 (與 benchmarks 報表的 page 相同)；預熱排程每個工作也各開一個
+  with span("fetch", "get_chips_rank_from_cache") as s:
+      ...
+      s['rows'] = len(df)                       可附帶任意欄位 (筆數等)
+  render_timing_sidebar()                      頁面結尾：側邊欄可收合的耗時明細
+
+每個 span 結束時以一行 JSON 追加到 cache/timing/spans.jsonl (環境變數 TIMING_LOG 可改路徑，設為 0 則不寫檔)。
+請求數與位元組來自 http_cache (交易所 / Yahoo) 與 Supabase client 的回應 hook，記在全行程計數器，
+span 記錄的是期間的增量 —— 多人同時操作時會包含其他 session 同時發出的請求。
+目前執行緒沒有 begin_trace (例如離線 benchmark) 時，span 不做任何事。
+"""
+import os
+import json
+import time
+import uuid
+import datetime
+import threading
+import contextlib
+from collections import Counter
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LOG = os.path.join(_ROOT, "cache", "timing", "spans.jsonl")
+
+io_stats = Counter()   # {來源}:requests / {來源}:bytes
+_io_lock = threading.Lock()
+_log_lock = threading.Lock()
+_local = threading.local()
+
+
+# ==========================================
+# 1. 上游 I/O 計數
+# ==========================================
+def source_of(host):
+    host = (host or '').lower()
+    if 'twse' in host: return 'twse'
+    if 'tpex' in host: return 'tpex'
+    if 'yahoo' in host: return 'yahoo'
+    if 'supabase' in host: return 'supabase'
+    return host or 'other'
+
+
+def count_io(source, nbytes=0):
+    with _io_lock:
+        io_stats[f"{source}:requests"] += 1
+        io_stats[f"{source}:bytes"] += nbytes
+
+
+def supabase_response_hook(response):
+    """掛在 Supabase (httpx) client 的 response hook：計入請求數與傳輸量 (送出 + Content-Length)"""
+    sent = len(response.request.content or b'') if response.request is not None else 0
+    count_io('supabase', sent + int(response.headers.get('content-length') or 0))
+
+
+def _io_delta(before):
+    with _io_lock:
+        after = dict(io_stats)
+    delta = {k: v - before.get(k, 0) for k, v in after.items() if v != before.get(k, 0)}
+    requests = {k.split(':')[0]: v for k, v in delta.items() if k.endswith(':requests')}
+    return requests, sum(v for k, v in delta.items() if k.endswith(':bytes'))
+
+
+# ==========================================
+# 2. Trace / span
+# ==========================================
+def log_path():
+    path = os.environ.get("TIMING_LOG", DEFAULT_LOG)
+    return None if path == '0' else path
+
+
+def _append_log(record):
+    path = log_path()
+    if not path:
+        return
+    try:
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with _log_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line)
+    except OSError:
+        pass   # 記錄失敗不可影響頁面
+
+
+def begin_trace(name):
+    """開始一次執行的剖析 (同一執行緒後續的 span 都記在這裡)"""
+    _local.trace = {'name': name, 'run': uuid.uuid4().hex[:8], 'start': time.perf_counter(), 'spans': [], 'depth': 0}
+    return _local.trace
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+@contextlib.contextmanager
+def span(stage, name):
+    trace = current_trace()
+    if trace is None:
+        yield {}
+        return
+    with _io_lock:
+        io_before = dict(io_stats)
+    extra = {}
+    trace['depth'] += 1
+    t0 = time.perf_counter()
+    try:
+        yield extra
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        trace['depth'] -= 1
+        requests, nbytes = _io_delta(io_before)
+        record = {'stage': stage, 'name': name, 'ms': round(ms, 1), 'depth': trace['depth'],
+                  'requests': requests, 'bytes': nbytes, **extra}
+        trace['spans'].append(record)
+        _append_log({'ts': datetime.datetime.now().isoformat(timespec='milliseconds'),
+                     'trace': trace['name'], 'run': trace['run'], **record})
+
+
+def trace_summary(trace=None):
+    """[(階段, 名稱, 毫秒, 請求數, KB)]，依開始順序排列 (巢狀 span 以縮排表示)"""
+    trace = trace or current_trace()
+    if trace is None:
+        return []
+    # span 在結束時才加入清單，巢狀的內層會排在外層前面；依深度與完成順序還原成開始順序
+    ordered, stack = [], []
+    for record in trace['spans']:
+        children = []
+        while stack and stack[-1]['depth'] > record['depth']:
+            children.insert(0, stack.pop())
+        stack.append(dict(record, children=children))
+
+    def flatten(nodes):
+        for node in nodes:
+            ordered.append(node)
+            flatten(node['children'])
+    flatten(stack)
+    return [{'階段': r['stage'], '名稱': "　" * r['depth'] + r['name'], '毫秒': r['ms'],
+             '請求': sum(r['requests'].values()), 'KB': round(r['bytes'] / 1024, 1),
+             '來源': ", ".join(f"{k} {v}" for k, v in r['requests'].items())} for r in ordered]
+
+
+def render_timing_sidebar():
+    """側邊欄顯示本次執行的耗時明細，並記錄整頁總耗時"""
+    trace = current_trace()
+    if trace is None:
+        return
+    import streamlit as st
+    total_ms = round((time.perf_counter() - trace['start']) * 1000, 1)
+    _append_log({'ts': datetime.datetime.now().isoformat(timespec='milliseconds'), 'trace': trace['name'], 'run': trace['run'],
+                 'stage': 'total', 'name': trace['name'], 'ms': total_ms, 'depth': 0, 'requests': {}, 'bytes': 0})
+    rows = trace_summary(trace)
+    with st.sidebar.expander(f"⏱️ 本次執行耗時 {total_ms / 1000:.2f} 秒", expanded=False):
+        if rows:
+            st.dataframe(rows, hide_index=True, width='stretch')
+        else:
+            st.caption("本次執行沒有記錄到任何階段。")
+        if log_path():
+            st.caption(f"明細記錄：{os.path.relpath(log_path(), _ROOT)}")
@@ -0,0 +1,144 @@
+import os
+import json
+import datetime
+import threading
+
+# ==========================================
+# 台股交易日曆 (上市/上櫃共用，純本地查詢)
+# ==========================================
+# 休市資料來源：
+#   1. data/tw_market_calendar.json —— 隨程式發佈的官方休市日 (國定假日、春節前結算日、颱風停止交易)
+#   2. cache/market_calendar_overrides.json —— 臨時加入的休市日 (例如當天才宣布的颱風假)
+# 兩者合併後常駐記憶體，「前 N 個交易日」之類的查詢不會發出任何網路請求。
+# 未涵蓋的年度 (檔案尚未更新) 以「週一到週五皆為交易日」推算。
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CALENDAR_FILE = os.path.join(_ROOT, "data", "tw_market_calendar.json")
+OVERRIDE_FILE = os.environ.get("MARKET_CALENDAR_OVERRIDES", os.path.join(_ROOT, "cache", "market_calendar_overrides.json"))
+TWSE_HOLIDAY_URL = "https://openapi.twse.com.tw/v1/holidaySchedule/holidaySchedule"
+
+_lock = threading.Lock()
+_calendar = None
+
+
+def _to_date(d):
+    if d is None:
+        return (datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=8)))).date()
+    if isinstance(d, datetime.datetime):
+        return d.date()
+    if isinstance(d, str):
+        return datetime.date.fromisoformat(d)
+    return d
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_calendar(force=False):
+    """讀取內建檔與臨時休市檔，回傳 {'closures': {日期: 原因}}"""
+    global _calendar
+    with _lock:
+        if _calendar is None or force:
+            bundled = _read_json(CALENDAR_FILE)
+            overrides = _read_json(OVERRIDE_FILE)
+            closures = {datetime.date.fromisoformat(k): v for k, v in bundled.get('closures', {}).items()}
+            closures.update({datetime.date.fromisoformat(k): v for k, v in overrides.get('closures', {}).items()})
+            _calendar = {'closures': closures}
+        return _calendar
+
+
+def reload_calendar():
+    """重新從本地檔案載入 (更新內建檔或臨時休市檔後呼叫，不需網路)"""
+    return load_calendar(force=True)
+
+
+def closure_reason(d):
+    """休市原因；交易日回傳 None"""
+    d = _to_date(d)
+    if d.weekday() >= 5:
+        return "週末"
+    return load_calendar()['closures'].get(d)
+
+
+def is_trading_day(d=None):
+    return closure_reason(d) is None
+
+
+def latest_trading_day(d=None):
+    """d 當天 (含) 以前最近的一個交易日"""
+    d = _to_date(d)
+    while not is_trading_day(d):
+        d -= datetime.timedelta(days=1)
+    return d
+
+
+def previous_trading_day(d=None):
+    """d 之前 (不含 d) 最近的一個交易日"""
+    return latest_trading_day(_to_date(d) - datetime.timedelta(days=1))
+
+
+def recent_trading_days(n, end=None):
+    """end 當天 (含) 往回的 n 個交易日，由新到舊排列"""
+    days = []
+    d = latest_trading_day(end)
+    while len(days) < n:
+        days.append(d)
+        d = previous_trading_day(d)
+    return days
+
+
+def trading_days_between(start, end):
+    """start ~ end (皆含) 之間的交易日，由舊到新排列"""
+    start, end = _to_date(start), _to_date(end)
+    days, d = [], start
+    while d <= end:
+        if is_trading_day(d):
+            days.append(d)
+        d += datetime.timedelta(days=1)
+    return days
+
+
+def add_market_closure(d, reason="颱風停止交易"):
+    """臨時加入休市日 (例如颱風假)，寫入 OVERRIDE_FILE 並立即生效"""
+    d = _to_date(d)
+    overrides = _read_json(OVERRIDE_FILE)
+    overrides.setdefault('closures', {})[d.isoformat()] = reason
+    os.makedirs(os.path.dirname(OVERRIDE_FILE), exist_ok=True)
+    with open(OVERRIDE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(overrides, f, ensure_ascii=False, indent=1)
+    reload_calendar()
+
+
+def refresh_calendar_from_twse():
+    """
+    (需網路，維護用) 從證交所 OpenAPI 下載當年度休市表併入內建檔，回傳新增筆數
+    名稱含「交易」的項目 (如「開始交易」「最後交易日」) 是交易日，不列入休市
+    """
+    from core.http_cache import http_get
+    res = http_get(TWSE_HOLIDAY_URL, headers={'User-Agent': 'Mozilla/5.0'}, verify=False, timeout=10)
+    bundled = _read_json(CALENDAR_FILE)
+    closures = bundled.setdefault('closures', {})
+    years = set(bundled.get('covered_years', []))
+    added = 0
+    for row in res.json():
+        raw = str(row.get('Date', '')).strip()
+        name = str(row.get('Name', '')).strip()
+        if len(raw) != 7 or ('交易' in name and '無交易' not in name):
+            continue
+        d = datetime.date(int(raw[:3]) + 1911, int(raw[3:5]), int(raw[5:7]))
+        years.add(d.year)
+        if d.weekday() < 5 and d.isoformat() not in closures:
+            closures[d.isoformat()] = name or "休市"
+            added += 1
+    bundled['closures'] = dict(sorted(closures.items()))
+    bundled['covered_years'] = sorted(years)
+    bundled['updated'] = datetime.date.today().isoformat()
+    with open(CALENDAR_FILE, 'w', encoding='utf-8') as f:
+        json.dump(bundled, f, ensure_ascii=False, indent=1)
+    reload_calendar()
+    return added
@@ -0,0 +1,74 @@
+from core.announcements import fetch_official_announcements
+from core.shared_data import get_supabase, get_stock_master, upsert_error, upsert_rows
+from core.timing import span
+
+# ==========================================
+# 注意 / 處置股：雲端快取讀寫與每日同步 (pages/5 與盤後預熱排程共用)
+# ==========================================
+
+def get_market_data_from_cache(date_str):
+    try:
+        res = get_supabase().table("warning_stocks_cache").select("*").eq("date", date_str).execute()
+        if res.data:
+            notice_set = {row['stock_id'] for row in res.data if row['status'] == '注意股'}
+            punish_db = {row['stock_id']: {"期間": row['period'], "分盤": row['match_time']}
+                         for row in res.data if row['status'] == '處置股'}
+            return notice_set, punish_db
+    except: pass
+    return None, None
+
+def save_market_data_to_cache(date_str, notice_set, punish_db):
+    data_to_insert = []
+    for code, info in punish_db.items():
+        data_to_insert.append({"date": date_str, "stock_id": code, "status": "處置股", "period": info['期間'], "match_time": info['分盤']})
+    for code in notice_set:
+        if code not in punish_db:
+            data_to_insert.append({"date": date_str, "stock_id": code, "status": "注意股", "period": "", "match_time": "-"})
+    # 以 (date, stock_id) upsert：手動同步與預熱排程同時寫入同一天也不會重複
+    return upsert_rows("warning_stocks_cache", data_to_insert, "date,stock_id")
+
+
+def sync_warning_stocks(target_date, on_error=None):
+    """
+    指定日的注意 / 處置股：先讀雲端快取，沒有才向官方抓取，官方已發布就寫回快取
+    回傳 (notice_set, punish_db, name_dict, is_updated, save_error)；讀到快取時 name_dict 為空，
+    save_error 為寫回快取失敗的摘要 (沒有寫入或全部成功時為 None)
+    """
+    date_str = target_date.strftime('%Y-%m-%d')
+    with span("fetch", "get_market_data_from_cache"):
+        notice_set, punish_db = get_market_data_from_cache(date_str)
+    if notice_set is not None:
+        return notice_set, punish_db, {}, True, None
+    with span("fetch", "fetch_official_announcements"):
+        notice_set, punish_db, name_dict, is_updated = fetch_official_announcements(target_date, on_error=on_error)
+    save_error = None
+    if is_updated:
+        with span("fetch", "save_market_data_to_cache"):
+            save_error = upsert_error(save_market_data_to_cache(date_str, notice_set, punish_db))
+    return notice_set, punish_db, name_dict, is_updated, save_error
+
+
+def register_stock_names(name_dict, info_map=None):
+    """
+    公告裡出現、但股票主檔還沒有 (或只有代號當名稱) 的股票，補寫進 stock_info
+    info_map 為 pages/5 的 {代號: {名稱, 市場, suffix}}，會就地更新；未給時以共用主檔判斷
+    回傳新寫入的筆數
+    """
+    if not name_dict:
+        return 0
+    if info_map is None:
+        try:
+            info_map = {sid: {"名稱": v['name']} for sid, v in get_stock_master().items()}
+        except Exception:
+            info_map = {}
+    new_stocks = []
+    for code, data in name_dict.items():
+        if code not in info_map or info_map[code]['名稱'] == code:
+            info_map[code] = data
+            new_stocks.append({"stock_id": code, "stock_name": data["名稱"], "market": data["市場"], "suffix": data["suffix"]})
+    if new_stocks:
+        try:
+            get_supabase().table("stock_info").upsert(new_stocks).execute()
+            get_stock_master.clear()
+        except: pass
+    return len(new_stocks)
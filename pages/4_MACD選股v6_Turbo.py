@@ -1,12 +1,19 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
-import twstock
 import datetime
 import os
 import json
+from core.ohlcv_store import sync_ohlcv_store, load_ohlcv_panel, panel_window
+from core.shared_data import get_all_stock_tickers
+from core.macd_engine import screen_macd_market, screen_rule_market
+from core.screener_expr import PANEL_VARIABLES, RuleError, compile_rule, rule_help
+from core.prewarm import start_prewarm_scheduler
+from core.table_render import render_table, quote_styles, header_css, cell_css
+from core.timing import begin_trace, render_timing_sidebar, span
 
 st.set_page_config(page_title="全市場MACD選股", layout="wide", page_icon="📈")
+start_prewarm_scheduler()  # 盤後預熱排程 (整個伺服器行程只啟動一次，見 core/prewarm.py)
+begin_trace("4_MACD選股v6_Turbo")  # 各階段耗時 (側邊欄 + cache/timing/spans.jsonl，見 core/timing.py)
 
 st.title("📈 全市場 MACD 爆量選股雷達")
 st.markdown("將單機版程式完美移植上雲端！一鍵掃描上市櫃近 1800 檔股票，找出 **均線多頭 + MACD 轉強 + 爆量表態** 的主力飆股。")
@@ -14,96 +21,12 @@ st.markdown("將單機版程式完美移植上雲端！一鍵掃描上市櫃近
 # ==========================================
 # 1. 取得全市場股票代號清單 (加入快取加快速度)
 # ==========================================
-@st.cache_data(ttl=86400)
-def get_all_stock_tickers():
-    try:
-        twstock.__update_codes()
-    except: pass
-    
-    yf_tickers = []
-    info_map = {}
-    for code, info in twstock.codes.items():
-        if info.type == '股票':
-            suffix = ".TWO" if info.market == "上櫃" else ".TW"
-            ticker = f"{code}{suffix}"
-            yf_tickers.append(ticker)
-            info_map[ticker] = {"代碼": code, "名稱": info.name, "產業": info.group}
-    return yf_tickers, info_map
-
-with st.spinner("正在同步台股上市櫃股票清單..."):
+# (清單與快取在 core/shared_data.get_all_stock_tickers，盤後預熱排程也用同一份)
+with st.spinner("正在同步台股上市櫃股票清單..."), span("fetch", "get_all_stock_tickers"):
     yf_tickers, info_map = get_all_stock_tickers()
 
 # ==========================================
-# 2. 核心策略運算 (100% 移植自您的附件)
-# ==========================================
-def calculate_macd_strategy(ticker, df, min_volume_k):
-    if df.empty or len(df) < 60:
-        return None
-
-    close = df['Close']
-    volume = df['Volume']
-    
-    ma20 = close.rolling(window=20).mean()
-    ma60 = close.rolling(window=60).mean()
-    vol_ma5 = volume.rolling(window=5).mean()
-    
-    exp12 = close.ewm(span=12, adjust=False).mean()
-    exp26 = close.ewm(span=26, adjust=False).mean()
-    dif = exp12 - exp26
-    dem = dif.ewm(span=9, adjust=False).mean() 
-
-    curr_idx = -1
-    prev_idx = -2
-    
-    p_close = close.iloc[curr_idx]
-    y_close = close.iloc[prev_idx]
-    
-    p_ma20 = ma20.iloc[curr_idx]
-    y_ma20 = ma20.iloc[prev_idx]
-    p_ma60 = ma60.iloc[curr_idx]
-    y_ma60 = ma60.iloc[prev_idx]
-    
-    p_dif = dif.iloc[curr_idx]
-    p_dem = dem.iloc[curr_idx]
-    y_dif = dif.iloc[prev_idx]
-    y_dem = dem.iloc[prev_idx]
-    
-    p_vol = volume.iloc[curr_idx]
-    p_vol_ma5 = vol_ma5.iloc[curr_idx]
-
-    current_vol_k = int(p_vol // 1000)
-    
-    # --- 您的核心選股條件 ---
-    cond_trend = (p_ma20 > y_ma20) and (p_ma60 > y_ma60)
-    cond_rebound = (y_close <= y_ma20 * 1.015) and (p_close > p_ma20) and (p_close > y_close)
-    cond_macd_bull = p_dif > p_dem
-    cond_volume = (current_vol_k >= min_volume_k) and (p_vol > p_vol_ma5)
-
-    if cond_trend and cond_rebound and cond_macd_bull and cond_volume:
-        notes = ["均線回測成功"]
-        if (y_dif < y_dem) and (p_dif > p_dem):
-            notes.append("MACD剛金叉")
-        notes.append("爆量轉強")
-        
-        pct = ((p_close - y_close) / y_close) * 100
-        
-        info = info_map.get(ticker, {})
-        return {
-            "產業類別": info.get("產業", ""),
-            "代碼": info.get("代碼", ticker),
-            "名稱": info.get("名稱", ""),
-            "收盤": round(p_close, 2),
-            "漲跌幅": pct, # 用於排序
-            "漲幅%": round(pct, 2),
-            "成交量(張)": current_vol_k,
-            "MA20": round(p_ma20, 2),
-            "MACD快線": round(p_dif, 2),
-            "型態描述": " + ".join(notes)
-        }
-    return None
-
-# ==========================================
-# 3. 介面操作與進度條掃描區
+# 2. 介面操作與進度條掃描區
 # ==========================================
 col1, col2 = st.columns(2)
 with col1:
@@ -112,83 +35,120 @@ with col2:
     st.markdown("<div style='margin-top: 28px;'></div>", unsafe_allow_html=True)
     start_btn = st.button("🚀 開始全市場深度掃描", use_container_width=True)
 
+# 自訂條件式：解析一次後整個市場以矩陣運算求值 (見 core/screener_expr.py)，取代內建四大條件
+rule_text = st.text_input("🧮 自訂選股條件 (選填，留空則使用內建的 均線多頭 + MACD 轉強 + 爆量 條件；成交量門檻照樣套用)",
+                          placeholder="close > ma(20) and dif > dem and vol > 2*ma(vol,5)", help=rule_help(PANEL_VARIABLES))
+
 st.divider()
 
+# ==========================================
+# 3. 大字體 HTML 完美渲染輸出 (掃描途中每批完成就更新一次)
+# ==========================================
+def show_results(area, scan):
+    """依漲幅% 排序後重畫結果表；scan 為 session_state 中本次 (或上次) 掃描的狀態"""
+    rows = scan['rows']
+    with area.container():
+        if scan['status'] == 'running':
+            st.info(f"⏳ 掃描中 (批次 {scan['done']} / {scan['total']})，已發現 {len(rows)} 檔，依漲幅% 即時排序：")
+        elif scan['status'] == 'cancelled':
+            st.warning(f"⏹️ 掃描已中斷 (完成 {scan['done']} / {scan['total']} 批)，以下為已找到的 {len(rows)} 檔 (成交量門檻 {scan['min_volume_k']} 張)：")
+        elif rows and scan.get('rule'):
+            st.success(f"🎉 在近 1800 檔股票中，共發現 {len(rows)} 檔符合自訂條件 `{scan['rule']}` 的標的：")
+        elif rows:
+            st.success(f"🎉 恭喜！在近 1800 檔股票中，共發現 {len(rows)} 檔符合您主力爆量與 MACD 轉強條件的標的：")
+        else:
+            st.warning("🕵️‍♂️ 掃描完成。今日全市場沒有發現符合條件的股票，您可以考慮稍微降低「成交量」門檻再試一次。")
+        if not rows:
+            return
+        df_final = pd.DataFrame(list(rows.values()))
+        df_final = df_final.sort_values(by="漲跌幅", ascending=False).drop(columns=['漲跌幅'])
+
+        # 型態描述以亮橘色強調訊號；本頁只有漲幅% 上紅綠色
+        with span("render", "render_table"):
+            html_table = render_table(
+                df_final, styles=quote_styles(df_final, sign_cols=('漲幅%',), accent_cols=('型態描述',), base="font-size: 18px; "),
+                formats={"收盤": "{:.2f}", "漲幅%": "{:.2f} %", "MA20": "{:.2f}", "MACD快線": "{:.2f}", "成交量(張)": "{:.0f}"},
+                th_css=header_css(18), td_css=cell_css(18))
+        st.markdown(html_table, unsafe_allow_html=True)
+
+
+# 掃描狀態放在 session_state：按下停止鈕 (或掃描途中調整任何元件) 時 Streamlit 會中斷本次執行並重跑，
+# 重跑後仍能顯示已找到的部分結果
+last_scan = st.session_state.get('macd_scan')
+
+rule, rule_error = None, None
+if start_btn and rule_text.strip():
+    try:
+        rule = compile_rule(rule_text, PANEL_VARIABLES)
+    except RuleError as e:
+        rule_error = str(e)
+
+def screen(panel, tickers):
+    if rule is not None:
+        return screen_rule_market(panel, tickers, rule, min_volume_k, info_map)
+    return screen_macd_market(panel, tickers, min_volume_k, info_map)
+
 if start_btn:
     if not yf_tickers:
         st.error("無法取得台股清單，請確認網路連線。")
+    elif rule_error:
+        st.error(f"⚠️ 自訂條件有誤，請修正後再掃描：{rule_error}")
     else:
-        st.info(f"準備掃描 {len(yf_tickers)} 檔股票，這大約需要 1~2 分鐘，請喝口水稍候片刻...")
+        st.info(f"準備掃描 {len(yf_tickers)} 檔股票，K 線改由本地資料庫讀取，只會向 Yahoo 補抓缺少的交易日...")
         
         # 雲端版專屬：進度條顯示
         progress_bar = st.progress(0)
         status_text = st.empty()
+        st.button("⏹️ 停止掃描 (保留目前已找到的標的)", key="macd_stop")
+        table_area = st.empty()
+
+        scan = st.session_state['macd_scan'] = {'rows': {}, 'status': 'running', 'done': 0, 'total': 0, 'min_volume_k': min_volume_k,
+                                                'rule': rule.text if rule else None}
         
-        all_results = []
-        chunk_size = 50
-        total_chunks = (len(yf_tickers) + chunk_size - 1) // chunk_size
-        
-        # 只抓取近 150 天資料即可計算 MA60 與 MACD，大幅加快下載速度
+        # 只取近 150 天資料即可計算 MA60 與 MACD (視窗與原本線上下載完全相同)
         end_date = datetime.datetime.today() + datetime.timedelta(days=1)
         start_date = end_date - datetime.timedelta(days=150) 
         
-        for i in range(0, len(yf_tickers), chunk_size):
-            chunk = yf_tickers[i:i+chunk_size]
-            current_chunk = (i // chunk_size) + 1
-            
-            status_text.text(f"📥 正在下載並運算批次 {current_chunk} / {total_chunks} ...")
+        def show_sync_progress(done, total, text):
+            scan['done'], scan['total'] = done, total
+            status_text.text(text)
+            progress_bar.progress(done / total if total else 1.0)
+        
+        def screen_batch(chunk, panel):
+            # 每批 K 線寫入記憶體後立刻選股；同一代號再次出現 (還原價重抓) 時以新結果取代
+            for ticker in chunk:
+                scan['rows'].pop(info_map.get(ticker, {}).get("代碼", ticker), None)
+            window = panel_window(panel, start=start_date.date(), tickers=chunk)
+            for row in screen(window, chunk):
+                scan['rows'][row['代碼']] = row
+            scan['done'] = min(scan['done'] + 1, scan['total'])
+            show_results(table_area, scan)
+        
+        # 增量同步本地 K 線資料庫 (當日已同步過則直接略過)
+        with span("fetch", "sync_ohlcv_store (Yahoo 補抓 + 逐批選股)"):
+            sync_stats = sync_ohlcv_store(yf_tickers, on_progress=show_sync_progress, on_batch=screen_batch)
+        if sync_stats['failed']:
+            st.warning(f"⚠️ {sync_stats['failed']} 檔 K 線本次下載失敗，選股結果可能不完整，下次掃描會自動補抓。")
+        
+        if sync_stats['skipped']:
+            # 資料庫已是最新：不必等下載，直接讀本地資料一次算完
+            status_text.text("⚙️ 正在從本地資料庫讀取並向量化運算全市場訊號 ...")
+            with span("parse", "load_ohlcv_panel (本地 parquet)"):
+                panel = load_ohlcv_panel(start=start_date.date(), tickers=yf_tickers)
             
-            try:
-                # 批次下載歷史 K 線
-                data = yf.download(chunk, start=start_date, end=end_date, group_by='ticker', threads=True, progress=False, auto_adjust=True)
+            # 全市場 (日期 × 代號) 矩陣一次算完均線/MACD 與四大條件，結果與逐檔運算完全一致
+            with span("compute", "screen_rule_market" if rule else "screen_macd_market") as s:
+                scan['rows'] = {row['代碼']: row for row in screen(panel, yf_tickers)}
+                s['rows'] = len(yf_tickers)
                 
-                for ticker in chunk:
-                    try:
-                        df = data[ticker] if len(chunk) > 1 else data
-                        df = df.dropna(how='all')
-                        res = calculate_macd_strategy(ticker, df, min_volume_k)
-                        if res:
-                            all_results.append(res)
-                    except: continue
-            except: pass
-                
-            progress_bar.progress(current_chunk / total_chunks)
+        progress_bar.progress(1.0)
+        scan['status'] = 'done'
             
         status_text.text("✅ 全市場掃描完畢！")
-        
-        # ==========================================
-        # 4. 大字體 HTML 完美渲染輸出
-        # ==========================================
-        if all_results:
-            df_final = pd.DataFrame(all_results)
-            df_final = df_final.sort_values(by="漲跌幅", ascending=False).drop(columns=['漲跌幅'])
-            
-            def custom_style(row):
-                styles = []
-                for col in row.index:
-                    css = "font-size: 18px; "
-                    if col == '收盤': css += "font-weight: bold; "
-                    if col == '漲幅%':
-                        if row[col] > 0: css += "color: #ff4b4b; "
-                        elif row[col] < 0: css += "color: #1e7b1e; "
-                    
-                    if row['漲幅%'] >= 9.85: css += "background-color: rgba(255, 75, 75, 0.2); "
-                    elif row['漲幅%'] <= -9.85: css += "background-color: rgba(0, 136, 0, 0.15); "
-                    
-                    if col == '型態描述': css += "color: #ff8c00; font-weight: bold; " # 亮橘色強調訊號
-                    styles.append(css)
-                return styles
+        show_results(table_area, scan)
+elif last_scan:
+    if last_scan['status'] == 'running':
+        last_scan['status'] = 'cancelled'   # 上一次執行在掃描途中被中斷
+    show_results(st.empty(), last_scan)
 
-            styled_df = df_final.style.apply(custom_style, axis=1)\
-                              .format({"收盤": "{:.2f}", "漲幅%": "{:.2f} %", "MA20": "{:.2f}", "MACD快線": "{:.2f}", "成交量(張)": "{:.0f}"})\
-                              .hide(axis="index")\
-                              .set_table_attributes('style="width: 100%; border-collapse: collapse; text-align: center;"')\
-                              .set_table_styles([
-                                  {'selector': 'th', 'props': [('font-size', '18px'), ('text-align', 'center'), ('padding', '12px'), ('border-bottom', '2px solid #555')]},
-                                  {'selector': 'td', 'props': [('font-size', '18px'), ('text-align', 'center'), ('padding', '12px'), ('border-bottom', '1px solid #ddd')]}
-                              ])
-            
-            st.success(f"🎉 恭喜！在近 1800 檔股票中，共發現 {len(df_final)} 檔符合您主力爆量與 MACD 轉強條件的標的：")
-            st.markdown(styled_df.to_html(), unsafe_allow_html=True)
-        else:
-            st.warning("🕵️‍♂️ 掃描完成。今日全市場沒有發現符合條件的股票，您可以考慮稍微降低「成交量」門檻再試一次。")
+render_timing_sidebar()